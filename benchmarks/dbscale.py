@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+Database-scale benchmarks for the SceneID lookups on the login path.
+
+Fills the user and SceneID tables up to each of a series of sizes, and at each size times the
+login lookup, the insert made by the 'connect' views, the queries behind an admin listing of
+SceneID links and a user list annotated with has_sceneid. The query plan of each lookup is
+checked for full table scans, so that the run fails if a lookup would take time proportional
+to the number of users:
+
+    python -m benchmarks.dbscale --sizes 10000,100000,1000000 --output dbscale.json
+    DBSCALE_ENGINE=postgresql python -m benchmarks.dbscale
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.dbscale_settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import IntegrityError, connection, transaction  # noqa: E402
+
+from benchmarks.run import time_benchmark  # noqa: E402
+from sceneid.models import SceneID  # noqa: E402
+from sceneid.paginator import EstimatedCountPaginator  # noqa: E402
+from sceneid.users import annotate_has_sceneid  # noqa: E402
+
+
+# SceneID numbers are spread out so that lookups for unlinked numbers fall between rows
+SCENEID_STEP = 7
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def fill(start, end, batch_size):
+    """
+    Add users and linked SceneIDs numbered from start (inclusive) to end (exclusive)
+    """
+    started = time.perf_counter()
+    for batch_start in range(start, end, batch_size):
+        numbers = range(batch_start, min(batch_start + batch_size, end))
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username='user%d' % i, password='!') for i in numbers
+            ])
+            if users[0].pk is None:
+                # backends that cannot return primary keys from a bulk insert
+                users = list(User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).order_by('pk'))
+            SceneID.objects.bulk_create([
+                SceneID(user=user, sceneid=i * SCENEID_STEP) for i, user in zip(numbers, users)
+            ])
+    return time.perf_counter() - started
+
+
+def random_sceneids(size):
+    while True:
+        yield random.randrange(size) * SCENEID_STEP
+
+
+# Each benchmark takes the current table size and returns (the callable to be timed, a
+# representative queryset whose plan is checked or None).
+
+@benchmark
+def login_lookup(size):
+    sceneids = random_sceneids(size)
+
+    def run():
+        User.objects.get(sceneids__sceneid=next(sceneids))
+
+    return run, User.objects.filter(sceneids__sceneid=SCENEID_STEP)
+
+
+@benchmark
+def login_lookup_unlinked(size):
+    sceneids = (sceneid + 1 for sceneid in random_sceneids(size))
+
+    def run():
+        try:
+            User.objects.get(sceneids__sceneid=next(sceneids))
+        except User.DoesNotExist:
+            pass
+
+    return run, None
+
+
+@benchmark
+def link_existing(size):
+    # the insert made by the 'connect' views, for a SceneID that is already linked
+    sceneids = random_sceneids(size)
+    user = User.objects.first()
+
+    def run():
+        try:
+            with transaction.atomic():
+                SceneID.objects.create(sceneid=next(sceneids), user=user)
+        except IntegrityError:
+            pass
+
+    return run, SceneID.objects.filter(sceneid=SCENEID_STEP)
+
+
+@benchmark
+def link_new(size):
+    sceneids = (sceneid + 1 for sceneid in random_sceneids(size))
+    user = User.objects.first()
+
+    def run():
+        with transaction.atomic():
+            SceneID.objects.create(sceneid=next(sceneids), user=user)
+            transaction.set_rollback(True)
+
+    return run, None
+
+
+@benchmark
+def admin_list_page(size):
+    queryset = SceneID.objects.select_related('user').order_by('-pk')
+
+    def run():
+        list(queryset[:100])
+
+    # walks the primary key index backwards and stops after the first page, which SQLite's
+    # plan reports as a scan - so only the timing is checked
+    return run, None
+
+
+@benchmark
+def admin_search_sceneid(size):
+    sceneids = random_sceneids(size)
+
+    def run():
+        list(SceneID.objects.select_related('user').filter(sceneid=next(sceneids)))
+
+    return run, SceneID.objects.select_related('user').filter(sceneid=SCENEID_STEP)
+
+
+@benchmark
+def admin_full_count(size):
+    # the admin paginator's count of the unfiltered list: an estimate from the table statistics
+    # on PostgreSQL, but a count of the whole table on SQLite, where this grows linearly
+    def run():
+        return EstimatedCountPaginator(SceneID.objects.order_by('-pk'), 100).count
+
+    return run, None
+
+
+@benchmark
+def user_list_has_sceneid(size):
+    # a page of users with a 'linked with SceneID' flag, as on a member list
+    queryset = annotate_has_sceneid(User.objects.order_by('pk'))
+
+    def run():
+        list(queryset[:100])
+
+    # as admin_list_page, the first page is read from the primary key index
+    return run, None
+
+
+def find_full_scans(queryset):
+    """
+    Return the lines of the query plan for queryset that scan a whole SceneID or user table
+    """
+    plan = queryset.explain()
+    scans = []
+    for line in plan.splitlines():
+        if connection.vendor == 'sqlite':
+            is_scan = ' SCAN ' in ' %s ' % line.replace('--', ' ') and 'USING' not in line
+        else:
+            is_scan = 'Seq Scan' in line
+        if is_scan and ('sceneid_sceneid' in line or 'auth_user' in line):
+            scans.append(line.strip(' -|`'))
+    return scans
+
+
+def run_size(names, size, repeat, min_time):
+    results = {}
+    plans = {}
+    for name in names:
+        func, queryset = BENCHMARKS[name](size)
+        results[name] = time_benchmark(func, repeat, min_time)
+        print("%-10d %-28s %10.2f us" % (size, name, results[name]['min'] * 1e6), file=sys.stderr)
+        if queryset is not None:
+            plans[name] = find_full_scans(queryset)
+    return results, plans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: all)")
+    parser.add_argument(
+        '--sizes', default='10000,100000,1000000',
+        help="comma-separated table sizes to measure at (default 10000,100000,1000000)"
+    )
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help="minimum seconds per repetition (default 0.2)"
+    )
+    parser.add_argument(
+        '--max-growth', type=float, default=None,
+        help="fail if any indexed lookup at the largest size is slower than at the smallest "
+             "by more than this ratio"
+    )
+    options = parser.parse_args(argv)
+
+    names = options.names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: %s" % ", ".join(sorted(unknown)))
+    sizes = sorted(int(size) for size in options.sizes.split(','))
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = {}
+        full_scans = {}
+        filled = 0
+        for size in sizes:
+            elapsed = fill(filled, size, options.batch_size)
+            print("filled to %d rows in %.1fs" % (size, elapsed), file=sys.stderr)
+            filled = size
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            results[size], plans = run_size(names, size, options.repeat, options.min_time)
+            for name, scans in plans.items():
+                if scans:
+                    full_scans.setdefault(name, scans)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    growth = {}
+    for name in names:
+        if name == 'admin_full_count' and connection.vendor != 'postgresql':
+            continue
+        growth[name] = results[sizes[-1]][name]['min'] / results[sizes[0]][name]['min']
+        print("%-28s %6.2fx from %d to %d rows" % (name, growth[name], sizes[0], sizes[-1]),
+              file=sys.stderr)
+
+    output = {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'platform': platform.platform(),
+        },
+        'benchmarks': {str(size): result for size, result in results.items()},
+        'growth': growth,
+        'full_scans': full_scans,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+
+    failed = False
+    for name, scans in full_scans.items():
+        print("%s: full table scan in query plan: %s" % (name, "; ".join(scans)), file=sys.stderr)
+        failed = True
+    if options.max_growth is not None:
+        for name, ratio in growth.items():
+            if ratio > options.max_growth:
+                print("%s: grew by %.2fx" % (name, ratio), file=sys.stderr)
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Settings for benchmarks.dbscale. The database is selected through environment variables:
+
+    DBSCALE_ENGINE      'sqlite' (default) or 'postgresql'
+    DBSCALE_NAME        SQLite file / PostgreSQL database to create and fill
+                        (default dbscale.sqlite3 / sceneid_dbscale)
+
+PostgreSQL connection details are taken from the usual PGHOST, PGPORT, PGUSER and PGPASSWORD
+variables. The database is created for the run and dropped afterwards.
+"""
+import os
+
+from benchmarks.settings import *  # noqa
+
+
+if os.environ.get('DBSCALE_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': 'postgres',
+            'HOST': os.environ.get('PGHOST', ''),
+            'PORT': os.environ.get('PGPORT', ''),
+            'USER': os.environ.get('PGUSER', ''),
+            'PASSWORD': os.environ.get('PGPASSWORD', ''),
+            'TEST': {'NAME': os.environ.get('DBSCALE_NAME', 'sceneid_dbscale')},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # an on-disk database, so that the timings include reading pages from the file
+            'TEST': {'NAME': os.environ.get('DBSCALE_NAME', 'dbscale.sqlite3')},
+        }
+    }
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the per-request code paths of django-sceneid.
+
+Runs offline: requests to id.scene.org are answered in-process by the `responses` library,
+and the database is an in-memory SQLite test database. Results are written as JSON, and can
+be compared against a previously stored run:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json --threshold 1.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+import django
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.contrib.sessions.backends.db import SessionStore  # noqa: E402
+from django.contrib.messages.storage.fallback import FallbackStorage  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.test import Client, RequestFactory  # noqa: E402
+import responses  # noqa: E402
+
+from sceneid import pending  # noqa: E402
+from sceneid.client import SceneIDClient  # noqa: E402
+from sceneid.forms import UserCreationForm  # noqa: E402
+from sceneid import views  # noqa: E402
+
+
+USER_DATA = {
+    'id': 1234,
+    'first_name': 'Matt', 'last_name': 'Westcott',
+    'display_name': 'gasman in a trenchcoat',
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def add_responses(rsps):
+    rsps.add(
+        responses.POST, 'https://id.scene.org/oauth/token/',
+        json={
+            'access_token': '5678567856785678',
+            'expires_in': 3600, 'token_type': 'Bearer', 'scope': 'basic',
+            'refresh_token': '8765876587658765',
+        },
+    )
+    rsps.add(
+        responses.GET, 'https://id.scene.org/api/3.0/me/',
+        json={'success': True, 'user': USER_DATA},
+    )
+
+
+rf = RequestFactory()
+
+
+def make_request(method='get', path='/', data=None, session=None):
+    request = getattr(rf, method)(path, data or {})
+    request.session = session if session is not None else SessionStore()
+    request._messages = FallbackStorage(request)
+    request.user = None
+    return request
+
+
+def make_pending_session():
+    request = make_request()
+    pending.get_store().save(request, USER_DATA)
+    request.session.save()
+    return request.session
+
+
+# Each benchmark function performs any setup, then returns the callable to be timed.
+
+@benchmark
+def get_authorization_uri():
+    client = SceneIDClient('testsite', 'supersecretclientsecret')
+    return lambda: client.get_authorization_uri(
+        '1234123412341234', 'https://testsite/account/sceneid/login/'
+    )
+
+
+def template_benchmark(source):
+    template = Template('{% load sceneid_tags %}' + source)
+    context = Context({'request': make_request(path='/some/page/')})
+    return lambda: template.render(context)
+
+
+@benchmark
+def tag_sceneid_auth_url():
+    return template_benchmark('{% sceneid_auth_url %}')
+
+
+@benchmark
+def tag_sceneid_login_button_small():
+    return template_benchmark('{% sceneid_login_button_small %}')
+
+
+@benchmark
+def tag_sceneid_login_button_large():
+    return template_benchmark('{% sceneid_login_button_large %}')
+
+
+@benchmark
+def user_creation_form_init():
+    return lambda: UserCreationForm(USER_DATA)
+
+
+@benchmark
+def auth_redirect_view():
+    view = views.AuthRedirectView.as_view()
+    return lambda: view(make_request(path='/account/sceneid/auth/', data={'next': '/landing/'}))
+
+
+@benchmark
+def login_view_existing_user():
+    user = User.objects.create_user(username='existinguser')
+    user.sceneids.create(sceneid=USER_DATA['id'])
+    view = views.LoginView.as_view()
+    session = SessionStore()
+    data = {'state': '66666666', 'code': '4321432143214321'}
+
+    def run():
+        session['sceneid_state'] = '66666666'
+        view(make_request(path='/account/sceneid/login/', data=data, session=session))
+
+    def cleanup():
+        user.delete()
+
+    run.cleanup = cleanup
+    return run
+
+
+@benchmark
+def login_view_new_user():
+    view = views.LoginView.as_view()
+    session = SessionStore()
+    data = {'state': '66666666', 'code': '4321432143214321'}
+
+    def run():
+        session['sceneid_state'] = '66666666'
+        view(make_request(path='/account/sceneid/login/', data=data, session=session))
+
+    return run
+
+
+@benchmark
+def connect_view():
+    view = views.ConnectView.as_view()
+    session = make_pending_session()
+    return lambda: view(
+        make_request(path='/account/sceneid/connect/', session=session)
+    ).render()
+
+
+@benchmark
+def connect_old_view_invalid():
+    view = views.ConnectOldView.as_view()
+    session = make_pending_session()
+    data = {'username': 'nobody', 'password': 'wrong'}
+    return lambda: view(
+        make_request('post', '/account/sceneid/connect/old/', data=data, session=session)
+    ).render()
+
+
+@benchmark
+def connect_new_view_invalid():
+    User.objects.get_or_create(username='takenusername')
+    view = views.ConnectNewView.as_view()
+    session = make_pending_session()
+    data = {'username': 'takenusername'}
+    return lambda: view(
+        make_request('post', '/account/sceneid/connect/new/', data=data, session=session)
+    ).render()
+
+
+def measure_session_sizes():
+    """
+    Return the encoded size in bytes of the session after each step of the login flow
+    """
+    client = Client()
+    sizes = {}
+
+    def session_size():
+        session = client.session
+        return len(session.encode(session._get_session(no_load=False)))
+
+    client.get('/account/sceneid/auth/?next=/landing/')
+    sizes['session_bytes_after_auth'] = session_size()
+    state = client.session.get('sceneid_state', '')
+    client.get('/account/sceneid/login/', {'state': state, 'code': '4321432143214321'})
+    sizes['session_bytes_after_login'] = session_size()
+    return sizes
+
+
+def time_benchmark(func, repeat, min_time):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    # scale up to the requested minimum time per repetition
+    elapsed = timer.timeit(number)
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    timings = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'unit': 's',
+        'number': number,
+        'min': min(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def run_benchmarks(names, repeat, min_time):
+    results = {}
+    for name in names:
+        func = BENCHMARKS[name]()
+        try:
+            results[name] = time_benchmark(func, repeat, min_time)
+        finally:
+            if hasattr(func, 'cleanup'):
+                func.cleanup()
+        print("%-36s %10.2f us" % (name, results[name]['min'] * 1e6), file=sys.stderr)
+
+    for name, size in measure_session_sizes().items():
+        results[name] = {'unit': 'bytes', 'value': size}
+        print("%-36s %10d bytes" % (name, size), file=sys.stderr)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Print a comparison against a baseline, and return the names of benchmarks that have
+    regressed by more than the threshold ratio
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            continue
+        key = 'min' if result['unit'] == 's' else 'value'
+        ratio = result[key] / base[key] if base[key] else 1.0
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print("%-36s %6.2fx%s" % (name, ratio, flag), file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: all)")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against results stored in this file")
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help="ratio to baseline above which a benchmark counts as a regression (default 1.25)"
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help="minimum seconds per repetition (default 0.2)"
+    )
+    options = parser.parse_args(argv)
+
+    names = options.names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: %s" % ", ".join(sorted(unknown)))
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            add_responses(rsps)
+            results = run_benchmarks(names, options.repeat, options.min_time)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    output = {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+        },
+        'benchmarks': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,8 @@
+from tests.settings import *  # noqa
+
+
+# keep password checks in the connect views from dominating the timings
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+STATIC_URL = '/static/'
+ALLOWED_HOSTS = ['testserver']
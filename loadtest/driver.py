@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Load driver for the SceneID login flow.
+
+Runs the full flow of a first-time SceneID login - the auth redirect, the provider's
+authorize endpoint, the login callback, the connect page and registration through
+connect/new - from a number of concurrent virtual users, and reports latency percentiles for
+each step along with overall throughput.
+
+    python -m loadtest.driver --base-url http://127.0.0.1:8000 --concurrency 20 --flows 500
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urljoin, urlparse
+
+import requests
+
+
+STEPS = ('auth', 'authorize', 'login', 'connect', 'connect_new')
+
+
+class FlowError(Exception):
+    def __init__(self, step, message):
+        super().__init__("%s: %s" % (step, message))
+        self.step = step
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {step: [] for step in STEPS}
+        self.errors = {}
+        self.completed = 0
+
+    def add_timing(self, step, duration):
+        with self.lock:
+            self.timings[step].append(duration)
+
+    def add_error(self, error):
+        with self.lock:
+            key = str(error)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def add_completed(self):
+        with self.lock:
+            self.completed += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def run_flow(base_url, mount, results):
+    session = requests.Session()
+
+    def timed(step, method, url, expected_status, **kwargs):
+        start = time.perf_counter()
+        response = session.request(method, url, allow_redirects=False, timeout=60, **kwargs)
+        results.add_timing(step, time.perf_counter() - start)
+        if response.status_code != expected_status:
+            raise FlowError(step, "HTTP %d" % response.status_code)
+        return response
+
+    auth_url = urljoin(base_url, mount + 'auth/')
+    response = timed('auth', 'GET', auth_url, 302, params={'next': '/landing/'})
+    response = timed('authorize', 'GET', response.headers['Location'], 302)
+    login_url = response.headers['Location']
+    response = timed('login', 'GET', login_url, 302)
+    if not response.headers['Location'].endswith(mount + 'connect/'):
+        raise FlowError('login', "expected redirect to connect page")
+
+    connect_url = urljoin(base_url, mount + 'connect/')
+    timed('connect', 'GET', connect_url, 200)
+
+    sceneid = parse_qs(urlparse(login_url).query)['code'][0][:12]
+    timed(
+        'connect_new', 'POST', urljoin(base_url, mount + 'connect/new/'), 302,
+        data={
+            'username': 'load%s' % sceneid,
+            'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+        },
+        headers={'Referer': connect_url},
+    )
+    results.add_completed()
+
+
+def run_user(base_url, mount, flows, results):
+    for _ in range(flows):
+        try:
+            run_flow(base_url, mount, results)
+        except (FlowError, requests.RequestException) as e:
+            results.add_error(e)
+
+
+def format_ms(value):
+    return "%8.1f" % (value * 1000) if value is not None else "       -"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load driver for the SceneID login flow")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument(
+        '--mount', default='/account/sceneid/',
+        help="path the sceneid URLconf is included at (default /account/sceneid/)"
+    )
+    parser.add_argument('--concurrency', type=int, default=10, help="virtual users (default 10)")
+    parser.add_argument('--flows', type=int, default=100, help="total flows to run (default 100)")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    options = parser.parse_args(argv)
+
+    results = Results()
+    flows_per_user = [
+        options.flows // options.concurrency + (1 if i < options.flows % options.concurrency else 0)
+        for i in range(options.concurrency)
+    ]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        for flows in flows_per_user:
+            executor.submit(run_user, options.base_url, options.mount, flows, results)
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        'elapsed': elapsed,
+        'completed': results.completed,
+        'errors': results.errors,
+        'flows_per_second': results.completed / elapsed if elapsed else 0,
+        'steps': {},
+    }
+    print("%-12s %8s %8s %8s %8s %8s" % ('step', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'rps'))
+    for step in STEPS:
+        timings = results.timings[step]
+        stats = {
+            'count': len(timings),
+            'p50': percentile(timings, 0.50),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'requests_per_second': len(timings) / elapsed if elapsed else 0,
+        }
+        summary['steps'][step] = stats
+        print("%-12s %8d %s %s %s %8.1f" % (
+            step, stats['count'], format_ms(stats['p50']), format_ms(stats['p95']),
+            format_ms(stats['p99']), stats['requests_per_second'],
+        ))
+
+    print("\n%d flows completed in %.1fs (%.1f flows/s), %d errors" % (
+        results.completed, elapsed, summary['flows_per_second'], sum(results.errors.values())
+    ))
+    for error, count in sorted(results.errors.items()):
+        print("  %5d  %s" % (count, error))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    return 1 if results.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
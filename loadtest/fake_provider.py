@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+A stand-in for the id.scene.org OAuth provider, for load testing a site that uses
+django-sceneid without touching the real service.
+
+Implements the authorize, token and /api/3.0/me/ endpoints. The authorize endpoint
+immediately redirects back with a code for a new SceneID account, numbered upwards from
+--first-sceneid. Point the site at it with:
+
+    SCENEID_HOSTNAME = '127.0.0.1:8001'
+    SCENEID_SCHEME = 'http'
+
+Run with:
+
+    python -m loadtest.fake_provider --port 8001 --latency 50 --error-rate 0.01
+"""
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import random
+import secrets
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class ProviderState:
+    def __init__(self, first_sceneid, latency, jitter, error_rate):
+        self.sceneids = itertools.count(first_sceneid)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        # code -> sceneid, access token -> sceneid
+        self.codes = {}
+        self.tokens = {}
+
+    def new_code(self):
+        with self.lock:
+            sceneid = next(self.sceneids)
+            code = secrets.token_hex(16)
+            self.codes[code] = sceneid
+        return code
+
+    def exchange_code(self, code):
+        with self.lock:
+            sceneid = self.codes.pop(code, None)
+            if sceneid is None:
+                return None
+            access_token = secrets.token_hex(16)
+            self.tokens[access_token] = sceneid
+        return access_token
+
+    def get_sceneid(self, access_token):
+        with self.lock:
+            return self.tokens.get(access_token)
+
+
+class ProviderRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self):
+        return self.server.provider_state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate_backend(self):
+        """
+        Apply the configured latency, and return True if this request should fail
+        """
+        delay = self.state.latency + random.uniform(0, self.state.jitter)
+        if delay:
+            time.sleep(delay / 1000)
+        if self.state.error_rate and random.random() < self.state.error_rate:
+            self.send_json(random.choice([500, 502, 503]), {'success': False})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/oauth/authorize/':
+            # no consent screen - go straight back to the site with a code for a new account
+            location = "%s?%s" % (query['redirect_uri'], urlencode({
+                'code': self.state.new_code(),
+                'state': query.get('state', ''),
+            }))
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        elif url.path == '/api/3.0/me/':
+            if self.simulate_backend():
+                return
+            auth_header = self.headers.get('Authorization', '')
+            sceneid = self.state.get_sceneid(auth_header[len('Bearer '):])
+            if sceneid is None:
+                self.send_json(401, {'success': False, 'error': 'invalid_token'})
+                return
+            self.send_json(200, {
+                'success': True,
+                'user': {
+                    'id': sceneid,
+                    'first_name': 'Load', 'last_name': 'Tester',
+                    'display_name': 'load tester %d' % sceneid,
+                },
+            })
+
+        else:
+            self.send_json(404, {'success': False})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        form = {key: values[0] for key, values in parse_qs(body).items()}
+
+        if url.path == '/oauth/token/':
+            if self.simulate_backend():
+                return
+            access_token = self.state.exchange_code(form.get('code'))
+            if access_token is None:
+                self.send_json(400, {'error': 'invalid_grant'})
+                return
+            self.send_json(200, {
+                'access_token': access_token,
+                'expires_in': 3600, 'token_type': 'Bearer', 'scope': 'basic',
+                'refresh_token': secrets.token_hex(16),
+            })
+        else:
+            self.send_json(404, {'success': False})
+
+
+def make_server(host='127.0.0.1', port=8001, first_sceneid=100000, latency=0, jitter=0,
+                error_rate=0, verbose=False):
+    server = ThreadingHTTPServer((host, port), ProviderRequestHandler)
+    server.daemon_threads = True
+    server.provider_state = ProviderState(first_sceneid, latency, jitter, error_rate)
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake SceneID OAuth provider")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument(
+        '--first-sceneid', type=int, default=100000,
+        help="SceneID number given to the first login (default 100000)"
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help="milliseconds added to each token and /me response (default 0)"
+    )
+    parser.add_argument(
+        '--jitter', type=float, default=0,
+        help="up to this many further milliseconds added at random (default 0)"
+    )
+    parser.add_argument(
+        '--error-rate', type=float, default=0,
+        help="fraction of token and /me requests that fail with a 5xx error (default 0)"
+    )
+    parser.add_argument('--verbose', action='store_true', help="log each request")
+    options = parser.parse_args(argv)
+
+    server = make_server(
+        options.host, options.port, options.first_sceneid, options.latency, options.jitter,
+        options.error_rate, options.verbose,
+    )
+    print("Fake SceneID provider listening on http://%s:%d/" % (options.host, options.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Settings for a minimal site to load test against, using the fake provider in
+loadtest.fake_provider. Values can be overridden through environment variables:
+
+    LOADTEST_BASE_URL          the URL the site is served at (default http://127.0.0.1:8000)
+    LOADTEST_PROVIDER          host:port of the fake provider (default 127.0.0.1:8001)
+    LOADTEST_DATABASE          path to the SQLite database file (default loadtest.sqlite3)
+    LOADTEST_CACHE_DIR         directory for the file-based cache (default loadtest-cache)
+    LOADTEST_ASYNC             if set, serve the async views from sceneid.async_urls
+"""
+import os
+
+from tests.settings import *  # noqa
+
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('LOADTEST_DATABASE', 'loadtest.sqlite3'),
+    }
+}
+
+# shared between server processes, so that a pending connection saved by the worker that
+# handled /login/ can be read by whichever worker handles /connect/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.abspath(os.environ.get('LOADTEST_CACHE_DIR', 'loadtest-cache')),
+    }
+}
+# unlike the tests, the site may be served by several processes
+SILENCED_SYSTEM_CHECKS = []
+
+ROOT_URLCONF = 'loadtest.urls'
+STATIC_URL = '/static/'
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+BASE_URL = os.environ.get('LOADTEST_BASE_URL', 'http://127.0.0.1:8000')
+SCENEID_HOSTNAME = os.environ.get('LOADTEST_PROVIDER', '127.0.0.1:8001')
+SCENEID_SCHEME = 'http'
@@ -0,0 +1,37 @@
+from django.contrib import admin
+
+from sceneid.models import SceneID, SceneIDLoginEvent
+from sceneid.paginator import EstimatedCountPaginator
+
+
+@admin.register(SceneID)
+class SceneIDAdmin(admin.ModelAdmin):
+    list_display = ('sceneid', 'user', 'profile_synced_at', 'last_login_at')
+    list_select_related = ('user',)
+    # exact matches on the unique index; substring searches would scan the whole table
+    search_fields = ('=sceneid',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('profile_synced_at', 'last_login_at')
+    # order by the primary key, so that each page is read from the index
+    ordering = ('-pk',)
+    # skip the second count of the whole table when the list is filtered, and estimate the
+    # count of an unfiltered list from the table statistics
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+
+@admin.register(SceneIDLoginEvent)
+class SceneIDLoginEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'event', 'sceneid', 'user', 'ip_address')
+    list_filter = ('event',)
+    list_select_related = ('user',)
+    search_fields = ('=sceneid', '=ip_address')
+    ordering = ('-created_at',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
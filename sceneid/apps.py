@@ -6,5 +6,11 @@ class SceneIDConfig(AppConfig):
     name = 'sceneid'
 
     connect_template_name = 'sceneid/connect.html'
+    unavailable_template_name = 'sceneid/unavailable.html'
     connect_login_form_class = 'django.contrib.auth.forms.AuthenticationForm'
     connect_register_form_class = 'sceneid.forms.UserCreationForm'
+
+    def ready(self):
+        from sceneid import checks  # noqa: F401 - registers the system checks
+        from sceneid.signals import connect_signals
+        connect_signals()
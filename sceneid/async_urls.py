@@ -0,0 +1,15 @@
+from django.urls import path
+
+from sceneid import async_views, views
+
+app_name = 'sceneid'
+
+urlpatterns = [
+    path('auth/', async_views.AsyncAuthRedirectView.as_view(), {}, 'auth'),
+    path('login/', async_views.AsyncLoginView.as_view(), {}, 'login'),
+    path('connect/', async_views.AsyncConnectView.as_view(), {}, 'connect'),
+    path('connect/old/', async_views.AsyncConnectOldView.as_view(), {}, 'connect_old'),
+    path('connect/new/', async_views.AsyncConnectNewView.as_view(), {}, 'connect_new'),
+    # makes no requests to SceneID, so the sync view is used as it is
+    path('connect/username/', views.UsernameAvailabilityView.as_view(), {}, 'check_username'),
+]
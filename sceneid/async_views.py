@@ -0,0 +1,243 @@
+"""
+Async versions of the views in sceneid.views, for projects served under ASGI. These make the
+requests to id.scene.org through AsyncSceneIDClient, so that a slow response from the
+provider does not tie up a worker thread. Requires httpx.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.exceptions import SuspiciousOperation
+from django.shortcuts import redirect
+from django.utils.crypto import get_random_string
+from django.views import View
+import httpx
+
+from sceneid import audit
+from sceneid import circuit
+from sceneid import id_token
+from sceneid import instrumentation
+from sceneid import pending
+from sceneid import state as sceneid_state
+from sceneid import tasks
+from sceneid import tokens
+from sceneid import user_cache
+from sceneid.backends import get_login_backend
+from sceneid.client import AsyncSceneIDClient
+from sceneid.models import SceneIDLoginEvent
+from sceneid.views import (
+    ConnectNewView, ConnectOldView, ConnectView, _get_return_uri, _get_scopes,
+    _get_sceneid_client, _login_failed, _redirect_to_next_url, _render_unavailable,
+    _store_access_token,
+)
+
+try:
+    from django.contrib.auth import alogin
+except ImportError:  # Django < 5.0
+    from django.contrib.auth import login as auth_login
+    alogin = sync_to_async(auth_login)
+
+
+# The session's async API (aget / aset / apop) was added in Django 5.1; on earlier versions,
+# fall back on running the sync methods in a thread.
+
+async def _session_get(session, key, default=None):
+    if hasattr(session, 'aget'):
+        return await session.aget(key, default)
+    return await sync_to_async(session.get)(key, default)
+
+
+async def _session_set(session, key, value):
+    if hasattr(session, 'aset'):
+        await session.aset(key, value)
+    else:
+        await sync_to_async(session.__setitem__)(key, value)
+
+
+def _get_async_sceneid_client():
+    return _get_sceneid_client(client_class=AsyncSceneIDClient)
+
+
+async def _ais_authenticated(request):
+    if hasattr(request, 'auser'):  # Django 5.0+
+        return (await request.auser()).is_authenticated
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+async def _ais_unavailable():
+    breaker = circuit.get_breaker(getattr(settings, 'SCENEID_HOSTNAME', 'id.scene.org'))
+    return breaker is not None and await breaker.aget_state() == circuit.OPEN
+
+
+async def _aredirect_back(request):
+    next_url = await _session_get(request.session, 'sceneid_next_url')
+    return _redirect_to_next_url(request, next_url)
+
+
+class AsyncAuthRedirectView(View):
+    """
+    Generate the SceneID auth redirect URL and send user there.
+    """
+    async def get(self, request):
+        if await _ais_unavailable():
+            return _render_unavailable(request)
+
+        client = _get_async_sceneid_client()
+        next_url = request.GET.get('next')
+
+        remembered_sceneid = tokens.get_remembered_sceneid(request)
+        if remembered_sceneid is not None and not await _ais_authenticated(request):
+            user = await tokens.asilent_login(request, client)
+            if user is not None:
+                with instrumentation.measure('login'):
+                    await alogin(request, user, backend=get_login_backend())
+                await audit.arecord(
+                    SceneIDLoginEvent.SILENT_LOGIN, request, sceneid=remembered_sceneid, user=user
+                )
+                await tasks.aschedule_post_login(user, remembered_sceneid)
+                return _redirect_to_next_url(request, next_url)
+
+        nonce = None
+        if sceneid_state.use_signed_state():
+            state, nonce = sceneid_state.make_state(next_url)
+        else:
+            state = get_random_string(length=32)
+            await _session_set(request.session, 'sceneid_state', state)
+            await _session_set(request.session, 'sceneid_next_url', next_url)
+
+        redirect_uri = client.get_authorization_uri(state, _get_return_uri(), _get_scopes())
+        response = redirect(redirect_uri)
+        if nonce is not None:
+            sceneid_state.set_cookie(response, nonce)
+        return response
+
+
+class AsyncLoginView(View):
+    """
+    Process the SceneID Oauth response
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        with instrumentation.measure('callback') as event:
+            response = await super().dispatch(request, *args, **kwargs)
+            event['status'] = response.status_code
+        if sceneid_state.get_cookie_name() in request.COOKIES:
+            sceneid_state.clear_cookie(response)
+        return response
+
+    async def get(self, request):
+        state = request.GET['state']
+        code = request.GET['code']
+
+        try:
+            if sceneid_state.use_signed_state():
+                next_url = sceneid_state.read_state(request, state)
+            else:
+                if (state != await _session_get(request.session, 'sceneid_state')):
+                    raise SuspiciousOperation("State mismatch!")
+                next_url = await _session_get(request.session, 'sceneid_next_url')
+        except SuspiciousOperation:
+            await audit.arecord(SceneIDLoginEvent.STATE_MISMATCH, request)
+            raise
+
+        client = _get_async_sceneid_client()
+        try:
+            token_data = await client.get_access_token(code, _get_return_uri())
+            access_token = token_data.get('access_token')
+            user_data = None
+            if access_token:
+                user_data = await id_token.aget_user_data(token_data, client)
+                if user_data is None:
+                    user_data = await client.get_user_data(access_token)
+        except (circuit.CircuitOpenError, httpx.HTTPError, ValueError):
+            return _render_unavailable(request)
+        if not user_data or 'user' not in user_data:
+            return _login_failed(request, next_url)
+
+        sceneid = user_data["user"]["id"]
+        # look for an existing user linked to this sceneid
+        with instrumentation.measure('user_lookup') as event:
+            user = await user_cache.aget_user_for_sceneid(sceneid)
+            event['found'] = bool(user)
+
+        if user:
+            if user.is_active:
+                with instrumentation.measure('login'):
+                    await alogin(request, user, backend=get_login_backend())
+                await audit.arecord(SceneIDLoginEvent.LOGIN, request, sceneid=sceneid, user=user)
+                await tasks.aschedule_post_login(user, sceneid, user_data["user"])
+                if _store_access_token():
+                    await _session_set(request.session, 'sceneid_access_token', access_token)
+                if tokens.is_enabled():
+                    secret = await tokens.astore_token(sceneid, token_data)
+                    response = _redirect_to_next_url(request, next_url)
+                    if secret:
+                        tokens.remember(response, sceneid, secret)
+                    return response
+            else:
+                await audit.arecord(
+                    SceneIDLoginEvent.DEACTIVATED, request, sceneid=sceneid, user=user
+                )
+                messages.error(request, "This account has been deactivated.")
+
+            return _redirect_to_next_url(request, next_url)
+        else:
+            # no known user with this sceneid - prompt them to connect to a new or existing account
+            await audit.arecord(SceneIDLoginEvent.UNLINKED, request, sceneid=sceneid)
+            if _store_access_token():
+                await _session_set(request.session, 'sceneid_access_token', access_token)
+            await pending.get_store().asave(
+                request, user_data["user"],
+                tokens.compact_token_data(token_data) if tokens.is_enabled() else None
+            )
+            await _session_set(request.session, 'sceneid_next_url', next_url)
+            return redirect('sceneid:connect')
+
+
+class AsyncConnectView(ConnectView):
+    """
+    Display the login / registration forms for associating a SceneID we haven't seen before
+    with an existing or new account
+    """
+    async def get(self, request, *args, **kwargs):
+        self.user_data, self.token_data = pending.split_token_data(
+            await pending.get_store().aload(request)
+        )
+        if self.user_data is None:
+            return await _aredirect_back(request)
+
+        # building the registration form looks up a free username
+        context = await sync_to_async(self.get_context_data)(**kwargs)
+        return self.render_to_response(context)
+
+
+class AsyncConnectFormMixin:
+    """
+    Async dispatch for ConnectOldView / ConnectNewView. Validating and saving the forms goes
+    through the (sync) authentication and model form APIs, so that part runs in a thread.
+    """
+    # these views implement dispatch rather than per-method handlers, so Django cannot
+    # detect that they are async
+    view_is_async = True
+
+    async def dispatch(self, request):
+        self.user_data, self.token_data = pending.split_token_data(
+            await pending.get_store().aload(request)
+        )
+        if self.user_data is None:
+            return await _aredirect_back(request)
+
+        if not request.method == 'POST':
+            return redirect('sceneid:connect')
+
+        return await sync_to_async(self.process_form)(request)
+
+
+class AsyncConnectOldView(AsyncConnectFormMixin, ConnectOldView):
+    """
+    Handle form submissions of the login form for associating a SceneID with an existing account
+    """
+
+
+class AsyncConnectNewView(AsyncConnectFormMixin, ConnectNewView):
+    """
+    Handle form submissions of the registration form for associating a SceneID with a new account
+    """
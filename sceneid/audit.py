@@ -0,0 +1,186 @@
+"""
+An audit log of SceneID login attempts, in the SceneIDLoginEvent model.
+
+Enabled by setting SCENEID_AUDIT_LOG = True. Recording an event only adds it to an in-memory
+buffer, so no request waits on an INSERT. A background thread in each process, independent of
+SCENEID_TASK_BACKEND, writes the buffer with bulk_create every SCENEID_AUDIT_FLUSH_INTERVAL
+seconds, or as soon as SCENEID_AUDIT_BATCH_SIZE events are waiting. If a row in the batch is
+rejected, the events are written one at a time so that only that row is lost; if the database
+cannot be reached, the events are kept for the next attempt. Events that have not been
+written when the process exits are flushed at exit. Events older than
+SCENEID_AUDIT_RETENTION_DAYS are removed by the sceneid_prune_login_events management command.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import (
+    DatabaseError, DataError, IntegrityError, close_old_connections, router, transaction
+)
+from django.utils import timezone
+
+from sceneid.models import SceneIDLoginEvent
+
+
+logger = logging.getLogger('sceneid')
+
+# the most events to hold while the database cannot be written to
+MAX_BUFFERED_EVENTS = 10000
+
+_buffer = []
+_lock = threading.Lock()
+# set to wake the flusher thread before the interval is up
+_wakeup = threading.Event()
+# (pid, thread, stop event) of the flusher thread, restarted in a forked process
+_flusher = None
+
+
+def is_enabled():
+    return getattr(settings, 'SCENEID_AUDIT_LOG', False)
+
+
+def get_batch_size():
+    return getattr(settings, 'SCENEID_AUDIT_BATCH_SIZE', 100)
+
+
+def get_flush_interval():
+    return getattr(settings, 'SCENEID_AUDIT_FLUSH_INTERVAL', 10)
+
+
+def get_retention_days():
+    return getattr(settings, 'SCENEID_AUDIT_RETENTION_DAYS', 90)
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None and _flusher[0] == os.getpid() and _flusher[1].is_alive():
+            return
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=_run_flusher, args=(stop,), name='sceneid-audit', daemon=True
+        )
+        _flusher = (os.getpid(), thread, stop)
+    thread.start()
+
+
+def _stop_flusher(timeout=None):
+    """
+    Stop the flusher thread, once it has written the events waiting in the buffer
+    """
+    global _flusher
+    with _lock:
+        flusher, _flusher = _flusher, None
+    if flusher is None or flusher[0] != os.getpid():
+        return
+    _, thread, stop = flusher
+    stop.set()
+    _wakeup.set()
+    thread.join(timeout)
+
+
+def _run_flusher(stop):
+    while not stop.is_set():
+        _wakeup.wait(get_flush_interval())
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Could not write SceneID login events")
+        finally:
+            close_old_connections()
+
+
+def _add(event, request, sceneid, user):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    login_event = SceneIDLoginEvent(
+        created_at=timezone.now(), event=event, sceneid=sceneid, user_id=user_id,
+        ip_address=request.META.get('REMOTE_ADDR') or None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+    )
+    _start_flusher()
+    with _lock:
+        _buffer.append(login_event)
+        if len(_buffer) >= get_batch_size():
+            _wakeup.set()
+
+
+def record(event, request, sceneid=None, user=None):
+    """
+    Record a login event (one of the SceneIDLoginEvent event constants) for the given request
+    """
+    if is_enabled():
+        _add(event, request, sceneid, user)
+
+
+async def arecord(event, request, sceneid=None, user=None):
+    # only touches the in-memory buffer, so it is safe to call from async code
+    if is_enabled():
+        _add(event, request, sceneid, user)
+
+
+def _requeue(events):
+    """
+    Put events that could not be written back at the front of the buffer, keeping at most
+    MAX_BUFFERED_EVENTS in total
+    """
+    with _lock:
+        _buffer[:0] = events
+        overflow = len(_buffer) - MAX_BUFFERED_EVENTS
+        if overflow > 0:
+            del _buffer[:overflow]
+    if overflow > 0:
+        logger.error("SceneID login event buffer is full; %d oldest events dropped", overflow)
+
+
+def flush():
+    """
+    Write the buffered events to the database, and return the number written
+    """
+    with _lock:
+        events = _buffer[:]
+        del _buffer[:]
+    if not events:
+        return 0
+
+    try:
+        with transaction.atomic(using=router.db_for_write(SceneIDLoginEvent)):
+            SceneIDLoginEvent.objects.bulk_create(events, batch_size=get_batch_size())
+        return len(events)
+    except (IntegrityError, DataError):
+        # a bad row (such as one for a user deleted since the event was recorded) fails the
+        # whole batch, so write the events one at a time and drop only the rows that fail
+        pass
+    except DatabaseError:
+        # the database is unavailable - try again on the next flush
+        _requeue(events)
+        raise
+
+    written = 0
+    for event in events:
+        try:
+            with transaction.atomic(using=router.db_for_write(SceneIDLoginEvent)):
+                event.save(force_insert=True)
+        except (IntegrityError, DataError):
+            logger.exception(
+                "Could not write SceneID login event %s for SceneID %s, user %s",
+                event.event, event.sceneid, event.user_id
+            )
+        else:
+            written += 1
+    return written
+
+
+def _flush_at_exit():
+    _stop_flusher(timeout=5)
+    if not _buffer:
+        return
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not write SceneID login events")
+
+
+atexit.register(_flush_at_exit)
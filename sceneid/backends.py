@@ -0,0 +1,126 @@
+"""
+An authentication backend for users logging in through SceneID.
+
+Add 'sceneid.backends.SceneIDBackend' to AUTHENTICATION_BACKENDS (in place of, or before,
+ModelBackend) and the login views will log users in through it. Besides authenticating by
+SceneID number, it can cache the user record loaded on every request
+(SCENEID_AUTH_USER_CACHE_TIMEOUT) and the user's permissions
+(SCENEID_AUTH_PERMISSION_CACHE_TIMEOUT), in the cache selected by SCENEID_CACHE. Entries are
+invalidated by the signal handlers in sceneid.signals.
+"""
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from sceneid import user_cache
+from sceneid.user_cache import get_cache
+
+
+# changed whenever a change could affect the permissions of any number of users (e.g. a
+# group's permissions), making all cached permission sets stale
+PERMISSION_VERSION_KEY = 'sceneid:perms:version'
+
+
+def get_user_cache_timeout():
+    return getattr(settings, 'SCENEID_AUTH_USER_CACHE_TIMEOUT', None)
+
+
+def get_permission_cache_timeout():
+    return getattr(settings, 'SCENEID_AUTH_PERMISSION_CACHE_TIMEOUT', None)
+
+
+def get_user_cache_key(user_id):
+    return 'sceneid:authuser:%s' % user_id
+
+
+def get_permission_cache_key(user_id):
+    return 'sceneid:perms:%s' % user_id
+
+
+def get_login_backend():
+    """
+    Return the dotted path of the backend that the login views should record in the session:
+    the first SceneIDBackend (or subclass) in AUTHENTICATION_BACKENDS, otherwise ModelBackend
+    """
+    for path in settings.AUTHENTICATION_BACKENDS:
+        if issubclass(import_string(path), SceneIDBackend):
+            return path
+    return 'django.contrib.auth.backends.ModelBackend'
+
+
+def _delete(keys):
+    cache = get_cache()
+    cache.delete_many(keys)
+    if connection.in_atomic_block:
+        # a request made before the transaction commits will re-cache the old value, so
+        # delete again once the change is visible
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_users(user_ids):
+    """
+    Remove the cached user records and permissions for the given user IDs
+    """
+    keys = []
+    if get_user_cache_timeout() is not None:
+        keys += [get_user_cache_key(user_id) for user_id in user_ids]
+    if get_permission_cache_timeout() is not None:
+        keys += [get_permission_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        _delete(keys)
+
+
+def invalidate_all_permissions():
+    if get_permission_cache_timeout() is not None:
+        get_cache().set(PERMISSION_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class SceneIDBackend(ModelBackend):
+    """
+    Authenticates against SceneID links: authenticate(request, sceneid=1234). Otherwise
+    behaves as ModelBackend (including username / password authentication), with optional
+    caching of get_user and the user's permissions.
+    """
+    def authenticate(self, request, sceneid=None, **kwargs):
+        if sceneid is None:
+            return super().authenticate(request, **kwargs)
+        user = user_cache.get_user_for_sceneid(sceneid)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        timeout = get_user_cache_timeout()
+        if timeout is None:
+            return super().get_user(user_id)
+
+        cache = get_cache()
+        cache_key = get_user_cache_key(user_id)
+        user = cache.get(cache_key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(cache_key, user, timeout)
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        timeout = get_permission_cache_timeout()
+        if (
+            timeout is None or obj is not None or hasattr(user_obj, '_perm_cache')
+            or not user_obj.is_active or user_obj.is_anonymous
+        ):
+            return super().get_all_permissions(user_obj, obj)
+
+        cache = get_cache()
+        cache_key = get_permission_cache_key(user_obj.pk)
+        values = cache.get_many([cache_key, PERMISSION_VERSION_KEY])
+        version = values.get(PERMISSION_VERSION_KEY)
+        if cache_key in values and values[cache_key][0] == version:
+            user_obj._perm_cache = values[cache_key][1]
+        else:
+            perms = super().get_all_permissions(user_obj)
+            cache.set(cache_key, (version, perms), timeout)
+        return user_obj._perm_cache
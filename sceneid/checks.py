@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from django.utils.module_loading import import_string
+
+from sceneid.pending import CachePendingConnectionStore, get_store
+from sceneid.routers import SceneIDRouter, get_replica
+
+
+# cache backends whose contents are not visible to other processes
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_read_database(app_configs, **kwargs):
+    replica = get_replica()
+    if replica is None:
+        return []
+
+    errors = []
+    if replica not in settings.DATABASES:
+        errors.append(Error(
+            "SCENEID_READ_DATABASE refers to the database '%s', which is not defined in "
+            "DATABASES." % replica,
+            id='sceneid.E001',
+        ))
+    routers = [
+        import_string(router) if isinstance(router, str) else type(router)
+        for router in settings.DATABASE_ROUTERS
+    ]
+    if not any(issubclass(router, SceneIDRouter) for router in routers):
+        errors.append(Error(
+            "SCENEID_READ_DATABASE is set, but sceneid.routers.SceneIDRouter is not in "
+            "DATABASE_ROUTERS.",
+            hint="Without it, users loaded from the replica would be saved to the replica.",
+            id='sceneid.E002',
+        ))
+    return errors
+
+
+@register()
+def check_pending_connection_cache(app_configs, **kwargs):
+    if not isinstance(get_store(), CachePendingConnectionStore):
+        return []
+
+    alias = getattr(settings, 'SCENEID_CACHE', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        "Pending SceneID connections are kept in the '%s' cache, which uses %s and is not "
+        "shared between processes." % (alias, backend),
+        hint=(
+            "With more than one server process, the 'connect' page will not find the "
+            "SceneID login made in another process. Point SCENEID_CACHE at a shared cache "
+            "(such as Redis, Memcached or the database cache), or set "
+            "SCENEID_PENDING_CONNECTION_STORE to "
+            "'sceneid.pending.SessionPendingConnectionStore'."
+        ),
+        id='sceneid.W001',
+    )]
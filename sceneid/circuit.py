@@ -0,0 +1,143 @@
+"""
+A circuit breaker around the requests made to id.scene.org, with its state shared between
+processes through the Django cache (as selected by SCENEID_CACHE).
+
+Enabled by setting SCENEID_CIRCUIT_BREAKER_THRESHOLD. After that many consecutive failures
+(connection errors, timeouts or 5xx responses), the circuit opens and requests fail immediately
+with CircuitOpenError, so that an outage at the provider does not tie up workers waiting on
+timeouts. After SCENEID_CIRCUIT_BREAKER_RESET_TIMEOUT seconds the circuit is half-open: a
+single request is let through as a probe, and its outcome closes or re-opens the circuit.
+"""
+import time
+
+from django.conf import settings
+
+from sceneid import instrumentation
+from sceneid.user_cache import get_cache
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_RESET_TIMEOUT = 30
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised in place of making a request to SceneID while the circuit is open
+    """
+
+
+def get_failure_threshold():
+    return getattr(settings, 'SCENEID_CIRCUIT_BREAKER_THRESHOLD', None)
+
+
+def get_reset_timeout():
+    return getattr(settings, 'SCENEID_CIRCUIT_BREAKER_RESET_TIMEOUT', DEFAULT_RESET_TIMEOUT)
+
+
+def get_breaker(hostname):
+    """
+    Return the CircuitBreaker for the given SceneID host, or None if disabled
+    """
+    threshold = get_failure_threshold()
+    if threshold is None:
+        return None
+    return CircuitBreaker(hostname, threshold, get_reset_timeout())
+
+
+class CircuitBreaker:
+    def __init__(self, hostname, threshold, reset_timeout):
+        self.hostname = hostname
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.cache = get_cache()
+        prefix = 'sceneid:circuit:%s:' % hostname
+        # number of consecutive failures
+        self.failures_key = prefix + 'failures'
+        # timestamp at which the circuit was (most recently) opened
+        self.opened_at_key = prefix + 'opened_at'
+        # present while a half-open probe request is in progress
+        self.probe_key = prefix + 'probe'
+
+    def _get_state(self, opened_at):
+        if opened_at is None:
+            return CLOSED
+        elif time.time() - opened_at < self.reset_timeout:
+            return OPEN
+        else:
+            return HALF_OPEN
+
+    def _emit(self, state):
+        instrumentation.emit('circuit', 0, host=self.hostname, state=state)
+
+    def get_state(self):
+        return self._get_state(self.cache.get(self.opened_at_key))
+
+    def before_request(self):
+        """
+        Raise CircuitOpenError if a request should not be made now; otherwise return the
+        current state
+        """
+        state = self.get_state()
+        if state == OPEN:
+            raise CircuitOpenError("SceneID requests to %s are suspended" % self.hostname)
+        if state == HALF_OPEN and not self.cache.add(self.probe_key, 1, self.reset_timeout):
+            # another request is already probing
+            raise CircuitOpenError("SceneID requests to %s are suspended" % self.hostname)
+        return state
+
+    def record_success(self):
+        values = self.cache.get_many([self.failures_key, self.opened_at_key])
+        if values:
+            self.cache.delete_many([self.failures_key, self.opened_at_key, self.probe_key])
+            if self.opened_at_key in values:
+                self._emit(CLOSED)
+
+    def record_failure(self):
+        state = self.get_state()
+        if state == HALF_OPEN:
+            # the probe failed
+            self.cache.set(self.opened_at_key, time.time(), None)
+            self.cache.delete(self.probe_key)
+            self._emit(OPEN)
+            return
+
+        self.cache.add(self.failures_key, 0, None)
+        failures = self.cache.incr(self.failures_key)
+        if failures >= self.threshold and state == CLOSED:
+            self.cache.set(self.opened_at_key, time.time(), None)
+            self._emit(OPEN)
+
+    async def aget_state(self):
+        return self._get_state(await self.cache.aget(self.opened_at_key))
+
+    async def abefore_request(self):
+        state = await self.aget_state()
+        if state == OPEN:
+            raise CircuitOpenError("SceneID requests to %s are suspended" % self.hostname)
+        if state == HALF_OPEN and not await self.cache.aadd(self.probe_key, 1, self.reset_timeout):
+            raise CircuitOpenError("SceneID requests to %s are suspended" % self.hostname)
+        return state
+
+    async def arecord_success(self):
+        values = await self.cache.aget_many([self.failures_key, self.opened_at_key])
+        if values:
+            await self.cache.adelete_many([self.failures_key, self.opened_at_key, self.probe_key])
+            if self.opened_at_key in values:
+                self._emit(CLOSED)
+
+    async def arecord_failure(self):
+        state = await self.aget_state()
+        if state == HALF_OPEN:
+            await self.cache.aset(self.opened_at_key, time.time(), None)
+            await self.cache.adelete(self.probe_key)
+            self._emit(OPEN)
+            return
+
+        await self.cache.aadd(self.failures_key, 0, None)
+        failures = await self.cache.aincr(self.failures_key)
+        if failures >= self.threshold and state == CLOSED:
+            await self.cache.aset(self.opened_at_key, time.time(), None)
+            self._emit(OPEN)
@@ -1,13 +1,97 @@
+import asyncio
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import threading
 import urllib
+import weakref
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from sceneid import circuit
+from sceneid import instrumentation
 
-class SceneIDClient:
-    def __init__(self, client_id, client_secret, hostname='id.scene.org'):
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.2
+
+
+# requests.Session objects keyed by (hostname, pool_size, max_retries, retry_backoff), shared
+# by all SceneIDClient instances in this process so that connections to the provider are kept
+# alive between logins
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _no_cookies_policy():
+    # the pooled sessions are shared by every login in the process, so cookies set on one
+    # user's requests must not be sent with another's
+    return DefaultCookiePolicy(allowed_domains=[])
+
+
+def _build_session(pool_size, max_retries, retry_backoff):
+    session = requests.Session()
+    session.cookies.set_policy(_no_cookies_policy())
+    # Retry connection failures for any request (the request never reached the server), but
+    # only retry read failures and 5xx responses for idempotent methods - an authorization
+    # code can only be exchanged once, so re-sending the token POST is never safe.
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        status_forcelist=(502, 503, 504),
+        backoff_factor=retry_backoff,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(hostname, pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                retry_backoff=DEFAULT_RETRY_BACKOFF):
+    """
+    Return the process-wide requests.Session used for talking to the given SceneID host
+    """
+    key = (hostname, pool_size, max_retries, retry_backoff)
+    try:
+        return _sessions[key]
+    except KeyError:
+        pass
+
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = _build_session(pool_size, max_retries, retry_backoff)
+        return _sessions[key]
+
+
+def close_sessions():
+    """
+    Close all pooled connections (e.g. after forking, or on shutdown)
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class BaseSceneIDClient:
+    def __init__(self, client_id, client_secret, hostname='id.scene.org', scheme='https'):
         self.client_id = client_id
         self.client_secret = client_secret
         self.hostname = hostname
+        # only expected to be changed from 'https' when testing against a local provider
+        self.scheme = scheme
 
     def get_authorization_uri(self, state, redirect_uri, scopes=None):
         params = {
@@ -19,15 +103,59 @@ class SceneIDClient:
         if scopes:
             params['scope'] = ' '.join(scopes)
 
-        return "https://%s/oauth/authorize/?%s" % (
+        return "%s://%s/oauth/authorize/?%s" % (
+            self.scheme,
             self.hostname,
             urllib.parse.urlencode(params)
         )
 
+    def get_token_url(self):
+        return "%s://%s/oauth/token/" % (self.scheme, self.hostname)
+
+    def get_user_data_url(self):
+        return "%s://%s/api/3.0/me/" % (self.scheme, self.hostname)
+
+    def get_user_by_id_url(self):
+        return "%s://%s/api/3.0/user/" % (self.scheme, self.hostname)
+
+
+class SceneIDClient(BaseSceneIDClient):
+    def __init__(
+        self, client_id, client_secret, hostname='id.scene.org',
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+        retry_backoff=DEFAULT_RETRY_BACKOFF, scheme='https',
+    ):
+        super().__init__(client_id, client_secret, hostname, scheme)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = get_session(hostname, pool_size, max_retries, retry_backoff)
+
+    def _request(self, phase, method, url, **kwargs):
+        breaker = circuit.get_breaker(self.hostname)
+        with instrumentation.measure(phase) as event:
+            if breaker is not None:
+                event['circuit'] = breaker.before_request()
+            try:
+                response = getattr(self.session, method)(url, timeout=self.timeout, **kwargs)
+            except requests.RequestException:
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            event.update(instrumentation.get_response_data(response))
+
+        if breaker is not None:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        if response.status_code >= 500:
+            # the body of a server error (even a JSON one) is not a usable response
+            response.raise_for_status()
+        return response.json()
+
     def get_access_token(self, code, redirect_uri):
-        url = "https://%s/oauth/token/" % self.hostname
-        response = requests.post(
-            url,
+        return self._request(
+            'token', 'post', self.get_token_url(),
             data={
                 'grant_type': 'authorization_code',
                 'code': code,
@@ -35,12 +163,188 @@ class SceneIDClient:
             },
             auth=(self.client_id, self.client_secret),
         )
-        return response.json()
 
     def get_user_data(self, access_token):
-        url = "https://%s/api/3.0/me/" % self.hostname
-        response = requests.get(
-            url,
-            headers={'Authorization': "Bearer %s" % access_token}
+        return self._request(
+            'user_data', 'get', self.get_user_data_url(),
+            headers={'Authorization': "Bearer %s" % access_token},
+        )
+
+    def refresh_access_token(self, refresh_token):
+        return self._request(
+            'refresh', 'post', self.get_token_url(),
+            data={
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token,
+            },
+            auth=(self.client_id, self.client_secret),
+        )
+
+    def get_jwks(self, url):
+        """
+        Fetch the provider's JSON Web Key Set, for verifying id_tokens
+        """
+        return self._request('jwks', 'get', url)
+
+    def get_client_credentials_token(self):
+        """
+        Obtain an access token for the site itself (rather than a user), for server-side API
+        calls such as get_user_data_by_id
+        """
+        return self._request(
+            'client_token', 'post', self.get_token_url(),
+            data={'grant_type': 'client_credentials'},
+            auth=(self.client_id, self.client_secret),
+        )
+
+    def get_user_data_by_id(self, access_token, sceneid):
+        return self._request(
+            'user_data', 'get', self.get_user_by_id_url(),
+            params={'id': sceneid},
+            headers={'Authorization': "Bearer %s" % access_token},
         )
+
+
+# httpx.AsyncClient objects keyed by (hostname, pool_size, max_retries), per event loop - an
+# async connection pool cannot be shared between loops
+_async_http_clients = weakref.WeakKeyDictionary()
+
+
+def _build_async_http_client(transport):
+    return httpx.AsyncClient(
+        transport=transport, cookies=CookieJar(policy=_no_cookies_policy())
+    )
+
+
+def get_async_http_client(hostname, pool_size=DEFAULT_POOL_SIZE,
+                          max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Return the httpx.AsyncClient used for talking to the given SceneID host from the running
+    event loop
+    """
+    loop = asyncio.get_running_loop()
+    loop_clients = _async_http_clients.setdefault(loop, {})
+    key = (hostname, pool_size, max_retries)
+    try:
+        return loop_clients[key]
+    except KeyError:
+        pass
+
+    # httpx only retries failures to connect, which are safe for any request
+    transport = httpx.AsyncHTTPTransport(
+        retries=max_retries,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
+    loop_clients[key] = _build_async_http_client(transport)
+    return loop_clients[key]
+
+
+class AsyncSceneIDClient(BaseSceneIDClient):
+    """
+    A SceneIDClient whose network methods are coroutines, for use in async views. Requires
+    the httpx library (installed with `pip install django-sceneid[async]`).
+    """
+    def __init__(
+        self, client_id, client_secret, hostname='id.scene.org',
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+        retry_backoff=DEFAULT_RETRY_BACKOFF, scheme='https', transport=None,
+    ):
+        if httpx is None:  # pragma: no cover
+            raise ImportError(
+                "AsyncSceneIDClient requires httpx - install with "
+                "`pip install django-sceneid[async]`"
+            )
+        super().__init__(client_id, client_secret, hostname, scheme)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.pool_size = pool_size
+        # retry_backoff is accepted for compatibility with SceneIDClient, but httpx retries
+        # connection failures immediately
+        self.max_retries = max_retries
+        # an explicitly passed transport (e.g. httpx.MockTransport) gets its own client;
+        # otherwise the pooled client for the running event loop is used
+        self._http_client = _build_async_http_client(transport) if transport else None
+
+    @property
+    def http_client(self):
+        if self._http_client is not None:
+            return self._http_client
+        return get_async_http_client(self.hostname, self.pool_size, self.max_retries)
+
+    async def _request(self, phase, method, url, **kwargs):
+        breaker = circuit.get_breaker(self.hostname)
+        with instrumentation.measure(phase) as event:
+            if breaker is not None:
+                event['circuit'] = await breaker.abefore_request()
+            try:
+                response = await getattr(self.http_client, method)(
+                    url, timeout=self.timeout, **kwargs
+                )
+            except httpx.HTTPError:
+                if breaker is not None:
+                    await breaker.arecord_failure()
+                raise
+            event.update(instrumentation.get_response_data(response))
+
+        if breaker is not None:
+            if response.status_code >= 500:
+                await breaker.arecord_failure()
+            else:
+                await breaker.arecord_success()
+        if response.status_code >= 500:
+            response.raise_for_status()
         return response.json()
+
+    async def get_access_token(self, code, redirect_uri):
+        return await self._request(
+            'token', 'post', self.get_token_url(),
+            data={
+                'grant_type': 'authorization_code',
+                'code': code,
+                'redirect_uri': redirect_uri,
+            },
+            auth=(self.client_id, self.client_secret),
+        )
+
+    async def get_user_data(self, access_token):
+        return await self._request(
+            'user_data', 'get', self.get_user_data_url(),
+            headers={'Authorization': "Bearer %s" % access_token},
+        )
+
+    async def refresh_access_token(self, refresh_token):
+        return await self._request(
+            'refresh', 'post', self.get_token_url(),
+            data={
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token,
+            },
+            auth=(self.client_id, self.client_secret),
+        )
+
+    async def get_jwks(self, url):
+        return await self._request('jwks', 'get', url)
+
+
+# SceneIDClient instances keyed by their constructor arguments, so that views can reuse a
+# single client per configuration rather than building one per request
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(client_id, client_secret, hostname='id.scene.org', client_class=SceneIDClient,
+               **kwargs):
+    """
+    Return a shared SceneIDClient (or AsyncSceneIDClient, if passed as client_class) for the
+    given configuration
+    """
+    key = (client_class, client_id, client_secret, hostname, tuple(sorted(kwargs.items())))
+    try:
+        return _clients[key]
+    except KeyError:
+        pass
+
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = client_class(client_id, client_secret, hostname, **kwargs)
+        return _clients[key]
@@ -1,14 +1,21 @@
 import re
+import unicodedata
+
 from django.contrib.auth.forms import UsernameField
 from django.contrib.auth.models import User
 from django import forms
 
+from sceneid.routers import get_read_database
+
 
 class UserCreationForm(forms.ModelForm):
     """
     A form that creates a user with no usable password.
     """
 
+    # the highest numeric suffix tried when suggesting a username
+    username_suffix_limit = 20
+
     class Meta:
         model = User
         fields = ("username",)
@@ -18,9 +25,15 @@ class UserCreationForm(forms.ModelForm):
         username_field_name = self._meta.model.USERNAME_FIELD
 
         initial_data = kwargs.setdefault('initial', {})
-        if 'display_name' in sceneid_user_data:
-            clean_username = re.sub(r"[^a-z0-9A-Z]+", "", sceneid_user_data['display_name'])
-            initial_data.setdefault(username_field_name, clean_username)
+        if 'display_name' in sceneid_user_data and username_field_name not in initial_data:
+            candidates = self.get_username_candidates(sceneid_user_data['display_name'])
+            if candidates:
+                is_bound = (args and args[0] is not None) or kwargs.get('data') is not None
+                # the initial value of a bound form is not displayed, so don't spend a query
+                # on it
+                initial_data[username_field_name] = (
+                    candidates[0] if is_bound else self.get_available_username(candidates)
+                )
 
         initial_data.setdefault('first_name', sceneid_user_data.get('first_name'))
         initial_data.setdefault('last_name', sceneid_user_data.get('last_name'))
@@ -29,6 +42,45 @@ class UserCreationForm(forms.ModelForm):
         if username_field_name in self.fields:
             self.fields[username_field_name].widget.attrs['autofocus'] = True
 
+    def get_username_candidates(self, display_name):
+        """
+        Return a list of usernames derived from the SceneID display name, in order of
+        preference: an ASCII transliteration of the name with all non-alphanumeric characters
+        removed, the name with accented letters dropped rather than transliterated (if
+        different), and then numbered variants of these.
+        """
+        max_length = self._meta.model._meta.get_field(self._meta.model.USERNAME_FIELD).max_length
+        transliterated = unicodedata.normalize('NFKD', display_name).encode('ascii', 'ignore')
+
+        bases = []
+        for name in (transliterated.decode('ascii'), display_name):
+            base = re.sub(r"[^a-z0-9A-Z]+", "", name)[:max_length]
+            if base and base not in bases:
+                bases.append(base)
+
+        candidates = list(bases)
+        for base in bases:
+            for i in range(2, self.username_suffix_limit + 1):
+                suffix = str(i)
+                candidates.append(base[:max_length - len(suffix)] + suffix)
+        return candidates
+
+    def get_available_username(self, candidates):
+        """
+        Return the first of the candidate usernames that is not already taken, using a single
+        query; if all are taken, return the first candidate
+        """
+        username_field_name = self._meta.model.USERNAME_FIELD
+        taken = set(
+            self._meta.model._default_manager.using(get_read_database()).filter(
+                **{'%s__in' % username_field_name: candidates}
+            ).values_list(username_field_name, flat=True)
+        )
+        for candidate in candidates:
+            if candidate not in taken:
+                return candidate
+        return candidates[0]
+
     def save(self, commit=True):
         user = super().save(commit=False)
         user.set_unusable_password()
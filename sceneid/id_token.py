@@ -0,0 +1,151 @@
+"""
+Verification of an OpenID Connect id_token returned with the access token, so that the user's
+details can be read from its claims rather than by a second request to /api/3.0/me/.
+
+Enabled by setting SCENEID_ID_TOKEN_JWKS_URL to the URL of the provider's JSON Web Key Set.
+The key set is cached (in the cache selected by SCENEID_CACHE) for
+SCENEID_ID_TOKEN_JWKS_CACHE_TIMEOUT seconds, and fetched again when a token is signed with a
+key that is not in it. Requires the PyJWT library (installed with
+`pip install django-sceneid[jwt]`). If the token response has no id_token, or it cannot be
+verified, None is returned and the caller falls back on the /me request.
+"""
+import functools
+import json
+import logging
+
+from django.conf import settings
+
+from sceneid import instrumentation
+from sceneid.user_cache import get_cache
+
+try:
+    import jwt
+except ImportError:  # pragma: no cover
+    jwt = None
+
+
+logger = logging.getLogger('sceneid')
+
+JWKS_CACHE_KEY = 'sceneid:jwks:%s'
+
+
+def get_jwks_url():
+    return getattr(settings, 'SCENEID_ID_TOKEN_JWKS_URL', None)
+
+
+def is_enabled():
+    return jwt is not None and get_jwks_url() is not None
+
+
+def get_issuer(client):
+    return getattr(
+        settings, 'SCENEID_ID_TOKEN_ISSUER', '%s://%s' % (client.scheme, client.hostname)
+    )
+
+
+def get_algorithms():
+    return getattr(settings, 'SCENEID_ID_TOKEN_ALGORITHMS', ['RS256'])
+
+
+def get_jwks_cache_timeout():
+    return getattr(settings, 'SCENEID_ID_TOKEN_JWKS_CACHE_TIMEOUT', 60 * 60)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_key(jwk_json):
+    return jwt.PyJWK(json.loads(jwk_json)).key
+
+
+def _find_key(jwks, kid):
+    for jwk in jwks.get('keys', []):
+        if kid is None or jwk.get('kid') == kid:
+            return _load_key(json.dumps(jwk, sort_keys=True))
+    return None
+
+
+def claims_to_user_data(claims):
+    """
+    Convert id_token claims to the form of the /api/3.0/me/ response
+    """
+    user = {'id': int(claims['sub'])}
+    for field, claim_names in (
+        ('first_name', ('given_name',)),
+        ('last_name', ('family_name',)),
+        ('display_name', ('nickname', 'preferred_username', 'name')),
+    ):
+        for claim_name in claim_names:
+            if claim_name in claims:
+                user[field] = claims[claim_name]
+                break
+    return {'success': True, 'user': user}
+
+
+def _decode(id_token, key, client):
+    claims = jwt.decode(
+        id_token, key, algorithms=get_algorithms(),
+        audience=client.client_id, issuer=get_issuer(client),
+        options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']},
+    )
+    return claims_to_user_data(claims)
+
+
+def get_user_data(token_data, client):
+    """
+    Return the user data contained in the id_token of token_data, verified against the
+    provider's keys, or None if there is no id_token or it cannot be verified
+    """
+    id_token = token_data.get('id_token')
+    if not id_token or not is_enabled():
+        return None
+
+    with instrumentation.measure('id_token') as event:
+        try:
+            kid = jwt.get_unverified_header(id_token).get('kid')
+            cache = get_cache()
+            cache_key = JWKS_CACHE_KEY % get_jwks_url()
+            jwks = cache.get(cache_key)
+            key = _find_key(jwks, kid) if jwks is not None else None
+            if key is None:
+                # not cached, or the provider has rotated its keys
+                jwks = client.get_jwks(get_jwks_url())
+                cache.set(cache_key, jwks, get_jwks_cache_timeout())
+                key = _find_key(jwks, kid)
+            if key is None:
+                raise jwt.InvalidTokenError("No key found for kid %r" % kid)
+            user_data = _decode(id_token, key, client)
+        except Exception as e:
+            # whatever the reason, the /me request is still there to fall back on
+            logger.warning("Could not verify SceneID id_token: %s", e)
+            event['verified'] = False
+            return None
+
+        event['verified'] = True
+        return user_data
+
+
+async def aget_user_data(token_data, client):
+    id_token = token_data.get('id_token')
+    if not id_token or not is_enabled():
+        return None
+
+    with instrumentation.measure('id_token') as event:
+        try:
+            kid = jwt.get_unverified_header(id_token).get('kid')
+            cache = get_cache()
+            cache_key = JWKS_CACHE_KEY % get_jwks_url()
+            jwks = await cache.aget(cache_key)
+            key = _find_key(jwks, kid) if jwks is not None else None
+            if key is None:
+                jwks = await client.get_jwks(get_jwks_url())
+                await cache.aset(cache_key, jwks, get_jwks_cache_timeout())
+                key = _find_key(jwks, kid)
+            if key is None:
+                raise jwt.InvalidTokenError("No key found for kid %r" % kid)
+            user_data = _decode(id_token, key, client)
+        except Exception as e:
+            logger.warning("Could not verify SceneID id_token: %s", e)
+            event['verified'] = False
+            return None
+
+        event['verified'] = True
+        return user_data
@@ -0,0 +1,158 @@
+"""
+Timing events for the phases of the SceneID login flow.
+
+Each phase (the token exchange, the user data request, the user lookup and so on) emits an
+event with its duration in seconds, plus details such as the HTTP status, response size and
+retry count where applicable. Events are passed to each sink listed in the
+SCENEID_METRICS_SINKS setting, and sent as the `phase_timed` signal. When there are no sinks
+and no signal receivers, nothing is timed.
+"""
+from contextlib import contextmanager
+import logging
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import Signal, receiver
+from django.utils.module_loading import import_string
+
+
+# sent with the keyword arguments phase, duration and data
+phase_timed = Signal()
+
+
+_sinks = None
+
+
+def get_sinks():
+    """
+    Return the list of sink objects configured in SCENEID_METRICS_SINKS. Each entry is either
+    a dotted path to a sink class, or a (dotted path, kwargs) tuple.
+    """
+    global _sinks
+    if _sinks is None:
+        sinks = []
+        for entry in getattr(settings, 'SCENEID_METRICS_SINKS', []):
+            if isinstance(entry, str):
+                path, kwargs = entry, {}
+            else:
+                path, kwargs = entry
+            sinks.append(import_string(path)(**kwargs))
+        _sinks = sinks
+    return _sinks
+
+
+@receiver(setting_changed)
+def _reset_sinks(setting, **kwargs):
+    global _sinks
+    if setting == 'SCENEID_METRICS_SINKS':
+        _sinks = None
+
+
+def is_enabled():
+    return bool(get_sinks()) or phase_timed.has_listeners()
+
+
+def emit(phase, duration, **data):
+    for sink in get_sinks():
+        sink.record(phase, duration, data)
+    phase_timed.send(sender=None, phase=phase, duration=duration, data=data)
+
+
+@contextmanager
+def measure(phase, **data):
+    """
+    Time the enclosed block as the given phase. Yields a dict to which the block can add
+    further details of the event; if the block raises an exception, its class name is
+    recorded as 'error'.
+    """
+    if not is_enabled():
+        yield data
+        return
+
+    start = time.perf_counter()
+    try:
+        yield data
+    except Exception as e:
+        data['error'] = type(e).__name__
+        raise
+    finally:
+        emit(phase, time.perf_counter() - start, **data)
+
+
+def get_response_data(response):
+    """
+    Return the event details for a requests or httpx response
+    """
+    data = {
+        'status': response.status_code,
+        'bytes': len(response.content),
+    }
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    data['retries'] = len(retries.history) if retries is not None else 0
+    return data
+
+
+class LoggingSink:
+    """
+    Write each event to a logger (named 'sceneid.metrics' by default)
+    """
+    def __init__(self, logger='sceneid.metrics', level=logging.INFO):
+        self.logger = logging.getLogger(logger)
+        self.level = level
+
+    def record(self, phase, duration, data):
+        self.logger.log(
+            self.level, "%s took %.1fms %s", phase, duration * 1000,
+            " ".join("%s=%s" % item for item in sorted(data.items())),
+            extra={'sceneid_phase': phase, 'sceneid_duration': duration, 'sceneid_data': data},
+        )
+
+
+class StatsdSink:
+    """
+    Send each event as a StatsD timer named <prefix>.<phase>, with a counter of
+    <prefix>.<phase>.status.<status> or <prefix>.<phase>.error.<error class>. Takes an existing
+    client object (anything with the `timing` and `incr` methods of the `statsd` package's
+    StatsClient), or creates a StatsClient from the remaining keyword arguments.
+    """
+    def __init__(self, client=None, prefix='sceneid', **client_kwargs):
+        if client is None:
+            import statsd
+            client = statsd.StatsClient(**client_kwargs)
+        elif isinstance(client, str):
+            client = import_string(client)
+        self.client = client
+        self.prefix = prefix
+
+    def record(self, phase, duration, data):
+        name = '%s.%s' % (self.prefix, phase)
+        self.client.timing(name, duration * 1000)
+        if 'error' in data:
+            self.client.incr('%s.error.%s' % (name, data['error']))
+        elif 'status' in data:
+            self.client.incr('%s.status.%s' % (name, data['status']))
+
+
+class PrometheusSink:
+    """
+    Record each event in a prometheus_client Histogram, labelled by phase and outcome (the
+    HTTP status or error class, or 'ok')
+    """
+    _histograms = {}
+
+    def __init__(self, name='sceneid_phase_duration_seconds', registry=None):
+        import prometheus_client
+
+        # metrics can only be registered once per registry, so share them between instances
+        key = (name, id(registry))
+        if key not in self._histograms:
+            kwargs = {} if registry is None else {'registry': registry}
+            self._histograms[key] = prometheus_client.Histogram(
+                name, "Duration of SceneID login phases", ['phase', 'outcome'], **kwargs
+            )
+        self.histogram = self._histograms[key]
+
+    def record(self, phase, duration, data):
+        outcome = data.get('error') or data.get('status') or 'ok'
+        self.histogram.labels(phase=phase, outcome=str(outcome)).observe(duration)
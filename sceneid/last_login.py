@@ -0,0 +1,101 @@
+"""
+Tracking of when each SceneID was last used to log in, in SceneID.last_login_at.
+
+Rather than updating the SceneID row on every login, login times are collected in memory and
+written in one UPDATE per batch of SceneIDs (run through the task backend in sceneid.tasks).
+The write happens at the first login once SCENEID_LAST_LOGIN_FLUSH_INTERVAL seconds have passed
+since the previous one, so when logins are infrequent a time may wait longer than the interval.
+Rows whose stored time is within SCENEID_LAST_LOGIN_GRANULARITY seconds of their new one are
+left alone, so a frequently used SceneID is written at most once in that period. Times that
+have not been written when the process exits are flushed at exit.
+"""
+import atexit
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from sceneid.models import SceneID
+
+
+logger = logging.getLogger('sceneid')
+
+# the number of SceneIDs to update in a single query
+FLUSH_BATCH_SIZE = 500
+
+_pending = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def get_flush_interval():
+    return getattr(settings, 'SCENEID_LAST_LOGIN_FLUSH_INTERVAL', None)
+
+
+def get_granularity():
+    return getattr(settings, 'SCENEID_LAST_LOGIN_GRANULARITY', 60 * 60)
+
+
+def is_enabled():
+    return get_flush_interval() is not None
+
+
+def record(sceneid):
+    """
+    Note a login with the given SceneID. Return True if a flush is due.
+    """
+    global _last_flush
+    interval = get_flush_interval()
+    if interval is None:
+        return False
+
+    now = time.monotonic()
+    with _lock:
+        _pending[sceneid] = timezone.now()
+        if now - _last_flush >= interval:
+            _last_flush = now
+            return True
+    return False
+
+
+def flush():
+    """
+    Write the collected login times to the database, and return the number of rows updated
+    """
+    with _lock:
+        items = list(_pending.items())
+        _pending.clear()
+
+    granularity = datetime.timedelta(seconds=get_granularity())
+    updated = 0
+    for i in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[i:i + FLUSH_BATCH_SIZE]
+        # each row is compared against its own login time
+        condition = Q()
+        for sceneid, logged_in_at in batch:
+            condition |= Q(sceneid=sceneid) & (
+                Q(last_login_at__isnull=True) | Q(last_login_at__lt=logged_in_at - granularity)
+            )
+        updated += SceneID.objects.filter(
+            condition, sceneid__in=[sceneid for sceneid, _ in batch],
+        ).update(last_login_at=Case(
+            *[When(sceneid=sceneid, then=Value(logged_in_at)) for sceneid, logged_in_at in batch],
+            default=F('last_login_at'),
+        ))
+    return updated
+
+
+def _flush_at_exit():
+    if not _pending:
+        return
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not write SceneID last login times")
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,251 @@
+import csv
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sceneid import user_cache
+from sceneid.models import SceneID
+
+
+FORMATS = ('csv', 'jsonl')
+
+
+class Command(BaseCommand):
+    help = (
+        "Import or export links between SceneID numbers and user accounts, as CSV or JSON Lines. "
+        "Rows have the fields sceneid, user_id and username; on import, user_id takes "
+        "precedence and username is used when user_id is empty or absent."
+    )
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        export_parser = subparsers.add_parser('export', help="Write all links to a file")
+        export_parser.add_argument(
+            'file', nargs='?', default='-', help="File to write to (default: standard output)"
+        )
+        export_parser.add_argument('--format', choices=FORMATS)
+        export_parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Number of rows to fetch from the database at a time (default 2000)"
+        )
+
+        import_parser = subparsers.add_parser('import', help="Create links from a file")
+        import_parser.add_argument(
+            'file', nargs='?', default='-', help="File to read from (default: standard input)"
+        )
+        import_parser.add_argument('--format', choices=FORMATS)
+        import_parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of rows to write to the database at a time (default 1000)"
+        )
+        import_parser.add_argument(
+            '--on-conflict', choices=('skip', 'update'), default='skip',
+            help=(
+                "What to do when a SceneID number is already linked: 'skip' keeps the existing "
+                "link, 'update' moves it to the user given in the file (default skip)"
+            )
+        )
+        import_parser.add_argument(
+            '--dry-run', action='store_true', help="Report what would be done without writing"
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or self.guess_format(options['file'])
+        if options['action'] == 'export':
+            self.export_links(options['file'], file_format, options['chunk_size'])
+        else:
+            self.import_links(
+                options['file'], file_format, options['batch_size'], options['on_conflict'],
+                options['dry_run'],
+            )
+
+    def guess_format(self, filename):
+        if filename.endswith('.jsonl') or filename.endswith('.ndjson'):
+            return 'jsonl'
+        elif filename.endswith('.csv') or filename == '-':
+            return 'csv'
+        raise CommandError("Cannot tell the format of %s - pass --format" % filename)
+
+    def open_file(self, filename, mode):
+        if filename == '-':
+            return self.stdout if mode == 'w' else sys.stdin
+        return open(filename, mode, newline='', encoding='utf-8')
+
+    # Export
+
+    def export_links(self, filename, file_format, chunk_size):
+        rows = SceneID.objects.order_by('pk').values_list(
+            'sceneid', 'user_id', 'user__%s' % get_user_model().USERNAME_FIELD
+        ).iterator(chunk_size=chunk_size)
+
+        f = self.open_file(filename, 'w')
+        try:
+            if file_format == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(['sceneid', 'user_id', 'username'])
+                writer.writerows(rows)
+            else:
+                for sceneid, user_id, username in rows:
+                    f.write(json.dumps(
+                        {'sceneid': sceneid, 'user_id': user_id, 'username': username}
+                    ) + "\n")
+        finally:
+            if f is not self.stdout:
+                f.close()
+
+    # Import
+
+    def read_rows(self, f, file_format):
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield {'_error': "line %d is not valid JSON" % line_number}
+
+    def read_batches(self, rows, batch_size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def import_links(self, filename, file_format, batch_size, on_conflict, dry_run):
+        self.totals = {'rows': 0, 'created': 0, 'updated': 0, 'conflicts': 0, 'errors': 0}
+
+        f = self.open_file(filename, 'r')
+        try:
+            for batch in self.read_batches(self.read_rows(f, file_format), batch_size):
+                self.import_batch(batch, on_conflict, dry_run)
+                self.stderr.write(
+                    "Processed %(rows)d rows: %(created)d created, %(updated)d updated, "
+                    "%(conflicts)d conflicts, %(errors)d errors" % self.totals
+                )
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+        self.stdout.write(
+            "%s%d links created, %d updated, %d conflicts skipped, %d rows with errors" % (
+                "(dry run) " if dry_run else "",
+                self.totals['created'], self.totals['updated'], self.totals['conflicts'],
+                self.totals['errors'],
+            )
+        )
+
+    def report(self, kind, row, message):
+        self.totals[kind] += 1
+        self.stderr.write("%s: %s" % (message, {k: v for k, v in row.items() if k != '_error'}))
+
+    def import_batch(self, batch, on_conflict, dry_run):
+        User = get_user_model()
+        self.totals['rows'] += len(batch)
+
+        # parse rows into (sceneid, user_id, username, row)
+        parsed = []
+        for row in batch:
+            if '_error' in row:
+                self.report('errors', row, row['_error'])
+                continue
+            try:
+                sceneid = int(row['sceneid'])
+                user_id = row.get('user_id')
+                user_id = int(user_id) if user_id not in (None, '') else None
+            except (KeyError, TypeError, ValueError):
+                self.report('errors', row, "Invalid row")
+                continue
+            username = row.get('username') or None
+            if user_id is None and username is None:
+                self.report('errors', row, "No user_id or username")
+                continue
+            parsed.append((sceneid, user_id, username, row))
+
+        # resolve usernames and check that user IDs exist, in one query each
+        usernames = {username for _, user_id, username, _ in parsed if user_id is None}
+        user_ids_by_username = dict(
+            User._default_manager.filter(**{'%s__in' % User.USERNAME_FIELD: usernames})
+            .values_list(User.USERNAME_FIELD, 'pk')
+        ) if usernames else {}
+        given_user_ids = {user_id for _, user_id, _, _ in parsed if user_id is not None}
+        existing_user_ids = set(
+            User._default_manager.filter(pk__in=given_user_ids).values_list('pk', flat=True)
+        ) if given_user_ids else set()
+
+        links = {}
+        for sceneid, user_id, username, row in parsed:
+            if user_id is None:
+                user_id = user_ids_by_username.get(username)
+            elif user_id not in existing_user_ids:
+                user_id = None
+            if user_id is None:
+                self.report('errors', row, "User does not exist")
+                continue
+            if sceneid in links:
+                self.report('conflicts', row, "Duplicate SceneID in file")
+                continue
+            links[sceneid] = user_id
+
+        existing_links = dict(
+            SceneID.objects.filter(sceneid__in=links).values_list('sceneid', 'user_id')
+        )
+        new_links = {}
+        changed_links = {}
+        for sceneid, user_id in links.items():
+            if sceneid not in existing_links:
+                new_links[sceneid] = user_id
+            elif existing_links[sceneid] != user_id:
+                if on_conflict == 'update':
+                    changed_links[sceneid] = user_id
+                else:
+                    self.report(
+                        'conflicts', {'sceneid': sceneid, 'user_id': user_id},
+                        "SceneID already linked to user %d" % existing_links[sceneid]
+                    )
+
+        created = len(new_links)
+        if not dry_run:
+            with transaction.atomic():
+                # ignore_conflicts covers links created by another process since the check
+                # above; bulk_create sends no signals, so invalidate the user cache ourselves
+                SceneID.objects.bulk_create(
+                    [SceneID(sceneid=sceneid, user_id=user_id)
+                     for sceneid, user_id in new_links.items()],
+                    ignore_conflicts=True,
+                )
+                if new_links:
+                    # count only the links that were written, rather than those skipped as
+                    # conflicts
+                    created = 0
+                    written_links = dict(
+                        SceneID.objects.filter(sceneid__in=new_links)
+                        .values_list('sceneid', 'user_id')
+                    )
+                    for sceneid, user_id in new_links.items():
+                        if written_links.get(sceneid) == user_id:
+                            created += 1
+                        else:
+                            self.report(
+                                'conflicts', {'sceneid': sceneid, 'user_id': user_id},
+                                "SceneID linked to user %s by another process"
+                                % written_links.get(sceneid)
+                            )
+                if changed_links:
+                    links_to_update = list(SceneID.objects.filter(sceneid__in=changed_links))
+                    for link in links_to_update:
+                        link.user_id = changed_links[link.sceneid]
+                    SceneID.objects.bulk_update(links_to_update, ['user'])
+                user_cache.invalidate(list(new_links) + list(changed_links))
+
+        self.totals['created'] += created
+        self.totals['updated'] += len(changed_links)
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sceneid import audit
+from sceneid.models import SceneIDLoginEvent
+
+
+class Command(BaseCommand):
+    help = "Delete SceneID login events older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Number of days of events to keep (default SCENEID_AUDIT_RETENTION_DAYS, or 90)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of events to delete per query (default 1000)"
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else audit.get_retention_days()
+        cutoff = timezone.now() - datetime.timedelta(days=days)
+        expired = SceneIDLoginEvent.objects.filter(created_at__lt=cutoff).order_by('created_at')
+        deleted = 0
+        while True:
+            # delete in batches to keep each transaction short
+            batch = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += SceneIDLoginEvent.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write("%d login events deleted" % deleted)
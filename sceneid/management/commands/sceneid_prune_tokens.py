@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sceneid.models import SceneIDToken
+
+
+class Command(BaseCommand):
+    help = "Delete stored SceneID tokens whose refresh token has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of tokens to delete per query (default 1000)"
+        )
+
+    def handle(self, *args, **options):
+        expired = SceneIDToken.objects.filter(expires_at__lte=timezone.now())
+        deleted = 0
+        while True:
+            # delete in batches to keep each transaction short
+            batch = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += SceneIDToken.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write("%d expired tokens deleted" % deleted)
@@ -0,0 +1,43 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from sceneid.resync import resync_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the profile details (first and last name) of users linked to SceneID accounts "
+        "whose profiles have not been refreshed recently"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=7,
+            help="Refresh users not refreshed within this many days (default 7)"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Number of concurrent requests to SceneID (default 4)"
+        )
+        parser.add_argument(
+            '--rate', type=float, default=5,
+            help="Maximum requests to SceneID per second, or 0 for no limit (default 5)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="Number of users to update in the database at a time (default 100)"
+        )
+        parser.add_argument('--limit', type=int, help="Stop after checking this many users")
+
+    def handle(self, *args, **options):
+        stats = resync_profiles(
+            older_than=datetime.timedelta(days=options['days']),
+            max_workers=options['workers'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+        )
+        self.stdout.write(
+            "%(checked)d users checked, %(updated)d updated, %(failed)d failed" % stats
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sceneid', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sceneid',
+            name='profile_synced_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sceneid', '0002_sceneid_profile_synced_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SceneIDToken',
+            fields=[
+                ('sceneid', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='token', serialize=False, to='sceneid.sceneid', to_field='sceneid')),
+                ('access_token', models.CharField(max_length=255)),
+                ('access_token_expires_at', models.DateTimeField()),
+                ('refresh_token', models.CharField(max_length=255)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
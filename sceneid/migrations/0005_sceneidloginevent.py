@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sceneid', '0004_sceneid_last_login_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SceneIDLoginEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('event', models.CharField(choices=[('login', 'Logged in'), ('silent_login', 'Logged in with a stored refresh token'), ('state_mismatch', 'Rejected: state mismatch'), ('deactivated', 'Rejected: account deactivated'), ('unlinked', 'SceneID not linked to an account'), ('link_existing', 'Linked to an existing account'), ('link_new', 'Linked to a new account')], max_length=20)),
+                ('sceneid', models.IntegerField(blank=True, null=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sceneid', 'created_at'], name='sceneid_sce_sceneid_0c8ecf_idx'), models.Index(fields=['user', 'created_at'], name='sceneid_sce_user_id_758354_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sceneid', '0005_sceneidloginevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sceneidtoken',
+            name='secret',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -2,8 +2,106 @@ from django.conf import settings
 from django.db import models
 
 
+class SceneIDQuerySet(models.QuerySet):
+    def for_users(self, users):
+        """
+        Filter to the links of the given users (a queryset, or a list of users or user IDs)
+        """
+        return self.filter(user__in=users)
+
+    def numbers_by_user(self):
+        """
+        Return a dict mapping user IDs to the list of SceneID numbers linked to them
+        """
+        numbers = {}
+        for user_id, sceneid in self.order_by('sceneid').values_list('user_id', 'sceneid'):
+            numbers.setdefault(user_id, []).append(sceneid)
+        return numbers
+
+    def exists_for(self, user_ref):
+        """
+        Return an Exists expression that is true if there is a link for the user referenced by
+        user_ref (an OuterRef), for use in annotations: for example,
+        Profile.objects.annotate(has_sceneid=SceneID.objects.exists_for(OuterRef('user')))
+        """
+        return models.Exists(self.filter(user=user_ref))
+
+
 class SceneID(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sceneids'
     )
     sceneid = models.IntegerField(unique=True)
+    # when the user's profile was last refreshed from SceneID (see sceneid.resync)
+    profile_synced_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # when the SceneID was last used to log in, to within SCENEID_LAST_LOGIN_GRANULARITY
+    # (see sceneid.last_login)
+    last_login_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = SceneIDQuerySet.as_manager()
+
+    def __str__(self):
+        return str(self.sceneid)
+
+
+class SceneIDToken(models.Model):
+    """
+    OAuth tokens for a SceneID account, stored when SCENEID_STORE_TOKENS is enabled so that
+    the user can be logged in again with a refresh token request (see sceneid.tokens)
+    """
+    sceneid = models.OneToOneField(
+        SceneID, on_delete=models.CASCADE, to_field='sceneid', primary_key=True,
+        related_name='token'
+    )
+    access_token = models.CharField(max_length=255)
+    access_token_expires_at = models.DateTimeField()
+    refresh_token = models.CharField(max_length=255)
+    # random value that the remember cookie must present for a silent login; replaced at each
+    # full login, so an older cookie no longer works
+    secret = models.CharField(max_length=64, blank=True)
+    # when the refresh token is assumed to lapse; expired tokens are removed by the
+    # sceneid_prune_tokens management command
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class SceneIDLoginEvent(models.Model):
+    """
+    A record of a login attempt through SceneID, written when SCENEID_AUDIT_LOG is enabled
+    (see sceneid.audit). Old events are removed by the sceneid_prune_login_events management
+    command.
+    """
+    LOGIN = 'login'
+    SILENT_LOGIN = 'silent_login'
+    STATE_MISMATCH = 'state_mismatch'
+    DEACTIVATED = 'deactivated'
+    UNLINKED = 'unlinked'
+    LINK_EXISTING = 'link_existing'
+    LINK_NEW = 'link_new'
+    EVENT_CHOICES = [
+        (LOGIN, "Logged in"),
+        (SILENT_LOGIN, "Logged in with a stored refresh token"),
+        (STATE_MISMATCH, "Rejected: state mismatch"),
+        (DEACTIVATED, "Rejected: account deactivated"),
+        (UNLINKED, "SceneID not linked to an account"),
+        (LINK_EXISTING, "Linked to an existing account"),
+        (LINK_NEW, "Linked to a new account"),
+    ]
+
+    created_at = models.DateTimeField(db_index=True)
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    # not a foreign key to SceneID, so that events outlive the link (and can be recorded for
+    # SceneIDs that were never linked)
+    sceneid = models.IntegerField(null=True, blank=True)
+    # indexed together with created_at below
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False
+    )
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sceneid', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
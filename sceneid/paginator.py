@@ -0,0 +1,63 @@
+"""
+A paginator for the admin lists of SceneID links and login events, which can grow to millions
+of rows.
+
+Django's Paginator counts the whole table to number the pages of an unfiltered list, which
+takes time in proportion to the size of the table. EstimatedCountPaginator reads the row count
+of an unfiltered list from the table statistics kept by PostgreSQL and MySQL instead, and
+counts exactly when the list is filtered, when the table is small, or on other databases.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+# tables estimated to have fewer rows than this are counted exactly
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """
+    Return the number of rows in the table of an unfiltered queryset as estimated by the
+    database, or None if there is no estimate (the queryset is filtered, or the database does
+    not keep one)
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.combinator or query.is_sliced:
+        return None
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+        params = [connection.ops.quote_name(table)]
+    elif connection.vendor == 'mysql':
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+        params = [table]
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for a table that has never been analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator that takes the count of an unfiltered queryset from the database's table
+    statistics, rather than counting the whole table
+    """
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
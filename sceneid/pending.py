@@ -0,0 +1,122 @@
+"""
+Storage for the SceneID user data of a login that has not yet been connected to a user
+account, between LoginView and the connect views. The store class is configurable through the
+SCENEID_PENDING_CONNECTION_STORE setting.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+
+SESSION_KEY = 'sceneid_pending_connection'
+
+# key under which OAuth token data is kept alongside the user data, when SCENEID_STORE_TOKENS
+# is enabled
+TOKEN_KEY = '_token'
+
+# the fields of the SceneID user data used by the connect views and forms
+DEFAULT_FIELDS = ('id', 'first_name', 'last_name', 'display_name')
+
+
+def split_token_data(data):
+    """
+    Split data returned from a store's load method into (user_data, token_data)
+    """
+    if data is None:
+        return None, None
+    user_data = dict(data)
+    token_data = user_data.pop(TOKEN_KEY, None)
+    return user_data, token_data
+
+
+def get_store():
+    store_class = import_string(getattr(
+        settings, 'SCENEID_PENDING_CONNECTION_STORE', 'sceneid.pending.CachePendingConnectionStore'
+    ))
+    return store_class()
+
+
+class BasePendingConnectionStore:
+    def get_timeout(self):
+        return getattr(settings, 'SCENEID_PENDING_CONNECTION_TIMEOUT', 60 * 60)
+
+    def get_fields(self):
+        return getattr(settings, 'SCENEID_PENDING_CONNECTION_FIELDS', DEFAULT_FIELDS)
+
+    def compact(self, user_data, token_data=None):
+        """
+        Return the subset of the SceneID user data that needs to be stored, along with the
+        token data (if any) under the key TOKEN_KEY
+        """
+        data = {field: user_data[field] for field in self.get_fields() if field in user_data}
+        if token_data:
+            data[TOKEN_KEY] = token_data
+        return data
+
+    def save(self, request, user_data, token_data=None):
+        raise NotImplementedError  # pragma: no cover
+
+    def load(self, request):
+        """
+        Return the stored data for this request, or None if there is none (or it has expired)
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def clear(self, request):
+        raise NotImplementedError  # pragma: no cover
+
+    async def asave(self, request, user_data, token_data=None):
+        return await sync_to_async(self.save)(request, user_data, token_data)
+
+    async def aload(self, request):
+        return await sync_to_async(self.load)(request)
+
+    async def aclear(self, request):
+        return await sync_to_async(self.clear)(request)
+
+
+class CachePendingConnectionStore(BasePendingConnectionStore):
+    """
+    Store the user data in the cache (as selected by SCENEID_CACHE), with only an opaque
+    handle kept in the session
+    """
+    def get_cache(self):
+        return caches[getattr(settings, 'SCENEID_CACHE', 'default')]
+
+    def get_cache_key(self, handle):
+        return 'sceneid:pending:%s' % handle
+
+    def save(self, request, user_data, token_data=None):
+        handle = get_random_string(length=32)
+        self.get_cache().set(
+            self.get_cache_key(handle), self.compact(user_data, token_data), self.get_timeout()
+        )
+        request.session[SESSION_KEY] = handle
+
+    def load(self, request):
+        handle = request.session.get(SESSION_KEY)
+        if handle is None:
+            return None
+        return self.get_cache().get(self.get_cache_key(handle))
+
+    def clear(self, request):
+        handle = request.session.pop(SESSION_KEY, None)
+        if handle is not None:
+            self.get_cache().delete(self.get_cache_key(handle))
+
+
+class SessionPendingConnectionStore(BasePendingConnectionStore):
+    """
+    Store the user data in the session itself, for deployments with no cache shared between
+    processes
+    """
+    def save(self, request, user_data, token_data=None):
+        request.session[SESSION_KEY] = self.compact(user_data, token_data)
+
+    def load(self, request):
+        return request.session.get(SESSION_KEY)
+
+    def clear(self, request):
+        request.session.pop(SESSION_KEY, None)
@@ -0,0 +1,178 @@
+"""
+Refreshing the profile details of linked users from SceneID.
+
+UserCreationForm copies the user's name from SceneID at registration only. resync_profiles
+fetches the current details of each linked user whose profile has not been refreshed
+recently, over a bounded pool of threads with a shared rate limit, and writes back any changed
+fields with bulk_update. Progress is recorded in SceneID.profile_synced_at as each batch
+completes, so an interrupted run picks up where it left off.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import logging
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from sceneid import backends
+from sceneid.models import SceneID
+
+
+logger = logging.getLogger(__name__)
+
+
+# mapping of user model fields to the SceneID user data fields they are populated from
+PROFILE_FIELDS = {
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+}
+
+
+def update_user_profile(user, user_data):
+    """
+    Copy the SceneID profile fields in user_data onto user (without saving), and return the
+    list of user model fields that changed
+    """
+    model_field_names = {field.name for field in user._meta.get_fields()}
+    changed_fields = []
+    for user_field, sceneid_field in PROFILE_FIELDS.items():
+        if user_field not in model_field_names or sceneid_field not in user_data:
+            continue
+        value = user_data[sceneid_field] or ''
+        max_length = user._meta.get_field(user_field).max_length
+        if max_length:
+            value = value[:max_length]
+        if getattr(user, user_field) != value:
+            setattr(user, user_field, value)
+            changed_fields.append(user_field)
+    return changed_fields
+
+
+class RateLimiter:
+    """
+    Allow at most `rate` calls to wait() per second, across all threads
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_until = max(self.next_time, now)
+            self.next_time = wait_until + self.interval
+        delay = wait_until - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ServerCredentialFetcher:
+    """
+    Fetch user data through the API using a token obtained with the site's own client
+    credentials. The token is renewed shortly before the expiry time given by the provider, so
+    that a long run does not outlast it.
+    """
+    # number of seconds before the token's expiry to fetch a new one
+    expiry_margin = 60
+
+    def __init__(self, client):
+        self.client = client
+        self.access_token = None
+        self.expires_at = None
+        self.lock = threading.Lock()
+
+    def get_access_token(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.access_token is None or (
+                self.expires_at is not None and now >= self.expires_at
+            ):
+                token_data = self.client.get_client_credentials_token()
+                self.access_token = token_data['access_token']
+                expires_in = token_data.get('expires_in')
+                self.expires_at = (
+                    now + max(expires_in - self.expiry_margin, 0) if expires_in else None
+                )
+            return self.access_token
+
+    def __call__(self, link):
+        response = self.client.get_user_data_by_id(self.get_access_token(), link.sceneid)
+        if not response.get('success'):
+            return None
+        return response['user']
+
+
+def resync_profiles(fetch=None, older_than=datetime.timedelta(days=7), max_workers=4, rate=5.0,
+                    batch_size=100, limit=None):
+    """
+    Refresh the profile fields of users whose linked SceneID has not been synced since
+    `older_than` ago (or ever). `fetch` is a callable taking a SceneID instance and returning
+    the SceneID user data dict, or None if unavailable; by default, user data is fetched using
+    the site's client credentials.
+
+    Returns a dict of counts: 'checked', 'updated' and 'failed'.
+    """
+    if fetch is None:
+        from sceneid.views import _get_sceneid_client
+        fetch = ServerCredentialFetcher(_get_sceneid_client())
+
+    User = get_user_model()
+    limiter = RateLimiter(rate)
+    stats = {'checked': 0, 'updated': 0, 'failed': 0}
+
+    def fetch_one(link):
+        limiter.wait()
+        try:
+            return fetch(link)
+        except Exception:
+            logger.exception("Failed to fetch SceneID user data for %d", link.sceneid)
+            return None
+        finally:
+            close_old_connections()
+
+    cutoff = timezone.now() - older_than
+    queryset = SceneID.objects.filter(
+        Q(profile_synced_at__isnull=True) | Q(profile_synced_at__lt=cutoff)
+    ).select_related('user').order_by('pk')
+
+    last_pk = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while limit is None or stats['checked'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - stats['checked'])
+            batch_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            links = list(batch_queryset[:size])
+            if not links:
+                break
+            last_pk = links[-1].pk
+
+            results = list(executor.map(fetch_one, links))
+
+            synced_links = []
+            users_by_changed_fields = {}
+            now = timezone.now()
+            for link, user_data in zip(links, results):
+                if user_data is None:
+                    stats['failed'] += 1
+                    continue
+                changed_fields = update_user_profile(link.user, user_data)
+                if changed_fields:
+                    users_by_changed_fields.setdefault(tuple(changed_fields), []).append(link.user)
+                link.profile_synced_at = now
+                synced_links.append(link)
+
+            for fields, users in users_by_changed_fields.items():
+                User._default_manager.bulk_update(users, fields)
+                # bulk_update does not send post_save
+                backends.invalidate_users([user.pk for user in users])
+                stats['updated'] += len(users)
+            SceneID.objects.bulk_update(synced_links, ['profile_synced_at'])
+            stats['checked'] += len(links)
+
+    return stats
@@ -0,0 +1,86 @@
+"""
+Read-replica support for the SceneID lookups on the login path.
+
+When SCENEID_READ_DATABASE names a database alias (a replica of the default database), the
+login lookup, the username checks on the 'connect' page and similar read-only queries are
+made against it. A SceneID that has just been linked is read from the primary for the next
+SCENEID_READ_DATABASE_LAG seconds, and a lookup that finds nothing on the replica (or cannot
+reach it) is repeated on the primary, so replication lag never turns a linked account into
+an unknown one.
+
+SceneIDRouter must be added to DATABASE_ROUTERS, so that instances loaded from the replica
+(such as the user being logged in) are saved to the primary.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from sceneid import user_cache
+
+
+def get_replica():
+    return getattr(settings, 'SCENEID_READ_DATABASE', None)
+
+
+def get_lag():
+    return getattr(settings, 'SCENEID_READ_DATABASE_LAG', 10)
+
+
+def get_recent_link_key(sceneid):
+    return 'sceneid:recentlink:%d' % int(sceneid)
+
+
+def get_read_database(sceneid=None):
+    """
+    Return the database alias to make a read-only query against, or None (meaning the usual
+    routing) if no replica is configured, or if sceneid is given and has recently been linked
+    """
+    replica = get_replica()
+    if replica is None:
+        return None
+    if sceneid is not None and user_cache.get_cache().get(get_recent_link_key(sceneid)):
+        return None
+    return replica
+
+
+async def aget_read_database(sceneid=None):
+    replica = get_replica()
+    if replica is None:
+        return None
+    if sceneid is not None and await user_cache.get_cache().aget(get_recent_link_key(sceneid)):
+        return None
+    return replica
+
+
+def record_link(sceneid):
+    """
+    Note that the SceneID has just been linked, so that it is read from the primary until
+    the replica has caught up
+    """
+    if get_replica() is not None:
+        user_cache.get_cache().set(get_recent_link_key(sceneid), True, get_lag())
+
+
+class SceneIDRouter:
+    """
+    Sends writes of instances that were loaded from the SCENEID_READ_DATABASE replica to the
+    primary, and keeps migrations off the replica
+    """
+    def db_for_write(self, model, **hints):
+        replica = get_replica()
+        instance = hints.get('instance')
+        if replica is not None and instance is not None and instance._state.db == replica:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        replica = get_replica()
+        if replica is None:
+            return None
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, replica}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == get_replica():
+            return False
+        return None
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+from sceneid import backends
+from sceneid import routers
+from sceneid import tokens
+from sceneid import user_cache
+from sceneid.models import SceneID
+
+
+def sceneid_pre_save(sender, instance, **kwargs):
+    # if an existing link is being changed to a different SceneID number, the entry for the
+    # old number must be invalidated too
+    if instance.pk and user_cache.get_cache_timeout() is not None:
+        old_sceneids = SceneID.objects.filter(pk=instance.pk).values_list('sceneid', flat=True)
+        user_cache.invalidate(old_sceneids)
+
+
+def sceneid_post_save(sender, instance, **kwargs):
+    user_cache.invalidate([instance.sceneid])
+    routers.record_link(instance.sceneid)
+
+
+def sceneid_post_delete(sender, instance, **kwargs):
+    user_cache.invalidate([instance.sceneid])
+
+
+def user_post_save(sender, instance, created, **kwargs):
+    if not created and not instance.is_active and user_cache.get_cache_timeout() is not None:
+        user_cache.invalidate(instance.sceneids.values_list('sceneid', flat=True))
+    if not created:
+        backends.invalidate_users([instance.pk])
+
+
+def user_post_delete(sender, instance, **kwargs):
+    backends.invalidate_users([instance.pk])
+
+
+def user_relation_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # a user's groups or permissions have changed
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        backends.invalidate_users([instance.pk])
+    elif action == 'post_clear':
+        # group.user_set.clear() - can't tell which users were affected
+        backends.invalidate_all_permissions()
+    else:
+        # group.user_set.add(...) and so on
+        backends.invalidate_users(pk_set)
+
+
+def permissions_changed(sender, **kwargs):
+    # a group's permissions have changed, or a permission was deleted
+    if kwargs.get('action', 'post_').startswith('post_'):
+        backends.invalidate_all_permissions()
+
+
+def user_logged_out_handler(sender, user, **kwargs):
+    # revoke silent login, so that the next person to use this browser is not logged back in
+    # as this user by the remember cookie
+    if user is not None and tokens.is_enabled():
+        tokens.revoke_user_tokens(user)
+
+
+def connect_signals():
+    pre_save.connect(sceneid_pre_save, sender=SceneID)
+    post_save.connect(sceneid_post_save, sender=SceneID)
+    post_delete.connect(sceneid_post_delete, sender=SceneID)
+    User = get_user_model()
+    post_save.connect(user_post_save, sender=User)
+    post_delete.connect(user_post_delete, sender=User)
+    if hasattr(User, 'groups'):
+        m2m_changed.connect(user_relation_m2m_changed, sender=User.groups.through)
+        m2m_changed.connect(user_relation_m2m_changed, sender=User.user_permissions.through)
+    m2m_changed.connect(permissions_changed, sender=Group.permissions.through)
+    post_delete.connect(permissions_changed, sender=Permission)
+    user_logged_out.connect(user_logged_out_handler)
@@ -0,0 +1,72 @@
+"""
+Signed OAuth state tokens, used in place of session storage when SCENEID_SIGNED_STATE is
+enabled. The token carries a random nonce and the URL to return to after login, and is signed
+and timestamped with the project's SECRET_KEY so that LoginView can verify it without
+reading the session. The nonce is also set in a short-lived signed cookie on the browser that
+started the login, and must match on return, so that a state cannot be completed from another
+browser (login CSRF).
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousOperation
+from django.utils.crypto import constant_time_compare, get_random_string
+
+
+SALT = 'sceneid.state'
+COOKIE_SALT = 'sceneid.state.nonce'
+
+
+def use_signed_state():
+    return getattr(settings, 'SCENEID_SIGNED_STATE', False)
+
+
+def get_max_age():
+    return getattr(settings, 'SCENEID_STATE_MAX_AGE', 600)
+
+
+def get_cookie_name():
+    return getattr(settings, 'SCENEID_STATE_COOKIE_NAME', 'sceneid_state')
+
+
+def make_state(next_url):
+    """
+    Return a (state, nonce) pair; the nonce is to be passed to set_cookie on the redirect
+    response
+    """
+    nonce = get_random_string(length=16)
+    state = signing.dumps({'n': nonce, 'next': next_url}, salt=SALT, compress=True)
+    return state, nonce
+
+
+def set_cookie(response, nonce):
+    response.set_signed_cookie(
+        get_cookie_name(), nonce, salt=COOKIE_SALT, max_age=get_max_age(),
+        secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+    )
+
+
+def clear_cookie(response):
+    response.delete_cookie(get_cookie_name(), samesite='Lax')
+
+
+def read_state(request, state):
+    """
+    Verify a state token against the nonce cookie on the request, and return the next URL it
+    carries. Raises SuspiciousOperation if the token is invalid or has expired, or was not
+    issued to this browser.
+    """
+    max_age = get_max_age()
+    try:
+        payload = signing.loads(state, salt=SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise SuspiciousOperation("State expired!")
+    except signing.BadSignature:
+        raise SuspiciousOperation("State mismatch!")
+
+    nonce = request.get_signed_cookie(
+        get_cookie_name(), default=None, salt=COOKIE_SALT, max_age=max_age
+    )
+    if not nonce or not constant_time_compare(nonce, payload.get('n', '')):
+        raise SuspiciousOperation("State was issued to another browser!")
+
+    return payload.get('next')
@@ -0,0 +1,265 @@
+"""
+Deferred work following a login through SceneID.
+
+Work that the user does not need to wait for - refreshing the user's profile from the SceneID
+user data (SCENEID_REFRESH_PROFILE_ON_LOGIN), and the receivers of the `post_login` signal -
+is passed to the task backend configured in SCENEID_TASK_BACKEND, once the transaction that
+logged the user in (and, on the 'connect' page, created them) has been committed. The default,
+ImmediateBackend, runs it before the response is returned; ThreadPoolBackend runs it on a
+bounded pool of background threads, so that the redirect goes out as soon as the session is
+established. Other backends (such as one handing the work to a
+job queue) can be written by implementing `enqueue`.
+
+Tasks are plain functions called with positional arguments. A function with a `run_batch`
+attribute may be passed several queued calls at once, as `func.run_batch([args, ...])`.
+"""
+import atexit
+import functools
+import logging
+import queue
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from sceneid import backends, last_login
+from sceneid.models import SceneID
+from sceneid.resync import update_user_profile
+
+
+logger = logging.getLogger('sceneid')
+
+# sent from the task backend after a user has logged in through SceneID, with the keyword
+# arguments user, sceneid and user_data (the SceneID user data, or None if the user was
+# logged in with a stored refresh token)
+post_login = Signal()
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Return the backend configured in SCENEID_TASK_BACKEND: either a dotted path to a backend
+    class, or a (dotted path, kwargs) tuple
+    """
+    global _backend
+    if _backend is None:
+        entry = getattr(settings, 'SCENEID_TASK_BACKEND', 'sceneid.tasks.ImmediateBackend')
+        if isinstance(entry, str):
+            path, kwargs = entry, {}
+        else:
+            path, kwargs = entry
+        _backend = import_string(path)(**kwargs)
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'SCENEID_TASK_BACKEND':
+        if _backend is not None:
+            _backend.shutdown()
+        _backend = None
+
+
+def defer(func, *args):
+    get_backend().enqueue(func, args)
+
+
+def shutdown(timeout=None):
+    """
+    Run any queued tasks and stop the backend's workers; called at interpreter exit, and
+    may be called from a server's worker shutdown hook
+    """
+    if _backend is not None:
+        _backend.shutdown(timeout)
+
+
+atexit.register(shutdown)
+
+
+def run_tasks(tasks):
+    """
+    Run a list of (func, args) tuples, passing consecutive calls of a function with a
+    run_batch attribute to it together. An exception is logged and does not stop the
+    remaining tasks.
+    """
+    i = 0
+    while i < len(tasks):
+        func, args = tasks[i]
+        batch = [args]
+        i += 1
+        if hasattr(func, 'run_batch'):
+            while i < len(tasks) and tasks[i][0] is func:
+                batch.append(tasks[i][1])
+                i += 1
+        try:
+            if len(batch) > 1:
+                func.run_batch(batch)
+            else:
+                func(*args)
+        except Exception:
+            logger.exception("SceneID task %s failed", getattr(func, '__name__', func))
+
+
+class ImmediateBackend:
+    """
+    Run each task as soon as it is queued, in the request
+    """
+    def enqueue(self, func, args):
+        run_tasks([(func, args)])
+
+    def shutdown(self, timeout=None):
+        pass
+
+
+class ThreadPoolBackend:
+    """
+    Run tasks on a pool of max_workers background threads. Each worker takes up to batch_size
+    queued tasks at a time. If max_queue tasks are already waiting, a new task is run in the
+    request instead, so that work is never silently dropped.
+    """
+    def __init__(self, max_workers=2, max_queue=1000, batch_size=50):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def _start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.max_workers):
+                thread = threading.Thread(
+                    target=self._work, name='sceneid-tasks-%d' % i, daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self.queue.get()
+            tasks = [task]
+            while task is not None and len(tasks) < self.batch_size:
+                try:
+                    task = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                tasks.append(task)
+
+            try:
+                # None is the signal to stop, once the tasks ahead of it have been run
+                run_tasks([task for task in tasks if task is not None])
+            finally:
+                close_old_connections()
+                for _ in tasks:
+                    self.queue.task_done()
+            if tasks[-1] is None:
+                return
+
+    def enqueue(self, func, args):
+        self._start()
+        try:
+            self.queue.put_nowait((func, args))
+        except queue.Full:
+            logger.warning("SceneID task queue is full; running %s in the request", func)
+            run_tasks([(func, args)])
+
+    def shutdown(self, timeout=None):
+        """
+        Wait for the queued tasks to be run, then stop the workers
+        """
+        with self.lock:
+            threads, self.threads = self.threads, []
+        for _ in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+
+def get_refresh_profile():
+    return getattr(settings, 'SCENEID_REFRESH_PROFILE_ON_LOGIN', False)
+
+
+def _refresh_profiles(logins):
+    """
+    Copy the profile fields of the SceneID user data in each (user_id, sceneid, user_data)
+    login onto the user, saving changed fields with bulk_update, and return the users by ID
+    """
+    User = get_user_model()
+    users = User._default_manager.in_bulk({user_id for user_id, _, _ in logins})
+    if not get_refresh_profile():
+        return users
+
+    users_by_changed_fields = {}
+    synced_sceneids = []
+    for user_id, sceneid, user_data in logins:
+        user = users.get(user_id)
+        if user is None or user_data is None:
+            continue
+        changed_fields = update_user_profile(user, user_data)
+        if changed_fields:
+            users_by_changed_fields.setdefault(tuple(changed_fields), []).append(user)
+        synced_sceneids.append(sceneid)
+
+    for fields, changed_users in users_by_changed_fields.items():
+        User._default_manager.bulk_update(changed_users, fields)
+        # bulk_update does not send post_save
+        backends.invalidate_users([user.pk for user in changed_users])
+    if synced_sceneids:
+        SceneID.objects.filter(sceneid__in=synced_sceneids).update(
+            profile_synced_at=timezone.now()
+        )
+    return users
+
+
+def process_logins(user_id, sceneid, user_data):
+    process_logins.run_batch([(user_id, sceneid, user_data)])
+
+
+def _run_batch(logins):
+    users = _refresh_profiles(logins)
+    for user_id, sceneid, user_data in logins:
+        if user_id in users:
+            post_login.send(
+                sender=None, user=users[user_id], sceneid=sceneid, user_data=user_data
+            )
+
+
+process_logins.run_batch = _run_batch
+
+
+def defer_on_commit(func, *args):
+    """
+    Like defer, but wait until the current transaction (if any) has been committed, so that a
+    background worker sees the rows written in it - such as a user created with
+    ATOMIC_REQUESTS enabled
+    """
+    transaction.on_commit(functools.partial(defer, func, *args))
+
+
+def schedule_post_login(user, sceneid, user_data=None):
+    """
+    Queue the post-login work for a user who has just logged in with the given SceneID,
+    if there is any, and record the login time for SceneID.last_login_at
+    """
+    if sceneid is not None and last_login.record(sceneid):
+        defer_on_commit(last_login.flush)
+    if get_refresh_profile() or post_login.has_listeners():
+        defer_on_commit(process_logins, user.pk, sceneid, user_data)
+
+
+async def aschedule_post_login(user, sceneid, user_data=None):
+    # the immediate backend runs the work here, and on_commit needs the connection's thread
+    if sceneid is not None and last_login.record(sceneid):
+        await sync_to_async(defer_on_commit)(last_login.flush)
+    if get_refresh_profile() or post_login.has_listeners():
+        await sync_to_async(defer_on_commit)(process_logins, user.pk, sceneid, user_data)
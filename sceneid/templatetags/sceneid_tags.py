@@ -1,14 +1,86 @@
+import functools
+import os
 from urllib.parse import urlencode
+
 from django import template
-from django.urls import reverse
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template.loader import get_template
+from django.templatetags.static import static
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.html import format_html
+
+from sceneid import users
 
 
 register = template.Library()
 
+# the number of rendered default login buttons (one per template and 'next' URL) to keep
+BUTTON_CACHE_SIZE = 512
+
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates')
+
+# image and width of the buttons rendered by the default templates, which are produced
+# directly with format_html unless the templates have been overridden
+DEFAULT_BUTTONS = {
+    'sceneid/tags/login_button_small.html': ('sceneid/images/login-small.png', 32),
+    'sceneid/tags/login_button_large.html': ('sceneid/images/login-large.png', 200),
+}
+
+# URL of the auth view, keyed by URLconf and script prefix
+_auth_urls = {}
+
+
+def _get_auth_url():
+    key = (get_urlconf(), get_script_prefix())
+    try:
+        return _auth_urls[key]
+    except KeyError:
+        url = _auth_urls[key] = reverse('sceneid:auth')
+        return url
+
+
+@functools.lru_cache(maxsize=None)
+def _uses_default_template(template_name):
+    origin = get_template(template_name).origin.name
+    return os.path.dirname(os.path.dirname(os.path.dirname(origin))) == DEFAULT_TEMPLATE_DIR
+
+
+@functools.lru_cache(maxsize=BUTTON_CACHE_SIZE)
+def _render_default_button(template_name, auth_url):
+    image, width = DEFAULT_BUTTONS[template_name]
+    return format_html(
+        '<a href="{}"><img src="{}" alt="Sign in with SceneID" width="{}" height="32"></a>',
+        auth_url, static(image), width
+    )
+
+
+def _render_button(context, template_name, auth_url):
+    if template_name in DEFAULT_BUTTONS and _uses_default_template(template_name):
+        return _render_default_button(template_name, auth_url)
+
+    # an overridden template may depend on the context (the user, the active language...), so
+    # it is rendered on every call, in the same way as an inclusion tag
+    new_context = context.new({'auth_url': auth_url})
+    csrf_token = context.get('csrf_token')
+    if csrf_token is not None:
+        new_context['csrf_token'] = csrf_token
+    return context.template.engine.get_template(template_name).render(new_context)
+
+
+@receiver(setting_changed)
+def _clear_caches(setting, **kwargs):
+    if setting in ('ROOT_URLCONF', 'FORCE_SCRIPT_NAME', 'STATIC_URL', 'STATICFILES_STORAGE',
+                   'STORAGES', 'TEMPLATES', 'INSTALLED_APPS'):
+        _auth_urls.clear()
+        _uses_default_template.cache_clear()
+        _render_default_button.cache_clear()
+
+
 @register.simple_tag(takes_context=True)
 def sceneid_auth_url(context, next_url=None):
     request = context.get('request')
-    url = reverse('sceneid:auth')
+    url = _get_auth_url()
 
     if next_url is None and request and request.method == 'GET':
         next_url = request.path
@@ -19,15 +91,34 @@ def sceneid_auth_url(context, next_url=None):
     return url
 
 
-@register.inclusion_tag('sceneid/tags/login_button_small.html', takes_context=True)
+@register.simple_tag(takes_context=True)
 def sceneid_login_button_small(context, next_url=None):
-    return {
-        'auth_url': sceneid_auth_url(context, next_url),
-    }
+    return _render_button(
+        context, 'sceneid/tags/login_button_small.html', sceneid_auth_url(context, next_url)
+    )
 
 
-@register.inclusion_tag('sceneid/tags/login_button_large.html', takes_context=True)
+@register.simple_tag(takes_context=True)
 def sceneid_login_button_large(context, next_url=None):
-    return {
-        'auth_url': sceneid_auth_url(context, next_url),
-    }
+    return _render_button(
+        context, 'sceneid/tags/login_button_large.html', sceneid_auth_url(context, next_url)
+    )
+
+
+@register.filter
+def has_sceneid(user):
+    """
+    True if the user is linked to a SceneID. Reads the annotation added by
+    sceneid.users.annotate_has_sceneid or the links fetched by prefetch_sceneids, so that a
+    list of users can be shown without a query per user.
+    """
+    return users.has_sceneid(user)
+
+
+@register.filter
+def sceneid_numbers(user):
+    """
+    The SceneID numbers linked to the user, read from the links fetched by
+    sceneid.users.prefetch_sceneids if present
+    """
+    return users.get_sceneid_numbers(user)
@@ -0,0 +1,213 @@
+"""
+Storage of SceneID OAuth tokens, and silent re-authentication using the refresh token.
+
+When SCENEID_STORE_TOKENS is enabled, the tokens issued at login are stored as a
+SceneIDToken, and a signed cookie recording the SceneID number and the token's random secret
+is set on the browser. A later visit to the auth view from that browser then renews the
+tokens with a single refresh_token request to SceneID and logs the user straight in, instead
+of redirecting them through the provider. Logging out deletes the user's stored tokens, so
+that the cookie can no longer be used.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, get_random_string
+import requests
+
+from sceneid.circuit import CircuitOpenError
+from sceneid.models import SceneIDToken
+
+
+COOKIE_SALT = 'sceneid.remember'
+
+
+def is_enabled():
+    return getattr(settings, 'SCENEID_STORE_TOKENS', False)
+
+
+def get_refresh_token_lifetime():
+    return datetime.timedelta(
+        seconds=getattr(settings, 'SCENEID_REFRESH_TOKEN_LIFETIME', 30 * 24 * 60 * 60)
+    )
+
+
+def get_cookie_name():
+    return getattr(settings, 'SCENEID_REMEMBER_COOKIE_NAME', 'sceneid_remember')
+
+
+def compact_token_data(token_data):
+    """
+    Return the parts of a token response that need to be kept
+    """
+    return {
+        key: token_data[key] for key in ('access_token', 'refresh_token', 'expires_in')
+        if key in token_data
+    }
+
+
+def _get_token_fields(token_data):
+    now = timezone.now()
+    return {
+        'access_token': token_data['access_token'],
+        'access_token_expires_at': now + datetime.timedelta(
+            seconds=token_data.get('expires_in') or 3600
+        ),
+        'refresh_token': token_data['refresh_token'],
+        'expires_at': now + get_refresh_token_lifetime(),
+    }
+
+
+def store_token(sceneid, token_data):
+    """
+    Store the tokens from a token response for the given SceneID number, if it included a
+    refresh token, and return the new secret to pass to remember(); otherwise return None
+    """
+    if not token_data.get('refresh_token'):
+        return None
+    secret = get_random_string(length=32)
+    SceneIDToken.objects.update_or_create(
+        sceneid_id=sceneid, defaults=dict(_get_token_fields(token_data), secret=secret)
+    )
+    return secret
+
+
+async def astore_token(sceneid, token_data):
+    if not token_data.get('refresh_token'):
+        return None
+    secret = get_random_string(length=32)
+    await SceneIDToken.objects.aupdate_or_create(
+        sceneid_id=sceneid, defaults=dict(_get_token_fields(token_data), secret=secret)
+    )
+    return secret
+
+
+def revoke_user_tokens(user):
+    """
+    Delete the stored tokens for all SceneIDs linked to the user, so that no browser can log
+    in as them silently
+    """
+    SceneIDToken.objects.filter(sceneid__user=user).delete()
+
+
+def remember(response, sceneid, secret):
+    """
+    Set the cookie identifying the SceneID account (and the secret returned by store_token)
+    on this browser for silent login
+    """
+    response.set_signed_cookie(
+        get_cookie_name(), '%d:%s' % (sceneid, secret), salt=COOKIE_SALT,
+        max_age=int(get_refresh_token_lifetime().total_seconds()),
+        secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+    )
+
+
+def forget(response):
+    """
+    Remove the silent login cookie - call this on the response from your logout view to
+    require a full SceneID login next time
+    """
+    response.delete_cookie(get_cookie_name(), samesite='Lax')
+
+
+def _get_remembered(request):
+    """
+    Return the (SceneID number, secret) recorded in the remember cookie, or (None, None)
+    """
+    if not is_enabled() or get_cookie_name() not in request.COOKIES:
+        return None, None
+    value = request.get_signed_cookie(
+        get_cookie_name(), default=None, salt=COOKIE_SALT,
+        max_age=get_refresh_token_lifetime(),
+    )
+    sceneid, _, secret = (value or '').partition(':')
+    try:
+        return int(sceneid), secret
+    except ValueError:
+        return None, None
+
+
+def get_remembered_sceneid(request):
+    return _get_remembered(request)[0]
+
+
+def _is_valid_secret(token, secret):
+    # tokens stored before secrets were introduced have an empty one, and never match
+    return bool(token.secret) and constant_time_compare(token.secret, secret)
+
+
+def _apply_refresh_response(token, token_data):
+    """
+    Update token from a refresh_token response; return False if the refresh was rejected
+    """
+    if 'access_token' not in token_data:
+        return False
+    fields = _get_token_fields(dict(
+        token_data, refresh_token=token_data.get('refresh_token') or token.refresh_token
+    ))
+    for name, value in fields.items():
+        setattr(token, name, value)
+    return True
+
+
+def silent_login(request, client):
+    """
+    If this browser is remembered as belonging to a SceneID account with a stored refresh
+    token, renew the token and return the linked user if they are active; otherwise None
+    """
+    sceneid, secret = _get_remembered(request)
+    if sceneid is None:
+        return None
+
+    try:
+        token = SceneIDToken.objects.select_related('sceneid__user').get(
+            sceneid_id=sceneid, expires_at__gt=timezone.now()
+        )
+    except SceneIDToken.DoesNotExist:
+        return None
+    if not _is_valid_secret(token, secret):
+        return None
+
+    try:
+        token_data = client.refresh_access_token(token.refresh_token)
+    except (CircuitOpenError, requests.RequestException, ValueError):
+        return None
+
+    if not _apply_refresh_response(token, token_data):
+        # the refresh token has been revoked or has expired
+        token.delete()
+        return None
+    token.save()
+
+    user = token.sceneid.user
+    return user if user.is_active else None
+
+
+async def asilent_login(request, client):
+    import httpx
+
+    sceneid, secret = _get_remembered(request)
+    if sceneid is None:
+        return None
+
+    try:
+        token = await SceneIDToken.objects.select_related('sceneid__user').aget(
+            sceneid_id=sceneid, expires_at__gt=timezone.now()
+        )
+    except SceneIDToken.DoesNotExist:
+        return None
+    if not _is_valid_secret(token, secret):
+        return None
+
+    try:
+        token_data = await client.refresh_access_token(token.refresh_token)
+    except (CircuitOpenError, httpx.HTTPError, ValueError):
+        return None
+
+    if not _apply_refresh_response(token, token_data):
+        await token.adelete()
+        return None
+    await token.asave()
+
+    user = token.sceneid.user
+    return user if user.is_active else None
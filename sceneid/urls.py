@@ -10,4 +10,5 @@ urlpatterns = [
     path('connect/', views.ConnectView.as_view(), {}, 'connect'),
     path('connect/old/', views.ConnectOldView.as_view(), {}, 'connect_old'),
     path('connect/new/', views.ConnectNewView.as_view(), {}, 'connect_new'),
+    path('connect/username/', views.UsernameAvailabilityView.as_view(), {}, 'check_username'),
 ]
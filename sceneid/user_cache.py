@@ -0,0 +1,126 @@
+"""
+Optional cache of the SceneID number -> user ID mapping used when logging in, so that a
+returning user can be found by primary key rather than a join against the sceneid_sceneid
+table. Enabled by setting SCENEID_USER_CACHE_TIMEOUT to a number of seconds; entries are
+invalidated by the signal handlers in sceneid.signals.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import OperationalError, connection, transaction
+
+from sceneid import routers
+
+
+# cached value recording that a SceneID is not linked to any user
+NO_USER = 0
+
+
+def get_cache_timeout():
+    return getattr(settings, 'SCENEID_USER_CACHE_TIMEOUT', None)
+
+
+def get_cache():
+    return caches[getattr(settings, 'SCENEID_CACHE', 'default')]
+
+
+def get_cache_key(sceneid):
+    return 'sceneid:user:%d' % int(sceneid)
+
+
+def _get_user(sceneid, **lookup):
+    """
+    Return the user matching lookup, or None. If a read replica is configured, it is tried
+    first, falling back on the primary.
+    """
+    User = get_user_model()
+    db = routers.get_read_database(sceneid)
+    if db is not None:
+        try:
+            return User.objects.using(db).get(**lookup)
+        except (User.DoesNotExist, OperationalError):
+            # the replica may not have caught up with a new link yet, or be unavailable
+            pass
+    try:
+        return User.objects.get(**lookup)
+    except User.DoesNotExist:
+        return None
+
+
+async def _aget_user(sceneid, **lookup):
+    User = get_user_model()
+    db = await routers.aget_read_database(sceneid)
+    if db is not None:
+        try:
+            return await User.objects.using(db).aget(**lookup)
+        except (User.DoesNotExist, OperationalError):
+            pass
+    try:
+        return await User.objects.aget(**lookup)
+    except User.DoesNotExist:
+        return None
+
+
+def get_user_for_sceneid(sceneid):
+    """
+    Return the user linked to the given SceneID number, or None. The is_active flag is not
+    checked here; the user record is always fetched from the database, so the caller sees
+    its current state.
+    """
+    timeout = get_cache_timeout()
+    if timeout is None:
+        return _get_user(sceneid, sceneids__sceneid=sceneid)
+
+    cache = get_cache()
+    cache_key = get_cache_key(sceneid)
+    user_id = cache.get(cache_key)
+    if user_id == NO_USER:
+        return None
+    elif user_id is not None:
+        user = _get_user(sceneid, pk=user_id)
+        if user is not None:
+            return user
+        # stale entry - fall through to a full lookup
+
+    user = _get_user(sceneid, sceneids__sceneid=sceneid)
+    cache.set(cache_key, user.pk if user else NO_USER, timeout)
+    return user
+
+
+async def aget_user_for_sceneid(sceneid):
+    """
+    Async version of get_user_for_sceneid
+    """
+    timeout = get_cache_timeout()
+    if timeout is None:
+        return await _aget_user(sceneid, sceneids__sceneid=sceneid)
+
+    cache = get_cache()
+    cache_key = get_cache_key(sceneid)
+    user_id = await cache.aget(cache_key)
+    if user_id == NO_USER:
+        return None
+    elif user_id is not None:
+        user = await _aget_user(sceneid, pk=user_id)
+        if user is not None:
+            return user
+
+    user = await _aget_user(sceneid, sceneids__sceneid=sceneid)
+    await cache.aset(cache_key, user.pk if user else NO_USER, timeout)
+    return user
+
+
+def invalidate(sceneids):
+    """
+    Remove the cached entries for the given SceneID numbers
+    """
+    if get_cache_timeout() is None:
+        return
+
+    cache = get_cache()
+    cache_keys = [get_cache_key(sceneid) for sceneid in sceneids]
+    cache.delete_many(cache_keys)
+    if connection.in_atomic_block:
+        # a lookup made before the transaction commits will re-cache the old value, so
+        # delete again once the change is visible
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
@@ -0,0 +1,78 @@
+"""
+Username availability checks for the registration form on the 'connect' page, so that it can
+be validated as the user types rather than by a full POST and re-render. Results are cached
+for SCENEID_USERNAME_CHECK_CACHE_TIMEOUT seconds, and each session is limited to
+SCENEID_USERNAME_CHECK_RATE_LIMIT checks per minute.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+
+from sceneid.routers import get_read_database
+from sceneid.user_cache import get_cache
+
+
+def get_cache_timeout():
+    return getattr(settings, 'SCENEID_USERNAME_CHECK_CACHE_TIMEOUT', 10)
+
+
+def get_rate_limit():
+    return getattr(settings, 'SCENEID_USERNAME_CHECK_RATE_LIMIT', 30)
+
+
+def get_cache_key(username):
+    # usernames may contain characters that are not valid in memcached keys
+    digest = hashlib.md5(username.encode('utf-8')).hexdigest()
+    return 'sceneid:username:%s' % digest
+
+
+def is_rate_limited(request):
+    """
+    Count a check against the session's allowance for the current minute, and return True if
+    it has been used up. The allowance is per session rather than per IP address, which may be
+    shared by every user behind a proxy; the endpoint requires a pending connection, and so a
+    session.
+    """
+    limit = get_rate_limit()
+    if limit is None:
+        return False
+
+    cache = get_cache()
+    client = hashlib.md5((request.session.session_key or '').encode('utf-8')).hexdigest()
+    key = 'sceneid:ratelimit:username:%s:%d' % (client, time.time() // 60)
+    cache.add(key, 0, 60)
+    try:
+        return cache.incr(key) > limit
+    except ValueError:
+        # expired between add and incr
+        return False
+
+
+def check_username(username):
+    """
+    Return a dict of 'available' (bool) and 'errors' (a list of validation messages) for
+    the given username. As in the registration form's own validation, a name is taken only
+    if it matches an existing username exactly.
+    """
+    User = get_user_model()
+    field = User._meta.get_field(User.USERNAME_FIELD)
+    try:
+        field.clean(username, None)
+    except ValidationError as e:
+        return {'available': False, 'errors': e.messages}
+
+    cache = get_cache()
+    key = get_cache_key(username)
+    taken = cache.get(key)
+    if taken is None:
+        taken = User._default_manager.using(get_read_database()).filter(
+            **{User.USERNAME_FIELD: username}
+        ).exists()
+        cache.set(key, taken, get_cache_timeout())
+
+    if taken:
+        return {'available': False, 'errors': ["A user with that username already exists."]}
+    return {'available': True, 'errors': []}
@@ -0,0 +1,83 @@
+"""
+Helpers for showing whether users are linked to SceneID in lists of users, without a query
+per user.
+
+annotate_has_sceneid adds a has_sceneid boolean to each user in a queryset, in the same query;
+prefetch_sceneids fetches the SceneID links of all the users in one further query, so that
+user.sceneids.all() does not query again. The has_sceneid and sceneid_numbers template filters
+in sceneid_tags read from either. Without them, the filters make a query for each user and
+emit a PerUserQueryWarning, so that a list missing its annotation or prefetch shows up in
+development.
+"""
+import warnings
+
+from django.db.models import OuterRef, Prefetch, prefetch_related_objects
+
+from sceneid.models import SceneID
+
+
+class PerUserQueryWarning(RuntimeWarning):
+    pass
+
+
+def _warn_per_user_query(name):
+    warnings.warn(
+        "%s is querying the SceneID links of a single user; use annotate_has_sceneid or "
+        "prefetch_sceneids on lists of users" % name,
+        PerUserQueryWarning, stacklevel=3
+    )
+
+
+def annotate_has_sceneid(queryset, name='has_sceneid'):
+    """
+    Annotate each user in a user queryset with a boolean (under the given attribute name)
+    that is true if the user is linked to a SceneID
+    """
+    return queryset.annotate(**{name: SceneID.objects.exists_for(OuterRef('pk'))})
+
+
+def _sceneids_prefetch():
+    return Prefetch(
+        'sceneids', queryset=SceneID.objects.only('id', 'user_id', 'sceneid').order_by('sceneid')
+    )
+
+
+def prefetch_sceneids(users):
+    """
+    Fetch the SceneID links of a user queryset or a list of users in one query. A queryset is
+    returned with the prefetch added; a list is populated in place and returned.
+    """
+    if hasattr(users, 'prefetch_related'):
+        return users.prefetch_related(_sceneids_prefetch())
+    prefetch_related_objects(users, _sceneids_prefetch())
+    return users
+
+
+def has_sceneid(user):
+    """
+    Return True if the user is linked to a SceneID, reading from the has_sceneid annotation or
+    prefetched links if present, or querying otherwise
+    """
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    try:
+        return user.has_sceneid
+    except AttributeError:
+        pass
+    if 'sceneids' in getattr(user, '_prefetched_objects_cache', {}):
+        return bool(user.sceneids.all())
+    _warn_per_user_query('has_sceneid')
+    return user.sceneids.exists()
+
+
+def get_sceneid_numbers(user):
+    """
+    Return the list of SceneID numbers linked to the user, reading from prefetched links if
+    present, or querying otherwise
+    """
+    if not getattr(user, 'is_authenticated', False):
+        return []
+    if 'sceneids' in getattr(user, '_prefetched_objects_cache', {}):
+        return [link.sceneid for link in user.sceneids.all()]
+    _warn_per_user_query('get_sceneid_numbers')
+    return list(user.sceneids.order_by('sceneid').values_list('sceneid', flat=True))
@@ -1,10 +1,12 @@
+import functools
+
 from django.apps import apps
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.contrib.auth import login as auth_login
-from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.core.exceptions import SuspiciousOperation
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils.crypto import get_random_string
@@ -13,20 +15,48 @@ from django.utils.module_loading import import_string
 from django.views import View
 from django.views.generic import TemplateView
 from django.views.generic.base import ContextMixin, TemplateResponseMixin
+import requests
+
+from sceneid import audit
+from sceneid import circuit
+from sceneid import client as sceneid_client
+from sceneid import id_token
+from sceneid import instrumentation
+from sceneid import pending
+from sceneid import state as sceneid_state
+from sceneid import tasks
+from sceneid import tokens
+from sceneid import user_cache
+from sceneid import usernames
+from sceneid.backends import get_login_backend
+from sceneid.models import SceneID, SceneIDLoginEvent
 
-from sceneid.client import SceneIDClient
-from sceneid.forms import UserCreationForm
-from sceneid.models import SceneID
 
+def _get_app_config():
+    return apps.get_app_config('sceneid')
 
-app_config = apps.get_app_config('sceneid')
 
+# form classes, keyed by dotted path; these are resolved on first use rather than when the
+# URLconf is imported
+_import_class = functools.lru_cache(maxsize=None)(import_string)
 
-def _get_sceneid_client():
-    return SceneIDClient(
+
+def _get_sceneid_client(client_class=sceneid_client.SceneIDClient):
+    return sceneid_client.get_client(
         settings.SCENEID_CLIENT_ID,
         settings.SCENEID_CLIENT_SECRET,
         getattr(settings, 'SCENEID_HOSTNAME', 'id.scene.org'),
+        client_class=client_class,
+        connect_timeout=getattr(
+            settings, 'SCENEID_CONNECT_TIMEOUT', sceneid_client.DEFAULT_CONNECT_TIMEOUT
+        ),
+        read_timeout=getattr(settings, 'SCENEID_READ_TIMEOUT', sceneid_client.DEFAULT_READ_TIMEOUT),
+        pool_size=getattr(settings, 'SCENEID_POOL_SIZE', sceneid_client.DEFAULT_POOL_SIZE),
+        max_retries=getattr(settings, 'SCENEID_MAX_RETRIES', sceneid_client.DEFAULT_MAX_RETRIES),
+        retry_backoff=getattr(
+            settings, 'SCENEID_RETRY_BACKOFF', sceneid_client.DEFAULT_RETRY_BACKOFF
+        ),
+        scheme=getattr(settings, 'SCENEID_SCHEME', 'https'),
     )
 
 
@@ -34,8 +64,39 @@ def _get_return_uri():
     return settings.BASE_URL + reverse('sceneid:login')
 
 
+def _get_scopes():
+    return getattr(settings, 'SCENEID_SCOPES', None)
+
+
+def _store_access_token():
+    return getattr(settings, 'SCENEID_STORE_ACCESS_TOKEN', False)
+
+
+def _is_unavailable():
+    """
+    Return True if the circuit breaker has suspended requests to SceneID
+    """
+    breaker = circuit.get_breaker(getattr(settings, 'SCENEID_HOSTNAME', 'id.scene.org'))
+    return breaker is not None and breaker.get_state() == circuit.OPEN
+
+
+def _render_unavailable(request):
+    return render(request, _get_app_config().unavailable_template_name, status=503)
+
+
+def _login_failed(request, next_url):
+    # the provider is up but rejected the login (for example, an authorization code that has
+    # already been used, when the callback URL is reloaded), so send the user back to start
+    # again rather than reporting an outage
+    messages.error(request, "Your SceneID login could not be completed. Please try again.")
+    return _redirect_to_next_url(request, next_url)
+
+
 def _redirect_back(request):
-    next_url = request.session.get('sceneid_next_url')
+    return _redirect_to_next_url(request, request.session.get('sceneid_next_url'))
+
+
+def _redirect_to_next_url(request, next_url):
     next_url_is_valid = (
         next_url
         and url_has_allowed_host_and_scheme(next_url, request.get_host(), request.is_secure())
@@ -50,66 +111,162 @@ class AuthRedirectView(View):
     Generate the SceneID auth redirect URL and send user there.
     """
     def get(self, request):
+        if _is_unavailable():
+            # don't send users off to a login page they won't be able to return from
+            return _render_unavailable(request)
+
         client = _get_sceneid_client()
-        state = get_random_string(length=32)
+        next_url = request.GET.get('next')
+
+        # a browser remembered from a previous login can skip the trip to the provider
+        remembered_sceneid = tokens.get_remembered_sceneid(request)
+        if remembered_sceneid is not None and not request.user.is_authenticated:
+            user = tokens.silent_login(request, client)
+            if user is not None:
+                with instrumentation.measure('login'):
+                    auth_login(request, user, backend=get_login_backend())
+                audit.record(
+                    SceneIDLoginEvent.SILENT_LOGIN, request, sceneid=remembered_sceneid, user=user
+                )
+                tasks.schedule_post_login(user, remembered_sceneid)
+                return _redirect_to_next_url(request, next_url)
+
+        nonce = None
+        if sceneid_state.use_signed_state():
+            # the nonce and next URL travel in the signed state, so no session is created; the
+            # nonce cookie ties the state to this browser
+            state, nonce = sceneid_state.make_state(next_url)
+        else:
+            state = get_random_string(length=32)
+            request.session['sceneid_state'] = state
+            request.session['sceneid_next_url'] = next_url
 
-        redirect_uri = client.get_authorization_uri(state, _get_return_uri())
-        request.session['sceneid_state'] = state
-        request.session['sceneid_next_url'] = request.GET.get('next')
-        return redirect(redirect_uri)
+        redirect_uri = client.get_authorization_uri(state, _get_return_uri(), _get_scopes())
+        response = redirect(redirect_uri)
+        if nonce is not None:
+            sceneid_state.set_cookie(response, nonce)
+        return response
 
 
 class LoginView(View):
     """
     Process the SceneID Oauth response
     """
+    def dispatch(self, request, *args, **kwargs):
+        with instrumentation.measure('callback') as event:
+            response = super().dispatch(request, *args, **kwargs)
+            event['status'] = response.status_code
+        if sceneid_state.get_cookie_name() in request.COOKIES:
+            # the state can only be used once
+            sceneid_state.clear_cookie(response)
+        return response
+
     def get(self, request):
         state = request.GET['state']
         code = request.GET['code']
 
-        if (state != request.session['sceneid_state']):
-            raise SuspiciousOperation("State mismatch!")
+        try:
+            if sceneid_state.use_signed_state():
+                next_url = sceneid_state.read_state(request, state)
+            else:
+                if (state != request.session['sceneid_state']):
+                    raise SuspiciousOperation("State mismatch!")
+                next_url = request.session.get('sceneid_next_url')
+        except SuspiciousOperation:
+            audit.record(SceneIDLoginEvent.STATE_MISMATCH, request)
+            raise
 
         client = _get_sceneid_client()
-        token_data = client.get_access_token(code, _get_return_uri())
-        access_token = token_data['access_token']
-        request.session['sceneid_access_token'] = access_token
-        user_data = client.get_user_data(access_token)
+        try:
+            token_data = client.get_access_token(code, _get_return_uri())
+            access_token = token_data.get('access_token')
+            user_data = None
+            if access_token:
+                # use the user details from a verified id_token if there is one, saving a
+                # request
+                user_data = id_token.get_user_data(token_data, client)
+                if user_data is None:
+                    user_data = client.get_user_data(access_token)
+        except (circuit.CircuitOpenError, requests.RequestException, ValueError):
+            return _render_unavailable(request)
+        if not user_data or 'user' not in user_data:
+            # the provider returned an error instead of a token or user details
+            return _login_failed(request, next_url)
 
         sceneid = user_data["user"]["id"]
         # look for an existing user linked to this sceneid
-        User = get_user_model()
-        try:
-            user = User.objects.get(sceneids__sceneid=sceneid)
-        except User.DoesNotExist:
-            user = None
+        with instrumentation.measure('user_lookup') as event:
+            user = user_cache.get_user_for_sceneid(sceneid)
+            event['found'] = bool(user)
 
         if user:
             if user.is_active:
-                auth_login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+                with instrumentation.measure('login'):
+                    auth_login(request, user, backend=get_login_backend())
+                audit.record(SceneIDLoginEvent.LOGIN, request, sceneid=sceneid, user=user)
+                tasks.schedule_post_login(user, sceneid, user_data["user"])
+                if _store_access_token():
+                    request.session['sceneid_access_token'] = access_token
+                if tokens.is_enabled():
+                    secret = tokens.store_token(sceneid, token_data)
+                    response = _redirect_to_next_url(request, next_url)
+                    if secret:
+                        tokens.remember(response, sceneid, secret)
+                    return response
             else:
+                audit.record(SceneIDLoginEvent.DEACTIVATED, request, sceneid=sceneid, user=user)
                 messages.error(request, "This account has been deactivated.")
 
-            return _redirect_back(request)
+            return _redirect_to_next_url(request, next_url)
         else:
             # no known user with this sceneid - prompt them to connect to a new or existing account
-            request.session['sceneid_login_user_data'] = user_data["user"]
+            audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=sceneid)
+            if _store_access_token():
+                request.session['sceneid_access_token'] = access_token
+            pending.get_store().save(
+                request, user_data["user"],
+                tokens.compact_token_data(token_data) if tokens.is_enabled() else None
+            )
+            request.session['sceneid_next_url'] = next_url
             return redirect('sceneid:connect')
 
 
-class ConnectView(TemplateView):
+class ConnectFormsMixin:
+    """
+    Looks up the template and form classes for the 'connect' views from the app config when
+    first needed. Subclasses may set template_name, login_form_class or register_form_class
+    to override them.
+    """
+    template_name = None
+    login_form_class = None
+    register_form_class = None
+
+    def get_template_names(self):
+        if self.template_name is not None:
+            return [self.template_name]
+        return [_get_app_config().connect_template_name]
+
+    def get_login_form_class(self):
+        if self.login_form_class is not None:
+            return self.login_form_class
+        return _import_class(_get_app_config().connect_login_form_class)
+
+    def get_register_form_class(self):
+        if self.register_form_class is not None:
+            return self.register_form_class
+        return _import_class(_get_app_config().connect_register_form_class)
+
+
+class ConnectView(ConnectFormsMixin, TemplateView):
     """
     Display the login / registration forms for associating a SceneID we haven't seen before
     with an existing or new account
     """
-    template_name = app_config.connect_template_name
-    login_form_class = import_string(app_config.connect_login_form_class)
-    register_form_class = import_string(app_config.connect_register_form_class)
-
     def get(self, request, *args, **kwargs):
-        try:
-            self.user_data = request.session['sceneid_login_user_data']
-        except KeyError:
+        self.user_data, self.token_data = pending.split_token_data(
+            pending.get_store().load(request)
+        )
+        if self.user_data is None:
             return _redirect_back(request)
 
         return super().get(request, *args, **kwargs)
@@ -117,8 +274,8 @@ class ConnectView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        login_form = self.login_form_class(self.request)
-        register_form = self.register_form_class(self.user_data)
+        login_form = self.get_login_form_class()(self.request)
+        register_form = self.get_register_form_class()(self.user_data)
 
         context.update({
             'user_data': self.user_data,
@@ -128,24 +285,24 @@ class ConnectView(TemplateView):
         return context
 
 
-class ConnectOldView(TemplateResponseMixin, ContextMixin, View):
+class ConnectOldView(ConnectFormsMixin, TemplateResponseMixin, ContextMixin, View):
     """
     Handle form submissions of the login form for associating a SceneID with an existing account
     """
-    template_name = app_config.connect_template_name
-    login_form_class = import_string(app_config.connect_login_form_class)
-    register_form_class = import_string(app_config.connect_register_form_class)
-
     def dispatch(self, request):
-        try:
-            self.user_data = request.session['sceneid_login_user_data']
-        except KeyError:
+        self.user_data, self.token_data = pending.split_token_data(
+            pending.get_store().load(request)
+        )
+        if self.user_data is None:
             return _redirect_back(request)
 
         if not request.method == 'POST':
             return redirect('sceneid:connect')
 
-        self.login_form = self.login_form_class(request, request.POST)
+        return self.process_form(request)
+
+    def process_form(self, request):
+        self.login_form = self.get_login_form_class()(request, request.POST)
         if self.login_form.is_valid():
             return self.form_valid(self.login_form)
         else:
@@ -153,15 +310,37 @@ class ConnectOldView(TemplateResponseMixin, ContextMixin, View):
 
     def form_valid(self, form):
         user = form.get_user()
-        SceneID.objects.get_or_create(sceneid=self.user_data['id'], defaults={'user': user})
-        auth_login(self.request, user, backend='django.contrib.auth.backends.ModelBackend')
-        try:
-            del self.request.session['sceneid_login_user_data']
-        except KeyError:
-            # login will overwrite request.session if the old session was authenticated
-            pass
-
-        return _redirect_back(self.request)
+        with instrumentation.measure('link'):
+            try:
+                with transaction.atomic():
+                    SceneID.objects.create(sceneid=self.user_data['id'], user=user)
+            except IntegrityError:
+                # already linked, e.g. by a double submission of this form - but if it was
+                # linked to another account in the meantime, don't log in as this one
+                link = SceneID.objects.filter(sceneid=self.user_data['id']).first()
+                if link is None:
+                    raise
+                if link.user_id != user.pk:
+                    form.add_error(None, "This SceneID is already linked to another account.")
+                    return self.form_invalid(form)
+            else:
+                audit.record(
+                    SceneIDLoginEvent.LINK_EXISTING, self.request,
+                    sceneid=self.user_data['id'], user=user
+                )
+        # clear before logging in, as login will replace request.session if the old session
+        # was authenticated
+        pending.get_store().clear(self.request)
+        with instrumentation.measure('login'):
+            auth_login(self.request, user, backend=get_login_backend())
+        tasks.schedule_post_login(user, self.user_data['id'], self.user_data)
+
+        response = _redirect_back(self.request)
+        if self.token_data:
+            secret = tokens.store_token(self.user_data['id'], self.token_data)
+            if secret:
+                tokens.remember(response, self.user_data['id'], secret)
+        return response
 
     def form_invalid(self, form):
         return self.render_to_response(self.get_context_data())
@@ -169,7 +348,7 @@ class ConnectOldView(TemplateResponseMixin, ContextMixin, View):
     def get_context_data(self):
         context = super().get_context_data()
 
-        register_form = self.register_form_class(self.user_data)
+        register_form = self.get_register_form_class()(self.user_data)
 
         context.update({
             'user_data': self.user_data,
@@ -180,40 +359,68 @@ class ConnectOldView(TemplateResponseMixin, ContextMixin, View):
         return context
 
 
-class ConnectNewView(TemplateResponseMixin, ContextMixin, View):
+class ConnectNewView(ConnectFormsMixin, TemplateResponseMixin, ContextMixin, View):
     """
     Handle form submissions of the registration form for associating a SceneID with a new account
     """
-    template_name = app_config.connect_template_name
-    login_form_class = import_string(app_config.connect_login_form_class)
-    register_form_class = import_string(app_config.connect_register_form_class)
-
     def dispatch(self, request):
-        try:
-            self.user_data = request.session['sceneid_login_user_data']
-        except KeyError:
+        self.user_data, self.token_data = pending.split_token_data(
+            pending.get_store().load(request)
+        )
+        if self.user_data is None:
             return _redirect_back(request)
 
         if not request.method == 'POST':
             return redirect('sceneid:connect')
 
-        self.register_form = self.register_form_class(self.user_data, request.POST)
+        return self.process_form(request)
+
+    def process_form(self, request):
+        self.register_form = self.get_register_form_class()(self.user_data, request.POST)
         if self.register_form.is_valid():
             return self.form_valid(self.register_form)
         else:
             return self.form_invalid(self.register_form)
 
     def form_valid(self, form):
-        user = form.save()
-        SceneID.objects.get_or_create(sceneid=self.user_data['id'], defaults={'user': user})
-        auth_login(self.request, user, backend='django.contrib.auth.backends.ModelBackend')
-        try:
-            del self.request.session['sceneid_login_user_data']
-        except KeyError:
-            # login will overwrite request.session if the old session was authenticated
-            pass
-
-        return _redirect_back(self.request)
+        sceneid = self.user_data['id']
+        with instrumentation.measure('link'):
+            try:
+                # create the user and link in one transaction, so that a failure to link
+                # does not leave an orphaned user behind
+                with transaction.atomic():
+                    user = form.save()
+                    SceneID.objects.create(sceneid=sceneid, user=user)
+            except IntegrityError:
+                # If the SceneID was linked by a concurrent request (e.g. a double submission
+                # of this form, or the same form in another tab), log in as the user it was
+                # linked to
+                link = SceneID.objects.select_related('user').filter(sceneid=sceneid).first()
+                if link is None:
+                    raise
+                user = link.user
+                if not user.is_active:
+                    audit.record(
+                        SceneIDLoginEvent.DEACTIVATED, self.request, sceneid=sceneid, user=user
+                    )
+                    pending.get_store().clear(self.request)
+                    messages.error(self.request, "This account has been deactivated.")
+                    return _redirect_back(self.request)
+            else:
+                audit.record(SceneIDLoginEvent.LINK_NEW, self.request, sceneid=sceneid, user=user)
+        # clear before logging in, as login will replace request.session if the old session
+        # was authenticated
+        pending.get_store().clear(self.request)
+        with instrumentation.measure('login'):
+            auth_login(self.request, user, backend=get_login_backend())
+        tasks.schedule_post_login(user, self.user_data['id'], self.user_data)
+
+        response = _redirect_back(self.request)
+        if self.token_data:
+            secret = tokens.store_token(self.user_data['id'], self.token_data)
+            if secret:
+                tokens.remember(response, self.user_data['id'], secret)
+        return response
 
     def form_invalid(self, form):
         return self.render_to_response(self.get_context_data())
@@ -221,7 +428,7 @@ class ConnectNewView(TemplateResponseMixin, ContextMixin, View):
     def get_context_data(self):
         context = super().get_context_data()
 
-        login_form = self.login_form_class(self.request)
+        login_form = self.get_login_form_class()(self.request)
 
         context.update({
             'user_data': self.user_data,
@@ -230,3 +437,19 @@ class ConnectNewView(TemplateResponseMixin, ContextMixin, View):
         })
 
         return context
+
+
+class UsernameAvailabilityView(View):
+    """
+    Report whether a username is available, so that the registration form on the 'connect'
+    page can be validated as the user types
+    """
+    def get(self, request):
+        if pending.get_store().load(request) is None:
+            return JsonResponse({'error': "No SceneID connection in progress"}, status=403)
+
+        if usernames.is_rate_limited(request):
+            return JsonResponse({'error': "Too many requests"}, status=429)
+
+        username = request.GET.get('username', '')
+        return JsonResponse(dict(usernames.check_username(username), username=username))
@@ -6,7 +6,7 @@ with open("README.md", "r", encoding="utf-8") as fh:
 setup(
     name="django-sceneid",
     version="0.1.2",
-    packages=find_packages(exclude=('tests',)),
+    packages=find_packages(exclude=('tests', 'benchmarks', 'loadtest')),
     include_package_data=True,
     test_suite="tests",
     url="https://github.com/demozoo/django-sceneid/",
@@ -21,25 +21,28 @@ setup(
         "Environment :: Web Environment",
         "Intended Audience :: Developers",
         "Programming Language :: Python :: 3",
-        "Framework :: Django :: 3.0",
-        "Framework :: Django :: 3.1",
-        "Framework :: Django :: 3.2",
-        "Framework :: Django :: 4.0",
-        "Framework :: Django :: 4.1",
         "Framework :: Django :: 4.2",
         "Framework :: Django :: 5.0",
         "Topic :: Internet :: WWW/HTTP",
         "License :: OSI Approved :: BSD License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.8",
     install_requires=[
-        'Django>=3.0',
+        'Django>=4.2',
         'requests>=2,<3',
     ],
     extras_require={
+        "async": [
+            'httpx>=0.23',
+        ],
+        "jwt": [
+            'PyJWT[crypto]>=2.0',
+        ],
         "testing": [
             'responses>=0.14,<0.21',
+            'httpx>=0.23',
+            'PyJWT[crypto]>=2.0',
         ]
     },
     license="BSD",
@@ -0,0 +1,10 @@
+from django.urls import include, path
+
+from tests.urls import home_view, landing_view
+
+
+urlpatterns = [
+    path('', home_view),
+    path('landing/', landing_view),
+    path('account/sceneid/', include('sceneid.async_urls')),
+]
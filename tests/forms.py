@@ -0,0 +1,5 @@
+from sceneid.forms import UserCreationForm
+
+
+class RegisterForm(UserCreationForm):
+    pass
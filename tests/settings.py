@@ -1,11 +1,16 @@
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-    }
+    },
+    # stands in for a read replica in tests of SCENEID_READ_DATABASE
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+    },
 }
 
 
 INSTALLED_APPS = [
+    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -49,3 +54,7 @@ SCENEID_CLIENT_ID = 'testsite'
 SCENEID_CLIENT_SECRET = 'supersecretclientsecret'
 BASE_URL = 'http://testsite'
 LOGIN_REDIRECT_URL = '/'
+STATIC_URL = '/static/'
+
+# the tests run in a single process, so the local-memory cache is shared by all requests
+SILENCED_SYSTEM_CHECKS = ['sceneid.W001']
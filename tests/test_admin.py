@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from sceneid.models import SceneID, SceneIDLoginEvent
+from sceneid.paginator import EstimatedCountPaginator, estimate_count
+
+
+class TestAdmin(TestCase):
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(username='admin', password='12345')
+        for i in range(5):
+            user = User.objects.create_user(username='user%d' % i)
+            user.sceneids.create(sceneid=1000 + i)
+        self.client.force_login(self.superuser)
+
+    def test_sceneid_changelist(self):
+        # session, user, paginator count, page of links (with users joined)
+        with self.assertNumQueries(4):
+            response = self.client.get('/admin/sceneid/sceneid/')
+        self.assertContains(response, 'user4')
+
+    def test_sceneid_search(self):
+        response = self.client.get('/admin/sceneid/sceneid/?q=1003')
+        self.assertEqual(
+            [link.sceneid for link in response.context['cl'].result_list], [1003]
+        )
+        self.assertNotContains(response, '6 total')
+
+        response = self.client.get('/admin/sceneid/sceneid/?q=user3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+
+    def test_login_event_changelist(self):
+        SceneIDLoginEvent.objects.create(
+            created_at=timezone.now(), event=SceneIDLoginEvent.LOGIN, sceneid=1003,
+            ip_address='127.0.0.1'
+        )
+        response = self.client.get('/admin/sceneid/sceneidloginevent/?q=1003')
+        self.assertContains(response, '127.0.0.1')
+        response = self.client.get('/admin/sceneid/sceneidloginevent/add/')
+        self.assertEqual(response.status_code, 403)
+
+
+class TestEstimatedCountPaginator(TestCase):
+    def setUp(self):
+        for i in range(3):
+            SceneID.objects.create(sceneid=1000 + i, user=User.objects.create_user('user%d' % i))
+
+    def test_no_estimate_for_filtered_queryset(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(estimate_count(SceneID.objects.filter(sceneid=1000)))
+            self.assertIsNone(estimate_count(SceneID.objects.all()[:10]))
+
+    def test_counts_without_estimate(self):
+        # SQLite keeps no row count estimate
+        self.assertIsNone(estimate_count(SceneID.objects.all()))
+        self.assertEqual(EstimatedCountPaginator(SceneID.objects.order_by('-pk'), 2).count, 3)
+
+    def test_uses_estimate_for_large_table(self):
+        paginator = EstimatedCountPaginator(SceneID.objects.order_by('-pk'), 2)
+        with patch('sceneid.paginator.estimate_count', return_value=2000000), \
+                self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 2000000)
+            self.assertEqual(paginator.num_pages, 1000000)
+
+    def test_counts_small_table(self):
+        paginator = EstimatedCountPaginator(SceneID.objects.order_by('-pk'), 2)
+        with patch('sceneid.paginator.estimate_count', return_value=5), \
+                self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 3)
@@ -0,0 +1,161 @@
+import base64
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.test import AsyncClient, TestCase, override_settings
+import httpx
+
+from sceneid.client import AsyncSceneIDClient
+
+
+def mock_sceneid_handler(request):
+    if request.url == 'https://id.scene.org/oauth/token/':
+        expected_auth_header = (
+            "Basic %s" % base64.b64encode(b'testsite:supersecretclientsecret').decode('ascii')
+        )
+        if request.headers['Authorization'] != expected_auth_header:
+            return httpx.Response(401)
+        return httpx.Response(200, json={
+            'access_token': '5678567856785678',
+            'expires_in': 3600, 'token_type': 'Bearer', 'scope': 'basic',
+            'refresh_token': '8765876587658765',
+        })
+    elif request.url == 'https://id.scene.org/api/3.0/me/':
+        if request.headers['Authorization'] != "Bearer 5678567856785678":
+            return httpx.Response(401)
+        return httpx.Response(200, json={
+            'success': True,
+            'user': {
+                'id': 1234,
+                'first_name': 'Matt', 'last_name': 'Westcott',
+                'display_name': 'gasman in a trenchcoat',
+            },
+        })
+    return httpx.Response(404)
+
+
+@override_settings(ROOT_URLCONF='tests.async_urls')
+@patch('sceneid.async_views.get_random_string', lambda length: '66666666')
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret',
+            transport=httpx.MockTransport(mock_sceneid_handler),
+        )
+        patcher = patch('sceneid.async_views._get_async_sceneid_client', lambda: client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def get_session(self):
+        return await sync_to_async(lambda: dict(self.async_client.session))()
+
+    async def test_log_in_existing_user(self):
+        testuser = await User.objects.acreate(username='testuser')
+        await testuser.sceneids.acreate(sceneid=1234)
+
+        response = await self.async_client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertEqual(response.status_code, 302)
+        self.assertURLEqual(
+            response['Location'],
+            'https://id.scene.org/oauth/authorize/?state=66666666&'
+            'redirect_uri=http%3A%2F%2Ftestsite%2Faccount%2Fsceneid%2Flogin%2F&'
+            'response_type=code&client_id=testsite'
+        )
+
+        # attempt to return with mismatched state
+        response = await self.async_client.get(
+            '/account/sceneid/login/?state=55555555&code=4321432143214321'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # now with correct state
+        response = await self.async_client.get(
+            '/account/sceneid/login/?state=66666666&code=4321432143214321'
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/landing/')
+        session = await self.get_session()
+        self.assertEqual(int(session['_auth_user_id']), testuser.pk)
+
+    @override_settings(SCENEID_SIGNED_STATE=True)
+    async def test_signed_state_is_tied_to_browser(self):
+        testuser = await User.objects.acreate(username='testuser')
+        await testuser.sceneids.acreate(sceneid=1234)
+
+        response = await self.async_client.get('/account/sceneid/auth/?next=/landing/')
+        state = parse_qs(urlparse(response['Location']).query)['state'][0]
+        login_url = '/account/sceneid/login/?state=%s&code=4321432143214321' % state
+
+        response = await AsyncClient().get(login_url)
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.get(login_url)
+        self.assertEqual(response['Location'], '/landing/')
+        session = await self.get_session()
+        self.assertEqual(int(session['_auth_user_id']), testuser.pk)
+
+    async def test_log_in_deactivated_user(self):
+        testuser = await User.objects.acreate(username='testuser', is_active=False)
+        await testuser.sceneids.acreate(sceneid=1234)
+
+        await self.async_client.get('/account/sceneid/auth/?next=/landing/')
+        response = await self.async_client.get(
+            '/account/sceneid/login/?state=66666666&code=4321432143214321'
+        )
+        self.assertEqual(response['Location'], '/landing/')
+        self.assertNotIn('_auth_user_id', await self.get_session())
+        messages = list(get_messages(response.asgi_request))
+        self.assertEqual(str(messages[0]), "This account has been deactivated.")
+
+    async def test_associate_sceneid_with_new_user(self):
+        await self.async_client.get('/account/sceneid/auth/?next=/landing/')
+        response = await self.async_client.get(
+            '/account/sceneid/login/?state=66666666&code=4321432143214321'
+        )
+        self.assertEqual(response['Location'], '/account/sceneid/connect/')
+
+        response = await self.async_client.get('/account/sceneid/connect/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response,
+            "You successfully logged in with your SceneID as <b>gasman in a trenchcoat</b>"
+        )
+
+        # GET requests to the form handlers go back to the connect page
+        response = await self.async_client.get('/account/sceneid/connect/new/')
+        self.assertEqual(response['Location'], '/account/sceneid/connect/')
+
+        response = await self.async_client.post('/account/sceneid/connect/new/', {
+            'username': 'testuser2'
+        })
+        self.assertEqual(response['Location'], '/landing/')
+        user = await User.objects.aget(username='testuser2')
+        self.assertTrue(await user.sceneids.filter(sceneid=1234).aexists())
+        session = await self.get_session()
+        self.assertEqual(int(session['_auth_user_id']), user.pk)
+
+    async def test_associate_sceneid_with_existing_user(self):
+        testuser = await sync_to_async(User.objects.create_user)(
+            username='testuser', password='12345'
+        )
+        await self.async_client.get('/account/sceneid/auth/?next=/landing/')
+        await self.async_client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        response = await self.async_client.post('/account/sceneid/connect/old/', {
+            'username': 'testuser', 'password': '12346'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Please enter a correct username and password.")
+
+        response = await self.async_client.post('/account/sceneid/connect/old/', {
+            'username': 'testuser', 'password': '12345'
+        })
+        self.assertEqual(response['Location'], '/landing/')
+        self.assertTrue(await testuser.sceneids.filter(sceneid=1234).aexists())
+
+    async def test_connect_without_pending_login(self):
+        response = await self.async_client.get('/account/sceneid/connect/')
+        self.assertEqual(response['Location'], '/')
@@ -0,0 +1,274 @@
+import datetime
+from io import StringIO
+import time
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+import httpx
+import responses
+
+from sceneid import audit
+from sceneid.client import AsyncSceneIDClient
+from sceneid.models import SceneIDLoginEvent
+from tests.test_async_views import mock_sceneid_handler
+from tests.test_views import TestViews
+
+
+class AuditTestMixin:
+    def setUp(self):
+        # events are written by calling flush, rather than from the flusher thread (which
+        # would not see the test transaction)
+        patcher = patch('sceneid.audit._start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        audit._buffer.clear()
+        audit._wakeup.clear()
+        self.addCleanup(audit._buffer.clear)
+        self.addCleanup(audit._wakeup.clear)
+
+    def get_events(self):
+        audit.flush()
+        return list(
+            SceneIDLoginEvent.objects.order_by('pk').values_list('event', 'sceneid', 'user_id')
+        )
+
+
+@override_settings(SCENEID_AUDIT_LOG=True)
+@patch('sceneid.views.get_random_string', lambda length: '66666666')
+class TestAuditLog(AuditTestMixin, TestCase):
+    set_up_responses = TestViews.set_up_responses
+
+    def log_in(self, state='66666666'):
+        self.client.get('/account/sceneid/auth/')
+        return self.client.get(
+            '/account/sceneid/login/?state=%s&code=4321432143214321' % state,
+            HTTP_USER_AGENT='TestBrowser/1.0'
+        )
+
+    @responses.activate
+    def test_login(self):
+        testuser = User.objects.create_user(username='testuser')
+        testuser.sceneids.create(sceneid=1234)
+        self.set_up_responses()
+
+        self.assertEqual(self.log_in(state='55555555').status_code, 400)
+        self.log_in()
+        self.assertEqual(self.get_events(), [
+            ('state_mismatch', None, None),
+            ('login', 1234, testuser.pk),
+        ])
+        event = SceneIDLoginEvent.objects.get(event='login')
+        self.assertEqual(event.ip_address, '127.0.0.1')
+        self.assertEqual(event.user_agent, 'TestBrowser/1.0')
+
+    @responses.activate
+    @override_settings(SCENEID_SIGNED_STATE=True)
+    def test_signed_state_mismatch(self):
+        self.set_up_responses()
+        self.assertEqual(self.log_in(state='garbage').status_code, 400)
+        self.assertEqual(self.get_events(), [('state_mismatch', None, None)])
+
+    @responses.activate
+    def test_deactivated_user(self):
+        testuser = User.objects.create_user(username='testuser', is_active=False)
+        testuser.sceneids.create(sceneid=1234)
+        self.set_up_responses()
+
+        self.log_in()
+        self.assertEqual(self.get_events(), [('deactivated', 1234, testuser.pk)])
+
+    @responses.activate
+    def test_link_new_user(self):
+        self.set_up_responses()
+        self.log_in()
+        self.client.post('/account/sceneid/connect/new/', {'username': 'testuser2'})
+        user = User.objects.get(username='testuser2')
+        self.assertEqual(self.get_events(), [
+            ('unlinked', 1234, None),
+            ('link_new', 1234, user.pk),
+        ])
+
+    @responses.activate
+    def test_link_existing_user(self):
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        self.set_up_responses()
+        self.log_in()
+        self.client.post('/account/sceneid/connect/old/', {
+            'username': 'testuser', 'password': '12345'
+        })
+        self.assertEqual(self.get_events(), [
+            ('unlinked', 1234, None),
+            ('link_existing', 1234, testuser.pk),
+        ])
+
+    @responses.activate
+    @override_settings(SCENEID_AUDIT_LOG=False)
+    def test_disabled(self):
+        self.set_up_responses()
+        self.log_in()
+        self.assertEqual(audit._buffer, [])
+        self.assertEqual(self.get_events(), [])
+
+
+@override_settings(SCENEID_AUDIT_LOG=True, SCENEID_AUDIT_BATCH_SIZE=3)
+class TestBuffering(AuditTestMixin, TestCase):
+    def test_record_does_not_write(self):
+        request = self.client.get('/').wsgi_request
+        with self.assertNumQueries(0):
+            audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=1)
+        self.assertEqual(len(audit._buffer), 1)
+        audit._start_flusher.assert_called_once_with()
+
+    def test_batch_size_wakes_flusher(self):
+        request = self.client.get('/').wsgi_request
+        audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=1)
+        audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=2)
+        self.assertFalse(audit._wakeup.is_set())
+        audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=3)
+        self.assertTrue(audit._wakeup.is_set())
+
+        # one INSERT, in a savepoint
+        with self.assertNumQueries(3):
+            self.assertEqual(audit.flush(), 3)
+        self.assertEqual([sceneid for _, sceneid, _ in self.get_events()], [1, 2, 3])
+        self.assertEqual(audit._buffer, [])
+
+    def test_flush(self):
+        request = self.client.get('/').wsgi_request
+        audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=1)
+        self.assertEqual(audit.flush(), 1)
+        self.assertEqual(audit.flush(), 0)
+        self.assertEqual(self.get_events(), [('unlinked', 1, None)])
+
+
+@override_settings(SCENEID_AUDIT_LOG=True)
+class TestFlushFailures(AuditTestMixin, TestCase):
+    def record_events(self, count):
+        request = self.client.get('/').wsgi_request
+        for sceneid in range(1, count + 1):
+            audit.record(SceneIDLoginEvent.UNLINKED, request, sceneid=sceneid)
+
+    def test_bad_row_is_dropped(self):
+        self.record_events(3)
+        audit._buffer[1].created_at = None
+        with self.assertLogs('sceneid', 'ERROR'):
+            self.assertEqual(audit.flush(), 2)
+        self.assertEqual([sceneid for _, sceneid, _ in self.get_events()], [1, 3])
+
+    def test_events_kept_when_database_unavailable(self):
+        self.record_events(2)
+        with patch.object(
+            SceneIDLoginEvent.objects, 'bulk_create', side_effect=OperationalError
+        ), self.assertRaises(OperationalError):
+            audit.flush()
+        self.record_events(1)
+        self.assertEqual([event.sceneid for event in audit._buffer], [1, 2, 1])
+        self.assertEqual(audit.flush(), 3)
+
+    @patch('sceneid.audit.MAX_BUFFERED_EVENTS', 3)
+    def test_kept_events_are_bounded(self):
+        self.record_events(2)
+        with patch.object(
+            SceneIDLoginEvent.objects, 'bulk_create', side_effect=OperationalError
+        ), self.assertRaises(OperationalError):
+            audit.flush()
+        self.record_events(2)
+        with patch.object(
+            SceneIDLoginEvent.objects, 'bulk_create', side_effect=OperationalError
+        ), self.assertRaises(OperationalError), self.assertLogs('sceneid', 'ERROR'):
+            audit.flush()
+        # the oldest event is dropped
+        self.assertEqual([event.sceneid for event in audit._buffer], [2, 1, 2])
+
+
+@override_settings(SCENEID_AUDIT_FLUSH_INTERVAL=0.01)
+class TestFlusherThread(SimpleTestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+    def test_flushes_on_interval(self):
+        with patch('sceneid.audit.flush') as flush:
+            audit._start_flusher()
+            try:
+                # with no events recorded, the thread still flushes once the interval is up
+                self.wait_for(lambda: flush.call_count >= 2)
+            finally:
+                audit._stop_flusher()
+        self.assertIsNone(audit._flusher)
+
+    @override_settings(SCENEID_AUDIT_FLUSH_INTERVAL=60, SCENEID_AUDIT_BATCH_SIZE=1)
+    def test_woken_by_batch_size(self):
+        with patch('sceneid.audit.flush') as flush:
+            audit._start_flusher()
+            try:
+                audit._add(SceneIDLoginEvent.UNLINKED, self.client.get('/').wsgi_request, 1, None)
+                self.wait_for(lambda: flush.called)
+            finally:
+                audit._stop_flusher()
+                audit._buffer.clear()
+
+    def test_started_once_per_process(self):
+        with patch('sceneid.audit.flush'):
+            audit._start_flusher()
+            try:
+                flusher = audit._flusher
+                audit._start_flusher()
+                self.assertIs(audit._flusher, flusher)
+
+                # a forked process starts its own thread
+                with patch('sceneid.audit.os.getpid', return_value=flusher[0] + 1):
+                    audit._start_flusher()
+                    self.assertIsNot(audit._flusher[1], flusher[1])
+                    audit._stop_flusher()
+            finally:
+                audit._flusher = flusher
+                audit._stop_flusher()
+
+
+@override_settings(ROOT_URLCONF='tests.async_urls', SCENEID_AUDIT_LOG=True)
+@patch('sceneid.async_views.get_random_string', lambda length: '66666666')
+class TestAsyncAuditLog(AuditTestMixin, TestCase):
+    async def test_login(self):
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret',
+            transport=httpx.MockTransport(mock_sceneid_handler),
+        )
+        testuser = await User.objects.acreate(username='testuser')
+        await testuser.sceneids.acreate(sceneid=1234)
+
+        with patch('sceneid.async_views._get_async_sceneid_client', lambda: client):
+            await self.async_client.get('/account/sceneid/auth/')
+            await self.async_client.get('/account/sceneid/login/?state=55555555&code=4321')
+            await self.async_client.get('/account/sceneid/login/?state=66666666&code=4321')
+
+        await sync_to_async(audit.flush)()
+        events = [
+            event async for event in
+            SceneIDLoginEvent.objects.order_by('pk').values_list('event', 'user_id')
+        ]
+        self.assertEqual(events, [('state_mismatch', None), ('login', testuser.pk)])
+
+
+class TestPruneLoginEvents(TestCase):
+    def test_prune(self):
+        now = timezone.now()
+        for days in (1, 89, 91, 200):
+            SceneIDLoginEvent.objects.create(
+                created_at=now - datetime.timedelta(days=days), event=SceneIDLoginEvent.LOGIN
+            )
+
+        stdout = StringIO()
+        call_command('sceneid_prune_login_events', batch_size=1, stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(), "2 login events deleted")
+        self.assertEqual(SceneIDLoginEvent.objects.count(), 2)
+
+        call_command('sceneid_prune_login_events', days=30, stdout=stdout)
+        self.assertEqual(SceneIDLoginEvent.objects.count(), 1)
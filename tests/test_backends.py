@@ -0,0 +1,111 @@
+from unittest.mock import patch
+
+from django.contrib.auth import authenticate, get_user
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+import responses
+
+from sceneid.backends import SceneIDBackend, get_login_backend
+from tests.test_views import TestViews
+
+
+BACKENDS = ['sceneid.backends.SceneIDBackend']
+
+
+@override_settings(AUTHENTICATION_BACKENDS=BACKENDS)
+class TestSceneIDBackend(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.testuser = User.objects.create_user(username='testuser', password='12345')
+        self.testuser.sceneids.create(sceneid=1234)
+
+    def test_authenticate(self):
+        self.assertEqual(authenticate(None, sceneid=1234), self.testuser)
+        self.assertIsNone(authenticate(None, sceneid=5678))
+        self.assertEqual(authenticate(None, username='testuser', password='12345'), self.testuser)
+
+        self.testuser.is_active = False
+        self.testuser.save()
+        self.assertIsNone(authenticate(None, sceneid=1234))
+
+    def test_get_login_backend(self):
+        self.assertEqual(get_login_backend(), 'sceneid.backends.SceneIDBackend')
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend']):
+            self.assertEqual(get_login_backend(), 'django.contrib.auth.backends.ModelBackend')
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login_uses_backend(self):
+        TestViews.set_up_responses(self)
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+        self.assertEqual(
+            self.client.session['_auth_user_backend'], 'sceneid.backends.SceneIDBackend'
+        )
+        self.assertEqual(get_user(self.client), self.testuser)
+
+    def test_get_user_uncached(self):
+        backend = SceneIDBackend()
+        with self.assertNumQueries(1):
+            backend.get_user(self.testuser.pk)
+        with self.assertNumQueries(1):
+            backend.get_user(self.testuser.pk)
+
+    @override_settings(SCENEID_AUTH_USER_CACHE_TIMEOUT=60)
+    def test_get_user_cached(self):
+        backend = SceneIDBackend()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.testuser.pk), self.testuser)
+        with self.assertNumQueries(0):
+            user = backend.get_user(self.testuser.pk)
+        self.assertEqual(user.username, 'testuser')
+
+        # saving the user invalidates the entry
+        self.testuser.first_name = 'Matt'
+        self.testuser.save()
+        self.assertEqual(backend.get_user(self.testuser.pk).first_name, 'Matt')
+
+        self.testuser.is_active = False
+        self.testuser.save()
+        self.assertIsNone(backend.get_user(self.testuser.pk))
+
+    @override_settings(SCENEID_AUTH_USER_CACHE_TIMEOUT=60)
+    def test_deleted_user(self):
+        backend = SceneIDBackend()
+        backend.get_user(self.testuser.pk)
+        user_id = self.testuser.pk
+        self.testuser.delete()
+        self.assertIsNone(backend.get_user(user_id))
+
+    @override_settings(SCENEID_AUTH_PERMISSION_CACHE_TIMEOUT=60)
+    def test_permissions_cached(self):
+        backend = SceneIDBackend()
+        permission = Permission.objects.get(codename='add_user')
+        self.testuser.user_permissions.add(permission)
+
+        user = User.objects.get(pk=self.testuser.pk)
+        self.assertTrue(backend.has_perm(user, 'auth.add_user'))
+        user = User.objects.get(pk=self.testuser.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(backend.has_perm(user, 'auth.add_user'))
+            self.assertFalse(backend.has_perm(user, 'auth.delete_user'))
+
+        # changes to the user's permissions invalidate the entry
+        self.testuser.user_permissions.remove(permission)
+        user = User.objects.get(pk=self.testuser.pk)
+        self.assertFalse(backend.has_perm(user, 'auth.add_user'))
+
+        # as do changes to their groups' permissions
+        group = Group.objects.create(name='editors')
+        self.testuser.groups.add(group)
+        user = User.objects.get(pk=self.testuser.pk)
+        self.assertFalse(backend.has_perm(user, 'auth.delete_user'))
+        group.permissions.add(Permission.objects.get(codename='delete_user'))
+        user = User.objects.get(pk=self.testuser.pk)
+        self.assertTrue(backend.has_perm(user, 'auth.delete_user'))
+
+        # and changes made from the group's side
+        group.user_set.remove(self.testuser)
+        user = User.objects.get(pk=self.testuser.pk)
+        self.assertFalse(backend.has_perm(user, 'auth.delete_user'))
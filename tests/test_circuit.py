@@ -0,0 +1,241 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+import httpx
+import requests
+import responses
+
+from sceneid import circuit
+from sceneid.circuit import CircuitOpenError
+from sceneid.client import AsyncSceneIDClient, SceneIDClient
+from sceneid.instrumentation import phase_timed
+
+
+@override_settings(SCENEID_CIRCUIT_BREAKER_THRESHOLD=3, SCENEID_CIRCUIT_BREAKER_RESET_TIMEOUT=30)
+class TestCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.sceneid_client = SceneIDClient('testsite', 'supersecretclientsecret')
+        self.breaker = circuit.get_breaker('id.scene.org')
+
+    def add_user_data_response(self, **kwargs):
+        responses.add(responses.GET, 'https://id.scene.org/api/3.0/me/', **kwargs)
+
+    @responses.activate
+    def test_opens_after_consecutive_failures(self):
+        self.add_user_data_response(body=requests.ConnectionError())
+        for i in range(3):
+            with self.assertRaises(requests.ConnectionError):
+                self.sceneid_client.get_user_data('5678567856785678')
+        self.assertEqual(self.breaker.get_state(), circuit.OPEN)
+
+        # further requests fail without reaching the provider
+        with self.assertRaises(CircuitOpenError):
+            self.sceneid_client.get_user_data('5678567856785678')
+        self.assertEqual(len(responses.calls), 3)
+
+    @responses.activate
+    def test_server_errors_count_as_failures(self):
+        self.add_user_data_response(status=503, json={})
+        for i in range(3):
+            with self.assertRaises(requests.HTTPError):
+                self.sceneid_client.get_user_data('5678567856785678')
+        self.assertEqual(self.breaker.get_state(), circuit.OPEN)
+
+    @responses.activate
+    def test_success_resets_failure_count(self):
+        self.add_user_data_response(status=503, json={})
+        self.add_user_data_response(status=503, json={})
+        self.add_user_data_response(json={'success': True})
+        self.add_user_data_response(status=503, json={})
+        for i in range(4):
+            try:
+                self.sceneid_client.get_user_data('5678567856785678')
+            except requests.HTTPError:
+                pass
+        self.assertEqual(self.breaker.get_state(), circuit.CLOSED)
+
+    @responses.activate
+    def test_half_open_probe(self):
+        self.add_user_data_response(status=503, json={})
+        self.add_user_data_response(json={'success': True})
+        for i in range(3):
+            self.breaker.record_failure()
+
+        with patch('sceneid.circuit.time.time', return_value=self.breaker.cache.get(
+            self.breaker.opened_at_key
+        ) + 31):
+            self.assertEqual(self.breaker.get_state(), circuit.HALF_OPEN)
+            # a failed probe re-opens the circuit
+            with self.assertRaises(requests.HTTPError):
+                self.sceneid_client.get_user_data('5678567856785678')
+
+        self.assertEqual(self.breaker.get_state(), circuit.OPEN)
+
+        with patch('sceneid.circuit.time.time', return_value=self.breaker.cache.get(
+            self.breaker.opened_at_key
+        ) + 31):
+            # only one probe is allowed at a time
+            self.breaker.before_request()
+            with self.assertRaises(CircuitOpenError):
+                self.sceneid_client.get_user_data('5678567856785678')
+            self.breaker.cache.delete(self.breaker.probe_key)
+
+            # a successful probe closes it
+            self.sceneid_client.get_user_data('5678567856785678')
+
+        self.assertEqual(self.breaker.get_state(), circuit.CLOSED)
+        self.assertEqual(len(responses.calls), 2)
+
+    def test_state_changes_are_sent_to_instrumentation(self):
+        events = []
+
+        def receiver(phase, duration, data, **kwargs):
+            events.append((phase, data))
+
+        phase_timed.connect(receiver)
+        try:
+            for i in range(4):
+                self.breaker.record_failure()
+            self.breaker.record_success()
+        finally:
+            phase_timed.disconnect(receiver)
+
+        self.assertEqual(events, [
+            ('circuit', {'host': 'id.scene.org', 'state': 'open'}),
+            ('circuit', {'host': 'id.scene.org', 'state': 'closed'}),
+        ])
+
+    @override_settings(SCENEID_CIRCUIT_BREAKER_THRESHOLD=None)
+    def test_disabled_by_default(self):
+        self.assertIsNone(circuit.get_breaker('id.scene.org'))
+
+    async def test_async_client(self):
+        def handler(request):
+            raise httpx.ConnectTimeout("timed out", request=request)
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        for i in range(3):
+            with self.assertRaises(httpx.ConnectTimeout):
+                await client.get_user_data('5678567856785678')
+        with self.assertRaises(CircuitOpenError):
+            await client.get_user_data('5678567856785678')
+
+    async def test_async_client_server_error(self):
+        def handler(request):
+            return httpx.Response(503, json={'error': 'maintenance'})
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        with self.assertRaises(httpx.HTTPStatusError):
+            await client.get_user_data('5678567856785678')
+        self.assertEqual(self.breaker.cache.get(self.breaker.failures_key), 1)
+
+
+@override_settings(SCENEID_CIRCUIT_BREAKER_THRESHOLD=3)
+class TestCircuitBreakerViews(TestCase):
+    def setUp(self):
+        cache.clear()
+        breaker = circuit.get_breaker('id.scene.org')
+        for i in range(3):
+            breaker.record_failure()
+
+    def test_auth_redirect_view(self):
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'sceneid/unavailable.html')
+
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login_view(self):
+        with override_settings(SCENEID_CIRCUIT_BREAKER_THRESHOLD=None):
+            self.client.get('/account/sceneid/auth/?next=/landing/')
+        response = self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'sceneid/unavailable.html')
+
+
+@patch('sceneid.views.get_random_string', lambda length: '66666666')
+class TestErrorResponses(TestCase):
+    def log_in(self):
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        return self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+    @responses.activate
+    def test_server_error_on_token_request(self):
+        responses.add(
+            responses.POST, 'https://id.scene.org/oauth/token/', status=503,
+            json={'error': 'maintenance'},
+        )
+        response = self.log_in()
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'sceneid/unavailable.html')
+
+    @responses.activate
+    def test_token_response_without_access_token(self):
+        responses.add(
+            responses.POST, 'https://id.scene.org/oauth/token/', status=400,
+            json={'error': 'invalid_grant'},
+        )
+        # e.g. the callback URL reloaded, re-using the code - the provider is not down, so
+        # send the user back to try again
+        response = self.log_in()
+        self.assertRedirects(response, '/landing/', fetch_redirect_response=False)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["Your SceneID login could not be completed. Please try again."]
+        )
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_user_data_response_without_user(self):
+        responses.add(
+            responses.POST, 'https://id.scene.org/oauth/token/',
+            json={'access_token': '5678567856785678', 'token_type': 'Bearer'},
+        )
+        responses.add(
+            responses.GET, 'https://id.scene.org/api/3.0/me/', status=401,
+            json={'success': False},
+        )
+        response = self.log_in()
+        self.assertRedirects(response, '/landing/', fetch_redirect_response=False)
+        self.assertFalse(get_user(self.client).is_authenticated)
+
+    @override_settings(ROOT_URLCONF='tests.async_urls')
+    @patch('sceneid.async_views.get_random_string', lambda length: '66666666')
+    async def test_async_server_error_on_token_request(self):
+        def handler(request):
+            return httpx.Response(503, json={'error': 'maintenance'})
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        with patch('sceneid.async_views._get_async_sceneid_client', lambda: client):
+            await self.async_client.get('/account/sceneid/auth/')
+            response = await self.async_client.get(
+                '/account/sceneid/login/?state=66666666&code=4321'
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'sceneid/unavailable.html')
+
+    @override_settings(ROOT_URLCONF='tests.async_urls')
+    @patch('sceneid.async_views.get_random_string', lambda length: '66666666')
+    async def test_async_rejected_code(self):
+        def handler(request):
+            return httpx.Response(400, json={'error': 'invalid_grant'})
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        with patch('sceneid.async_views._get_async_sceneid_client', lambda: client):
+            await self.async_client.get('/account/sceneid/auth/?next=/landing/')
+            response = await self.async_client.get(
+                '/account/sceneid/login/?state=66666666&code=4321'
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/landing/')
@@ -1,8 +1,13 @@
 import base64
 import json
+from unittest.mock import patch
+
 from django.test import SimpleTestCase
+import httpx
 import responses
-from sceneid.client import SceneIDClient
+from sceneid.client import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, AsyncSceneIDClient, SceneIDClient, get_client
+)
 
 
 class TestClient(SimpleTestCase):
@@ -34,6 +39,14 @@ class TestClient(SimpleTestCase):
             'response_type=code&client_id=testsite&scope=basic+user:email'
         )
 
+    def test_get_authorization_uri_with_scheme(self):
+        client = SceneIDClient(
+            'testsite', 'supersecretclientsecret', '127.0.0.1:8001', scheme='http'
+        )
+        uri = client.get_authorization_uri('1234', 'http://testsite/account/sceneid/login/')
+        self.assertTrue(uri.startswith('http://127.0.0.1:8001/oauth/authorize/?'))
+        self.assertEqual(client.get_token_url(), 'http://127.0.0.1:8001/oauth/token/')
+
     @responses.activate
     def test_get_access_token(self):
         def token_response(request):
@@ -99,3 +112,97 @@ class TestClient(SimpleTestCase):
 
         response = self.sceneid_client.get_user_data('5678567856785678')
         self.assertEqual(response['user']['display_name'], 'gasman')
+
+    def test_session_is_shared_between_clients(self):
+        other_client = SceneIDClient('othersite', 'othersecret')
+        self.assertIs(self.sceneid_client.session, other_client.session)
+
+        other_host_client = SceneIDClient('testsite', 'supersecretclientsecret', 'id.example.com')
+        self.assertIsNot(self.sceneid_client.session, other_host_client.session)
+
+    @responses.activate
+    def test_cookies_are_not_kept(self):
+        responses.add(
+            responses.GET, 'https://id.scene.org/api/3.0/me/',
+            json={'success': True, 'user': {'id': 1234}}, headers={'Set-Cookie': 'sid=abc; Path=/'},
+        )
+        self.sceneid_client.get_user_data('5678567856785678')
+        self.sceneid_client.get_user_data('8765876587658765')
+        self.assertEqual(len(self.sceneid_client.session.cookies), 0)
+        self.assertNotIn('Cookie', responses.calls[1].request.headers)
+
+    def test_get_client_returns_shared_instance(self):
+        client = get_client('testsite', 'supersecretclientsecret', read_timeout=3)
+        self.assertIs(client, get_client('testsite', 'supersecretclientsecret', read_timeout=3))
+        self.assertIsNot(client, get_client('testsite', 'supersecretclientsecret', read_timeout=4))
+        self.assertEqual(client.timeout, (DEFAULT_CONNECT_TIMEOUT, 3))
+
+    def test_retries_are_not_applied_to_token_exchange(self):
+        adapter = self.sceneid_client.session.get_adapter('https://id.scene.org/')
+        retry = adapter.max_retries
+        self.assertTrue(retry.is_retry('GET', 503))
+        self.assertFalse(retry.is_retry('POST', 503))
+
+    @responses.activate
+    def test_requests_use_timeout(self):
+        responses.add(
+            responses.GET, 'https://id.scene.org/api/3.0/me/',
+            json={'success': True, 'user': {'id': 1234}},
+        )
+        with patch.object(
+            self.sceneid_client.session, 'get', wraps=self.sceneid_client.session.get
+        ) as session_get:
+            self.sceneid_client.get_user_data('5678567856785678')
+
+        self.assertEqual(
+            session_get.call_args[1]['timeout'], (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+        )
+
+
+class TestAsyncClient(SimpleTestCase):
+    async def test_get_access_token_and_user_data(self):
+        def handler(request):
+            if request.url == 'https://id.scene.org/oauth/token/':
+                self.assertEqual(
+                    request.content,
+                    b'grant_type=authorization_code&code=4321432143214321&'
+                    b'redirect_uri=https%3A%2F%2Ftestsite%2Faccount%2Fsceneid%2Flogin%2F'
+                )
+                return httpx.Response(200, json={'access_token': '5678567856785678'})
+            else:
+                self.assertEqual(request.url, 'https://id.scene.org/api/3.0/me/')
+                self.assertEqual(request.headers['Authorization'], "Bearer 5678567856785678")
+                return httpx.Response(200, json={'success': True, 'user': {'id': 1234}})
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        token_data = await client.get_access_token(
+            '4321432143214321',
+            'https://testsite/account/sceneid/login/',
+        )
+        self.assertEqual(token_data['access_token'], '5678567856785678')
+        user_data = await client.get_user_data('5678567856785678')
+        self.assertEqual(user_data['user']['id'], 1234)
+
+    async def test_http_client_is_shared_within_event_loop(self):
+        client = AsyncSceneIDClient('testsite', 'supersecretclientsecret')
+        other_client = AsyncSceneIDClient('othersite', 'othersecret')
+        self.assertIs(client.http_client, other_client.http_client)
+
+    async def test_cookies_are_not_kept(self):
+        cookie_headers = []
+
+        def handler(request):
+            cookie_headers.append(request.headers.get('Cookie'))
+            return httpx.Response(
+                200, json={'success': True, 'user': {'id': 1234}},
+                headers={'Set-Cookie': 'sid=abc; Path=/'},
+            )
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        await client.get_user_data('5678567856785678')
+        await client.get_user_data('8765876587658765')
+        self.assertEqual(cookie_headers, [None, None])
@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from sceneid.models import SceneID
+from sceneid.user_cache import get_user_for_sceneid
+
+
+class TestSceneIDLinksCommand(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def call(self, *args):
+        stdout = StringIO()
+        stderr = StringIO()
+        call_command('sceneid_links', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_export_csv(self):
+        SceneID.objects.create(sceneid=1234, user=self.alice)
+        SceneID.objects.create(sceneid=5678, user=self.bob)
+        stdout, stderr = self.call('export')
+        self.assertEqual(stdout.splitlines(), [
+            'sceneid,user_id,username',
+            '1234,%d,alice' % self.alice.pk,
+            '5678,%d,bob' % self.bob.pk,
+        ])
+
+    def test_export_jsonl(self):
+        SceneID.objects.create(sceneid=1234, user=self.alice)
+        path = os.path.join(self.tempdir.name, 'links.jsonl')
+        self.call('export', path)
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(rows, [{'sceneid': 1234, 'user_id': self.alice.pk, 'username': 'alice'}])
+
+    def test_import_csv(self):
+        SceneID.objects.create(sceneid=1111, user=self.alice)
+        path = self.write_file('links.csv', "\n".join([
+            'sceneid,user_id,username',
+            '1234,%d,' % self.alice.pk,
+            '5678,,bob',
+            '1111,%d,' % self.bob.pk,  # already linked to alice
+            '9999,,nobody',
+            'notanumber,1,',
+            '',
+        ]))
+        # user lookups, existing link lookup, and a single INSERT within a savepoint, followed
+        # by a lookup of the links that were written
+        with self.assertNumQueries(7):
+            stdout, stderr = self.call('import', path)
+        self.assertIn("2 links created, 0 updated, 1 conflicts skipped, 2 rows with errors", stdout)
+        self.assertIn("SceneID already linked to user %d" % self.alice.pk, stderr)
+        self.assertEqual(SceneID.objects.get(sceneid=1234).user, self.alice)
+        self.assertEqual(SceneID.objects.get(sceneid=5678).user, self.bob)
+        self.assertEqual(SceneID.objects.get(sceneid=1111).user, self.alice)
+
+    def test_import_jsonl_update_conflicts(self):
+        SceneID.objects.create(sceneid=1111, user=self.alice)
+        path = self.write_file('links.jsonl', "\n".join([
+            json.dumps({'sceneid': 1111, 'user_id': self.bob.pk}),
+            json.dumps({'sceneid': 2222, 'username': 'alice'}),
+            '{not json',
+        ]))
+        stdout, stderr = self.call('import', path, '--on-conflict', 'update', '--batch-size', '2')
+        self.assertIn("1 links created, 1 updated, 0 conflicts skipped, 1 rows with errors", stdout)
+        self.assertEqual(SceneID.objects.get(sceneid=1111).user, self.bob)
+        self.assertEqual(SceneID.objects.get(sceneid=2222).user, self.alice)
+
+    def test_import_concurrent_conflict(self):
+        path = self.write_file('links.csv', 'sceneid,user_id\n1234,%d\n5678,%d\n' % (
+            self.alice.pk, self.alice.pk
+        ))
+        bulk_create = SceneID.objects.bulk_create
+
+        def bulk_create_after_other_process(objs, **kwargs):
+            # another process links 1234 after the command has checked for existing links
+            SceneID.objects.create(sceneid=1234, user=self.bob)
+            return bulk_create(objs, **kwargs)
+
+        with patch.object(SceneID.objects, 'bulk_create', bulk_create_after_other_process):
+            stdout, stderr = self.call('import', path)
+        self.assertIn("1 links created, 0 updated, 1 conflicts skipped", stdout)
+        self.assertIn("SceneID linked to user %d by another process" % self.bob.pk, stderr)
+        self.assertEqual(SceneID.objects.get(sceneid=1234).user, self.bob)
+
+    def test_dry_run(self):
+        path = self.write_file('links.csv', 'sceneid,user_id\n1234,%d\n' % self.alice.pk)
+        stdout, stderr = self.call('import', path, '--dry-run')
+        self.assertIn("(dry run) 1 links created", stdout)
+        self.assertFalse(SceneID.objects.exists())
+
+    @override_settings(SCENEID_USER_CACHE_TIMEOUT=300)
+    def test_import_invalidates_user_cache(self):
+        cache.clear()
+        self.assertIsNone(get_user_for_sceneid(1234))
+        path = self.write_file('links.csv', 'sceneid,user_id\n1234,%d\n' % self.alice.pk)
+        self.call('import', path)
+        self.assertEqual(get_user_for_sceneid(1234), self.alice)
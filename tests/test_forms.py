@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from sceneid.forms import UserCreationForm
+
+
+class TestUserCreationForm(TestCase):
+    def test_suggested_username(self):
+        with self.assertNumQueries(1):
+            form = UserCreationForm({'display_name': 'gasman in a trenchcoat'})
+        self.assertEqual(form['username'].value(), 'gasmaninatrenchcoat')
+
+    def test_suggested_username_avoids_taken_names(self):
+        User.objects.create_user(username='gasman')
+        User.objects.create_user(username='gasman2')
+        with self.assertNumQueries(1):
+            form = UserCreationForm({'display_name': 'gasman'})
+        self.assertEqual(form['username'].value(), 'gasman3')
+
+    def test_suggested_username_is_transliterated(self):
+        form = UserCreationForm({'display_name': 'Ümlaut Ørjan'})
+        self.assertEqual(form['username'].value(), 'Umlautrjan')
+        self.assertEqual(
+            form.get_username_candidates('Ümlaut')[:3], ['Umlaut', 'mlaut', 'Umlaut2']
+        )
+
+    def test_all_candidates_taken(self):
+        form = UserCreationForm({'display_name': 'gasman'})
+        candidates = form.get_username_candidates('gasman')
+        User.objects.bulk_create([User(username=username) for username in candidates])
+        form = UserCreationForm({'display_name': 'gasman'})
+        self.assertEqual(form['username'].value(), 'gasman')
+
+    def test_no_candidates(self):
+        with self.assertNumQueries(0):
+            form = UserCreationForm({'display_name': '???'})
+        self.assertIsNone(form['username'].value())
+
+    def test_long_display_name(self):
+        candidates = UserCreationForm({}).get_username_candidates('x' * 200)
+        self.assertEqual(candidates[0], 'x' * 150)
+        self.assertEqual(candidates[1], 'x' * 149 + '2')
+
+    def test_bound_form_does_not_query(self):
+        with self.assertNumQueries(0):
+            form = UserCreationForm({'display_name': 'gasman'}, {'username': 'gasman'})
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
@@ -0,0 +1,152 @@
+import json
+import time
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+import httpx
+import jwt
+import responses
+
+from sceneid import id_token
+from sceneid.client import AsyncSceneIDClient, SceneIDClient
+
+
+JWKS_URL = 'https://id.scene.org/oauth/jwks/'
+
+signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def make_jwks(key, kid='key1'):
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+    jwk.update({'kid': kid, 'use': 'sig', 'alg': 'RS256'})
+    return {'keys': [jwk]}
+
+
+def make_id_token(key=signing_key, kid='key1', **claims):
+    now = int(time.time())
+    payload = {
+        'iss': 'https://id.scene.org', 'aud': 'testsite', 'sub': '1234',
+        'iat': now, 'exp': now + 300,
+        'given_name': 'Matt', 'family_name': 'Westcott', 'nickname': 'gasman in a trenchcoat',
+    }
+    payload.update(claims)
+    return jwt.encode(payload, key, algorithm='RS256', headers={'kid': kid})
+
+
+@override_settings(SCENEID_ID_TOKEN_JWKS_URL=JWKS_URL)
+class TestIDToken(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sceneid_client = SceneIDClient('testsite', 'supersecretclientsecret')
+
+    def add_jwks_response(self, jwks=None):
+        responses.add(responses.GET, JWKS_URL, json=jwks or make_jwks(signing_key))
+
+    @responses.activate
+    def test_get_user_data(self):
+        self.add_jwks_response()
+        user_data = id_token.get_user_data({'id_token': make_id_token()}, self.sceneid_client)
+        self.assertEqual(user_data, {'success': True, 'user': {
+            'id': 1234, 'first_name': 'Matt', 'last_name': 'Westcott',
+            'display_name': 'gasman in a trenchcoat',
+        }})
+
+        # the key set is cached
+        id_token.get_user_data({'id_token': make_id_token()}, self.sceneid_client)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_key_rotation(self):
+        self.add_jwks_response()
+        id_token.get_user_data({'id_token': make_id_token()}, self.sceneid_client)
+
+        responses.replace(responses.GET, JWKS_URL, json=make_jwks(other_key, kid='key2'))
+        user_data = id_token.get_user_data(
+            {'id_token': make_id_token(other_key, kid='key2')}, self.sceneid_client
+        )
+        self.assertEqual(user_data['user']['id'], 1234)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_invalid_tokens(self):
+        self.add_jwks_response()
+        for token in [
+            make_id_token(other_key),
+            make_id_token(aud='othersite'),
+            make_id_token(iss='https://evil.example.com'),
+            make_id_token(exp=int(time.time()) - 60),
+            'not a token',
+        ]:
+            with self.subTest(token=token), self.assertLogs('sceneid', level='WARNING'):
+                self.assertIsNone(
+                    id_token.get_user_data({'id_token': token}, self.sceneid_client)
+                )
+
+    def test_no_id_token(self):
+        self.assertIsNone(id_token.get_user_data({'access_token': 'x'}, self.sceneid_client))
+
+    @override_settings(SCENEID_ID_TOKEN_JWKS_URL=None)
+    def test_disabled(self):
+        self.assertIsNone(
+            id_token.get_user_data({'id_token': make_id_token()}, self.sceneid_client)
+        )
+
+    async def test_async(self):
+        def handler(request):
+            return httpx.Response(200, json=make_jwks(signing_key))
+
+        client = AsyncSceneIDClient(
+            'testsite', 'supersecretclientsecret', transport=httpx.MockTransport(handler)
+        )
+        user_data = await id_token.aget_user_data({'id_token': make_id_token()}, client)
+        self.assertEqual(user_data['user']['id'], 1234)
+
+    def add_login_responses(self, token):
+        responses.add(
+            responses.POST, 'https://id.scene.org/oauth/token/',
+            json={'access_token': '5678567856785678', 'expires_in': 3600, 'id_token': token},
+        )
+        responses.add(
+            responses.GET, 'https://id.scene.org/api/3.0/me/',
+            json={'success': True, 'user': {'id': 1234, 'display_name': 'gasman'}},
+        )
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login_without_user_data_request(self):
+        testuser = User.objects.create_user(username='testuser')
+        testuser.sceneids.create(sceneid=1234)
+        self.add_jwks_response()
+        self.add_login_responses(make_id_token())
+
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        response = self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client), testuser)
+        self.assertNotIn(
+            'https://id.scene.org/api/3.0/me/', [call.request.url for call in responses.calls]
+        )
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login_falls_back_to_user_data_request(self):
+        testuser = User.objects.create_user(username='testuser')
+        testuser.sceneids.create(sceneid=1234)
+        self.add_jwks_response()
+        self.add_login_responses(make_id_token(other_key))
+
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        with self.assertLogs('sceneid', level='WARNING'):
+            response = self.client.get(
+                '/account/sceneid/login/?state=66666666&code=4321432143214321'
+            )
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client), testuser)
+        self.assertIn(
+            'https://id.scene.org/api/3.0/me/', [call.request.url for call in responses.calls]
+        )
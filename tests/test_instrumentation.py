@@ -0,0 +1,95 @@
+import json
+from unittest.mock import Mock, patch
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+import responses
+
+from sceneid import instrumentation
+from sceneid.client import SceneIDClient
+from tests.test_views import TestViews
+
+
+class RecordingSink:
+    events = []
+
+    def record(self, phase, duration, data):
+        self.events.append((phase, duration, data))
+
+
+@override_settings(SCENEID_METRICS_SINKS=['tests.test_instrumentation.RecordingSink'])
+class TestInstrumentation(TestCase):
+    set_up_responses = TestViews.set_up_responses
+
+    def setUp(self):
+        RecordingSink.events = []
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login_phases(self):
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        testuser.sceneids.create(sceneid=1234)
+        self.set_up_responses()
+
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        phases = [phase for phase, duration, data in RecordingSink.events]
+        self.assertEqual(phases, ['token', 'user_data', 'user_lookup', 'login', 'callback'])
+        events = {phase: data for phase, duration, data in RecordingSink.events}
+        self.assertEqual(events['token']['status'], 200)
+        self.assertEqual(events['token']['retries'], 0)
+        self.assertGreater(events['user_data']['bytes'], 0)
+        self.assertEqual(events['user_lookup'], {'found': True})
+        self.assertEqual(events['callback'], {'status': 302})
+        for phase, duration, data in RecordingSink.events:
+            self.assertGreaterEqual(duration, 0)
+
+    def test_error_is_recorded(self):
+        with self.assertRaises(ValueError):
+            with instrumentation.measure('token'):
+                raise ValueError
+        self.assertEqual(RecordingSink.events[0][0], 'token')
+        self.assertEqual(RecordingSink.events[0][2], {'error': 'ValueError'})
+
+    def test_logging_sink(self):
+        sink = instrumentation.LoggingSink()
+        with self.assertLogs('sceneid.metrics', level='INFO') as logs:
+            sink.record('token', 0.25, {'status': 200, 'bytes': 120})
+        self.assertEqual(
+            logs.output, ['INFO:sceneid.metrics:token took 250.0ms bytes=120 status=200']
+        )
+
+    def test_statsd_sink(self):
+        client = Mock()
+        sink = instrumentation.StatsdSink(client=client)
+        sink.record('token', 0.25, {'status': 200})
+        client.timing.assert_called_once_with('sceneid.token', 250.0)
+        client.incr.assert_called_once_with('sceneid.token.status.200')
+
+
+class TestInstrumentationDisabled(SimpleTestCase):
+    @responses.activate
+    def test_no_sinks(self):
+        responses.add(
+            responses.GET, 'https://id.scene.org/api/3.0/me/',
+            body=json.dumps({'success': True, 'user': {'id': 1234}}),
+        )
+        with patch('sceneid.instrumentation.emit') as emit:
+            SceneIDClient('testsite', 'supersecretclientsecret').get_user_data('5678')
+        emit.assert_not_called()
+
+    def test_signal(self):
+        received = []
+
+        def handler(sender, phase, duration, data, **kwargs):
+            received.append((phase, data))
+
+        instrumentation.phase_timed.connect(handler)
+        try:
+            with instrumentation.measure('user_lookup', found=False):
+                pass
+        finally:
+            instrumentation.phase_timed.disconnect(handler)
+
+        self.assertEqual(received, [('user_lookup', {'found': False})])
@@ -0,0 +1,89 @@
+import datetime
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import responses
+
+from sceneid import last_login
+from sceneid.models import SceneID
+from tests.test_views import TestViews
+
+
+class TestLastLogin(TestCase):
+    def setUp(self):
+        last_login._pending.clear()
+        self.addCleanup(last_login._pending.clear)
+        self.addCleanup(setattr, last_login, '_last_flush', last_login._last_flush)
+        self.testuser = User.objects.create_user(username='testuser')
+        self.testuser.sceneids.create(sceneid=1234)
+        self.testuser.sceneids.create(sceneid=5678)
+
+    def test_disabled_by_default(self):
+        self.assertFalse(last_login.record(1234))
+        self.assertEqual(last_login._pending, {})
+
+    @override_settings(SCENEID_LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_flush_is_due_after_interval(self):
+        with patch('sceneid.last_login.time.monotonic', return_value=last_login._last_flush):
+            self.assertFalse(last_login.record(1234))
+        with patch('sceneid.last_login.time.monotonic', return_value=last_login._last_flush + 61):
+            self.assertTrue(last_login.record(5678))
+            self.assertFalse(last_login.record(5678))
+        self.assertEqual(set(last_login._pending), {1234, 5678})
+
+    @override_settings(SCENEID_LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_flush(self):
+        last_login.record(1234)
+        last_login.record(5678)
+        last_login.record(9999)  # not linked
+        with self.assertNumQueries(1):
+            self.assertEqual(last_login.flush(), 2)
+        self.assertEqual(last_login._pending, {})
+        for link in SceneID.objects.all():
+            self.assertIsNotNone(link.last_login_at)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(last_login.flush(), 0)
+
+    @override_settings(SCENEID_LAST_LOGIN_FLUSH_INTERVAL=60, SCENEID_LAST_LOGIN_GRANULARITY=3600)
+    def test_granularity(self):
+        recent = timezone.now() - datetime.timedelta(minutes=10)
+        old = timezone.now() - datetime.timedelta(hours=2)
+        SceneID.objects.filter(sceneid=1234).update(last_login_at=recent)
+        SceneID.objects.filter(sceneid=5678).update(last_login_at=old)
+
+        last_login.record(1234)
+        last_login.record(5678)
+        self.assertEqual(last_login.flush(), 1)
+        self.assertEqual(SceneID.objects.get(sceneid=1234).last_login_at, recent)
+        self.assertGreater(SceneID.objects.get(sceneid=5678).last_login_at, old)
+
+    @override_settings(SCENEID_LAST_LOGIN_FLUSH_INTERVAL=60, SCENEID_LAST_LOGIN_GRANULARITY=3600)
+    def test_granularity_is_per_row(self):
+        now = timezone.now()
+        SceneID.objects.filter(sceneid=5678).update(
+            last_login_at=now - datetime.timedelta(minutes=90)
+        )
+        last_login._pending[1234] = now - datetime.timedelta(hours=2)
+        last_login._pending[5678] = now
+
+        # 5678's stored time is more than the granularity older than its own login, though
+        # not than the earlier login of 1234
+        self.assertEqual(last_login.flush(), 2)
+        self.assertEqual(
+            SceneID.objects.get(sceneid=1234).last_login_at, now - datetime.timedelta(hours=2)
+        )
+        self.assertEqual(SceneID.objects.get(sceneid=5678).last_login_at, now)
+
+    @responses.activate
+    @override_settings(SCENEID_LAST_LOGIN_FLUSH_INTERVAL=0)
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login(self):
+        TestViews.set_up_responses(self)
+        self.client.get('/account/sceneid/auth/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+        self.assertIsNotNone(SceneID.objects.get(sceneid=1234).last_login_at)
+        self.assertIsNone(SceneID.objects.get(sceneid=5678).last_login_at)
@@ -0,0 +1,127 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.contrib.sessions.backends.db import SessionStore
+
+from sceneid.checks import check_pending_connection_cache
+from sceneid.pending import (
+    SESSION_KEY, CachePendingConnectionStore, SessionPendingConnectionStore
+)
+
+
+USER_DATA = {
+    'id': 1234,
+    'first_name': 'Matt', 'last_name': 'Westcott',
+    'display_name': 'gasman in a trenchcoat',
+    'email': 'matt@example.com', 'avatar': 'https://example.com/avatar.png',
+}
+
+
+class TestCachePendingConnectionStore(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/')
+        self.request.session = SessionStore()
+        self.store = CachePendingConnectionStore()
+
+    def test_save_and_load(self):
+        self.store.save(self.request, USER_DATA)
+        # only an opaque handle is kept in the session
+        self.assertIsInstance(self.request.session[SESSION_KEY], str)
+        self.assertEqual(self.store.load(self.request), {
+            'id': 1234,
+            'first_name': 'Matt', 'last_name': 'Westcott',
+            'display_name': 'gasman in a trenchcoat',
+        })
+
+    def test_clear(self):
+        self.store.save(self.request, USER_DATA)
+        handle = self.request.session[SESSION_KEY]
+        self.store.clear(self.request)
+        self.assertNotIn(SESSION_KEY, self.request.session)
+        self.assertIsNone(cache.get(self.store.get_cache_key(handle)))
+        self.assertIsNone(self.store.load(self.request))
+
+    def test_expired(self):
+        self.store.save(self.request, USER_DATA)
+        cache.clear()
+        self.assertIsNone(self.store.load(self.request))
+
+    @override_settings(SCENEID_PENDING_CONNECTION_FIELDS=('id', 'email'))
+    def test_custom_fields(self):
+        self.store.save(self.request, USER_DATA)
+        self.assertEqual(self.store.load(self.request), {'id': 1234, 'email': 'matt@example.com'})
+
+    async def test_async_methods(self):
+        await self.store.asave(self.request, USER_DATA)
+        user_data = await self.store.aload(self.request)
+        self.assertEqual(user_data['id'], 1234)
+        await self.store.aclear(self.request)
+        self.assertIsNone(await self.store.aload(self.request))
+
+
+class TestSessionPendingConnectionStore(TestCase):
+    def test_save_and_load(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        store = SessionPendingConnectionStore()
+        store.save(request, USER_DATA)
+        self.assertEqual(request.session[SESSION_KEY]['display_name'], 'gasman in a trenchcoat')
+        self.assertNotIn('email', request.session[SESSION_KEY])
+        self.assertEqual(store.load(request)['id'], 1234)
+        store.clear(request)
+        self.assertIsNone(store.load(request))
+
+
+class TestConnectWithPendingStore(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def start_connection(self):
+        session = self.client.session
+        request = RequestFactory().get('/')
+        request.session = session
+        CachePendingConnectionStore().save(request, USER_DATA)
+        session.save()
+
+    def test_connect_view(self):
+        self.start_connection()
+        response = self.client.get('/account/sceneid/connect/')
+        self.assertContains(response, 'value="gasmaninatrenchcoat"')
+
+    def test_connect_after_expiry(self):
+        self.start_connection()
+        cache.clear()
+        response = self.client.get('/account/sceneid/connect/')
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+
+    @override_settings(
+        SCENEID_PENDING_CONNECTION_STORE='sceneid.pending.SessionPendingConnectionStore'
+    )
+    def test_connect_new_with_session_store(self):
+        session = self.client.session
+        session[SESSION_KEY] = {'id': 1234, 'display_name': 'gasman'}
+        session.save()
+        response = self.client.post('/account/sceneid/connect/new/', {'username': 'gasman'})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertTrue(User.objects.get(username='gasman').sceneids.filter(sceneid=1234).exists())
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+
+class TestPendingConnectionCacheCheck(SimpleTestCase):
+    def test_local_memory_cache(self):
+        warnings = check_pending_connection_cache(None)
+        self.assertEqual([warning.id for warning in warnings], ['sceneid.W001'])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'x'},
+    }, SCENEID_CACHE='shared')
+    def test_shared_cache(self):
+        self.assertEqual(check_pending_connection_cache(None), [])
+
+    @override_settings(
+        SCENEID_PENDING_CONNECTION_STORE='sceneid.pending.SessionPendingConnectionStore'
+    )
+    def test_session_store(self):
+        self.assertEqual(check_pending_connection_cache(None), [])
@@ -0,0 +1,79 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+import responses
+
+from tests.test_views import TestViews
+
+
+# Maximum number of database queries made by each view. The session is kept in a signed
+# cookie so that only the queries made by django-sceneid itself are counted; savepoints
+# around inserts count as queries on SQLite. Raising one of these numbers needs a good reason.
+AUTH_REDIRECT_QUERIES = 0
+# user lookup, last_login update
+LOGIN_EXISTING_USER_QUERIES = 2
+# user lookup
+LOGIN_NEW_USER_QUERIES = 1
+# username suggestion
+CONNECT_QUERIES = 1
+# authentication, savepoint / SceneID insert / release, last_login update
+CONNECT_OLD_QUERIES = 5
+# username uniqueness check, savepoint / user insert / SceneID insert / release,
+# last_login update
+CONNECT_NEW_QUERIES = 6
+# username lookup
+CHECK_USERNAME_QUERIES = 1
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+@patch('sceneid.views.get_random_string', lambda length: '66666666')
+class TestQueryBudgets(TestCase):
+    set_up_responses = TestViews.set_up_responses
+
+    def setUp(self):
+        cache.clear()
+        self.testuser = User.objects.create_user(username='testuser', password='12345')
+
+    def start_login(self):
+        with self.assertNumQueries(AUTH_REDIRECT_QUERIES):
+            self.client.get('/account/sceneid/auth/?next=/landing/')
+
+    def complete_login(self):
+        return self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+    @responses.activate
+    def test_login_existing_user(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        self.set_up_responses()
+        self.start_login()
+        with self.assertNumQueries(LOGIN_EXISTING_USER_QUERIES):
+            response = self.complete_login()
+        self.assertRedirects(response, '/landing/')
+
+    @responses.activate
+    def test_connect_existing_user(self):
+        self.set_up_responses()
+        self.start_login()
+        with self.assertNumQueries(LOGIN_NEW_USER_QUERIES):
+            self.complete_login()
+        with self.assertNumQueries(CONNECT_QUERIES):
+            self.client.get('/account/sceneid/connect/')
+        with self.assertNumQueries(CHECK_USERNAME_QUERIES):
+            self.client.get('/account/sceneid/connect/username/', {'username': 'testuser'})
+
+        with self.assertNumQueries(CONNECT_OLD_QUERIES):
+            response = self.client.post('/account/sceneid/connect/old/', {
+                'username': 'testuser', 'password': '12345',
+            })
+        self.assertRedirects(response, '/landing/')
+
+    @responses.activate
+    def test_connect_new_user(self):
+        self.set_up_responses()
+        self.start_login()
+        self.complete_login()
+        with self.assertNumQueries(CONNECT_NEW_QUERIES):
+            response = self.client.post('/account/sceneid/connect/new/', {'username': 'newuser'})
+        self.assertRedirects(response, '/landing/')
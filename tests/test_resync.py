@@ -0,0 +1,139 @@
+import datetime
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+import responses
+
+from sceneid.backends import SceneIDBackend
+from sceneid.models import SceneID
+from sceneid.resync import (
+    RateLimiter, ServerCredentialFetcher, resync_profiles, update_user_profile
+)
+
+
+class TestResyncProfiles(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', first_name='Alice', last_name='A')
+        self.bob = User.objects.create_user(username='bob', first_name='Bob', last_name='B')
+        self.carol = User.objects.create_user(username='carol', first_name='Carol')
+        SceneID.objects.create(sceneid=1, user=self.alice)
+        SceneID.objects.create(sceneid=2, user=self.bob)
+        SceneID.objects.create(
+            sceneid=3, user=self.carol,
+            profile_synced_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        self.profiles = {
+            1: {'id': 1, 'first_name': 'Alice', 'last_name': 'Aardvark'},
+            2: {'id': 2, 'first_name': 'Bob', 'last_name': 'B'},
+            3: {'id': 3, 'first_name': 'Caroline', 'last_name': ''},
+        }
+
+    def fetch(self, link):
+        return self.profiles.get(link.sceneid)
+
+    def test_resync(self):
+        stats = resync_profiles(fetch=self.fetch, rate=0)
+        self.assertEqual(stats, {'checked': 2, 'updated': 1, 'failed': 0})
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.last_name, 'Aardvark')
+        # recently synced users are skipped
+        self.carol.refresh_from_db()
+        self.assertEqual(self.carol.first_name, 'Carol')
+        self.assertFalse(SceneID.objects.filter(profile_synced_at__isnull=True).exists())
+
+        # a second run has nothing to do
+        stats = resync_profiles(fetch=self.fetch, rate=0)
+        self.assertEqual(stats['checked'], 0)
+
+    def test_resync_all(self):
+        stats = resync_profiles(fetch=self.fetch, older_than=datetime.timedelta(0), rate=0)
+        self.assertEqual(stats, {'checked': 3, 'updated': 2, 'failed': 0})
+        self.carol.refresh_from_db()
+        self.assertEqual(self.carol.first_name, 'Caroline')
+
+    @override_settings(SCENEID_AUTH_USER_CACHE_TIMEOUT=60)
+    def test_cached_users_are_invalidated(self):
+        backend = SceneIDBackend()
+        backend.get_user(self.alice.pk)
+        resync_profiles(fetch=self.fetch, rate=0)
+        self.assertEqual(backend.get_user(self.alice.pk).last_name, 'Aardvark')
+
+    def test_failed_fetch_is_retried_next_time(self):
+        del self.profiles[2]
+        stats = resync_profiles(fetch=self.fetch, rate=0, batch_size=1)
+        self.assertEqual(stats, {'checked': 2, 'updated': 1, 'failed': 1})
+        self.assertIsNone(SceneID.objects.get(sceneid=2).profile_synced_at)
+
+    def test_limit(self):
+        stats = resync_profiles(fetch=self.fetch, rate=0, limit=1)
+        self.assertEqual(stats['checked'], 1)
+        self.assertIsNone(SceneID.objects.get(sceneid=2).profile_synced_at)
+
+    @responses.activate
+    def test_command_with_server_credentials(self):
+        responses.add(
+            responses.POST, 'https://id.scene.org/oauth/token/',
+            json={'access_token': 'servertoken', 'expires_in': 3600, 'token_type': 'Bearer'},
+        )
+        for sceneid, profile in self.profiles.items():
+            responses.add(
+                responses.GET, 'https://id.scene.org/api/3.0/user/?id=%d' % sceneid,
+                json={'success': True, 'user': profile},
+                match_querystring=True,
+            )
+        stdout = StringIO()
+        call_command('sceneid_resync_profiles', '--rate', '0', stdout=stdout)
+        self.assertIn("2 users checked, 1 updated, 0 failed", stdout.getvalue())
+        token_requests = [
+            call for call in responses.calls if call.request.url.endswith('/oauth/token/')
+        ]
+        self.assertEqual(len(token_requests), 1)
+        self.assertEqual(token_requests[0].request.body, 'grant_type=client_credentials')
+
+
+class TestServerCredentialFetcher(SimpleTestCase):
+    def test_token_is_renewed_before_expiry(self):
+        client = Mock()
+        client.get_client_credentials_token.side_effect = [
+            {'access_token': 'token1', 'expires_in': 3600},
+            {'access_token': 'token2', 'expires_in': 3600},
+        ]
+        client.get_user_data_by_id.return_value = {'success': True, 'user': {'id': 1}}
+        fetcher = ServerCredentialFetcher(client)
+        link = SceneID(sceneid=1)
+
+        with patch('sceneid.resync.time.monotonic', return_value=1000):
+            self.assertEqual(fetcher(link), {'id': 1})
+        with patch('sceneid.resync.time.monotonic', return_value=1000 + 3500):
+            fetcher(link)
+        client.get_user_data_by_id.assert_called_with('token1', 1)
+
+        # within a minute of expiry, a new token is fetched
+        with patch('sceneid.resync.time.monotonic', return_value=1000 + 3541):
+            fetcher(link)
+        client.get_user_data_by_id.assert_called_with('token2', 1)
+        self.assertEqual(client.get_client_credentials_token.call_count, 2)
+
+
+class TestUpdateUserProfile(SimpleTestCase):
+    def test_update_user_profile(self):
+        user = User(first_name='Matt', last_name='W')
+        changed = update_user_profile(user, {'first_name': 'Matt', 'last_name': 'Westcott'})
+        self.assertEqual(changed, ['last_name'])
+        self.assertEqual(user.last_name, 'Westcott')
+        self.assertEqual(update_user_profile(user, {'first_name': None}), ['first_name'])
+        self.assertEqual(user.first_name, '')
+
+
+class TestRateLimiter(SimpleTestCase):
+    def test_rate_limit(self):
+        limiter = RateLimiter(50)
+        start = timezone.now()
+        for _ in range(6):
+            limiter.wait()
+        self.assertGreaterEqual((timezone.now() - start).total_seconds(), 0.09)
@@ -0,0 +1,105 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+import responses
+
+from sceneid import routers, user_cache
+from sceneid.models import SceneID
+from tests.test_views import TestViews
+
+
+@override_settings(
+    SCENEID_READ_DATABASE='replica', DATABASE_ROUTERS=['sceneid.routers.SceneIDRouter']
+)
+class TestReadReplica(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.testuser = User.objects.create_user(username='testuser')
+        self.testuser.sceneids.create(sceneid=1234)
+        # replicate the user and link, and pretend the replica has caught up
+        self.testuser.save(using='replica')
+        SceneID.objects.using('replica').create(user_id=self.testuser.pk, sceneid=1234)
+        cache.clear()
+
+    def test_lookup_uses_replica(self):
+        with self.assertNumQueries(1, using='replica'), self.assertNumQueries(0):
+            user = user_cache.get_user_for_sceneid(1234)
+        self.assertEqual(user, self.testuser)
+        self.assertEqual(user._state.db, 'replica')
+
+    def test_recently_linked_sceneid_uses_primary(self):
+        User.objects.create_user(username='otheruser').sceneids.create(sceneid=5678)
+        with self.assertNumQueries(0, using='replica'), self.assertNumQueries(1):
+            user = user_cache.get_user_for_sceneid(5678)
+        self.assertEqual(user.username, 'otheruser')
+
+    def test_miss_falls_back_to_primary(self):
+        User.objects.create_user(username='otheruser').sceneids.create(sceneid=5678)
+        # the link has not reached the replica, and is no longer considered recent
+        cache.clear()
+        with self.assertNumQueries(1, using='replica'), self.assertNumQueries(1):
+            user = user_cache.get_user_for_sceneid(5678)
+        self.assertEqual(user.username, 'otheruser')
+        self.assertEqual(user._state.db, 'default')
+
+    def test_unknown_sceneid(self):
+        with self.assertNumQueries(1, using='replica'), self.assertNumQueries(1):
+            self.assertIsNone(user_cache.get_user_for_sceneid(5678))
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        with patch(
+            'django.db.models.query.QuerySet.get',
+            side_effect=[OperationalError, self.testuser]
+        ):
+            self.assertEqual(user_cache.get_user_for_sceneid(1234), self.testuser)
+
+    @override_settings(SCENEID_USER_CACHE_TIMEOUT=60)
+    def test_lookup_by_cached_user_id_uses_replica(self):
+        user_cache.get_user_for_sceneid(1234)
+        with self.assertNumQueries(1, using='replica'), self.assertNumQueries(0):
+            user = user_cache.get_user_for_sceneid(1234)
+        self.assertEqual(user, self.testuser)
+
+    def test_writes_go_to_primary(self):
+        user = user_cache.get_user_for_sceneid(1234)
+        user.first_name = 'Test'
+        with self.assertNumQueries(0, using='replica'), self.assertNumQueries(1):
+            user.save(update_fields=['first_name'])
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, 'Test')
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_login(self):
+        TestViews.set_up_responses(self)
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        with self.assertNumQueries(1, using='replica'):
+            response = self.client.get(
+                '/account/sceneid/login/?state=66666666&code=4321432143214321'
+            )
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client), self.testuser)
+        self.assertIsNotNone(User.objects.get(pk=self.testuser.pk).last_login)
+
+    def test_no_replica(self):
+        with self.settings(SCENEID_READ_DATABASE=None):
+            self.assertIsNone(routers.get_read_database())
+            with self.assertNumQueries(0, using='replica'):
+                self.assertEqual(user_cache.get_user_for_sceneid(1234), self.testuser)
+
+    def test_checks(self):
+        self.assertFalse([
+            error for error in run_checks() if error.id.startswith('sceneid.E')
+        ])
+        with self.settings(DATABASE_ROUTERS=[], SCENEID_READ_DATABASE='elsewhere'):
+            errors = run_checks()
+        self.assertEqual(
+            sorted(error.id for error in errors if error.id.startswith('sceneid.E')),
+            ['sceneid.E001', 'sceneid.E002']
+        )
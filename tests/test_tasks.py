@@ -0,0 +1,177 @@
+import threading
+from unittest.mock import ANY, Mock, patch
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+import responses
+
+from sceneid import tasks
+from tests.test_views import TestViews
+
+
+class TestRunTasks(SimpleTestCase):
+    def test_batches_consecutive_calls(self):
+        calls = []
+
+        def task(value):
+            calls.append(('single', value))
+        task.run_batch = lambda batch: calls.append(('batch', batch))
+
+        def other(value):
+            calls.append(('other', value))
+
+        tasks.run_tasks([(task, (1,)), (task, (2,)), (other, (3,)), (task, (4,))])
+        self.assertEqual(calls, [('batch', [(1,), (2,)]), ('other', 3), ('single', 4)])
+
+    def test_failure_is_logged(self):
+        def broken():
+            raise ValueError("oops")
+        other = Mock()
+
+        with self.assertLogs('sceneid', 'ERROR') as logs:
+            tasks.run_tasks([(broken, ()), (other, (1,))])
+        self.assertIn("SceneID task broken failed", logs.output[0])
+        other.assert_called_once_with(1)
+
+
+class TestThreadPoolBackend(SimpleTestCase):
+    def test_runs_in_background_and_drains_on_shutdown(self):
+        backend = tasks.ThreadPoolBackend(max_workers=2)
+        release = threading.Event()
+        thread_names = []
+
+        def task(value):
+            release.wait(5)
+            thread_names.append((value, threading.current_thread().name))
+
+        for i in range(5):
+            backend.enqueue(task, (i,))
+        # nothing has run in the calling thread
+        self.assertEqual(thread_names, [])
+
+        release.set()
+        backend.shutdown(timeout=5)
+        self.assertEqual(sorted(value for value, _ in thread_names), [0, 1, 2, 3, 4])
+        for _, name in thread_names:
+            self.assertTrue(name.startswith('sceneid-tasks-'))
+        self.assertEqual(backend.threads, [])
+
+    def test_full_queue_runs_in_caller(self):
+        backend = tasks.ThreadPoolBackend(max_workers=1, max_queue=1)
+        release = threading.Event()
+        started = threading.Event()
+        thread_names = []
+
+        def blocking_task():
+            started.set()
+            release.wait(5)
+
+        def task():
+            thread_names.append(threading.current_thread().name)
+
+        backend.enqueue(blocking_task, ())
+        started.wait(5)
+        backend.enqueue(task, ())  # queued
+        with self.assertLogs('sceneid', 'WARNING'):
+            backend.enqueue(task, ())  # queue full
+
+        self.assertEqual(thread_names, [threading.current_thread().name])
+        release.set()
+        backend.shutdown(timeout=5)
+        self.assertEqual(len(thread_names), 2)
+
+
+class TestPostLogin(TestCase):
+    def setUp(self):
+        self.testuser = User.objects.create_user(username='testuser', first_name='Matthew')
+        self.link = self.testuser.sceneids.create(sceneid=1234)
+        self.receiver = Mock()
+        tasks.post_login.connect(self.receiver)
+        self.addCleanup(tasks.post_login.disconnect, self.receiver)
+
+    def log_in(self):
+        TestViews.set_up_responses(self)
+        with patch('sceneid.views.get_random_string', lambda length: '66666666'):
+            self.client.get('/account/sceneid/auth/')
+            # the work is queued when the request's transaction is committed
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.get(
+                    '/account/sceneid/login/?state=66666666&code=4321432143214321'
+                )
+
+    @responses.activate
+    def test_signal(self):
+        self.log_in()
+        self.receiver.assert_called_once()
+        kwargs = self.receiver.call_args.kwargs
+        self.assertEqual(kwargs['user'], self.testuser)
+        self.assertEqual(kwargs['sceneid'], 1234)
+        self.assertEqual(kwargs['user_data']['display_name'], 'gasman in a trenchcoat')
+        # not refreshed unless enabled
+        self.testuser.refresh_from_db()
+        self.assertEqual(self.testuser.first_name, 'Matthew')
+
+    @responses.activate
+    @override_settings(SCENEID_REFRESH_PROFILE_ON_LOGIN=True)
+    def test_refresh_profile(self):
+        self.log_in()
+        self.testuser.refresh_from_db()
+        self.assertEqual(self.testuser.first_name, 'Matt')
+        self.assertEqual(self.testuser.last_name, 'Westcott')
+        self.link.refresh_from_db()
+        self.assertIsNotNone(self.link.profile_synced_at)
+
+    @override_settings(SCENEID_REFRESH_PROFILE_ON_LOGIN=True)
+    def test_batch(self):
+        otheruser = User.objects.create_user(username='otheruser')
+        otheruser.sceneids.create(sceneid=5678)
+        with self.assertNumQueries(4):
+            # fetch users, update each changed field set, mark links as synced
+            tasks.run_tasks([
+                (tasks.process_logins, (self.testuser.pk, 1234, {'first_name': 'Matt'})),
+                (tasks.process_logins, (otheruser.pk, 5678, {'last_name': 'Other'})),
+            ])
+        self.assertEqual(User.objects.get(pk=self.testuser.pk).first_name, 'Matt')
+        self.assertEqual(User.objects.get(pk=otheruser.pk).last_name, 'Other')
+        self.assertEqual(self.receiver.call_count, 2)
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_connect_new(self):
+        self.testuser.sceneids.all().delete()
+        TestViews.set_up_responses(self)
+        self.client.get('/account/sceneid/auth/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+        self.receiver.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/account/sceneid/connect/new/', {'username': 'testuser2'})
+        self.receiver.assert_called_once()
+        self.assertEqual(self.receiver.call_args.kwargs['user'].username, 'testuser2')
+        self.assertEqual(self.receiver.call_args.kwargs['sceneid'], 1234)
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string', lambda length: '66666666')
+    def test_connect_new_with_atomic_requests(self):
+        self.testuser.sceneids.all().delete()
+        TestViews.set_up_responses(self)
+        self.client.get('/account/sceneid/auth/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        with patch.dict(connection.settings_dict, {'ATOMIC_REQUESTS': True}), \
+                patch('sceneid.tasks.defer') as defer:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post('/account/sceneid/connect/new/', {'username': 'testuser2'})
+            # not queued while the request's transaction, which created the user, is open
+            defer.assert_not_called()
+            for callback in callbacks:
+                callback()
+        user = User.objects.get(username='testuser2')
+        defer.assert_called_once_with(tasks.process_logins, user.pk, 1234, ANY)
+
+    def test_nothing_scheduled_without_receivers(self):
+        tasks.post_login.disconnect(self.receiver)
+        with patch('sceneid.tasks.defer') as defer:
+            tasks.schedule_post_login(self.testuser, 1234, {})
+        defer.assert_not_called()
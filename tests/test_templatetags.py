@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from sceneid.templatetags import sceneid_tags
+
+
+class TestTemplateTags(SimpleTestCase):
+    def setUp(self):
+        sceneid_tags._render_default_button.cache_clear()
+
+    def render(self, source, path='/some/page/', **context):
+        template = Template('{% load sceneid_tags %}' + source)
+        return template.render(Context({'request': RequestFactory().get(path), **context}))
+
+    def test_auth_url(self):
+        self.assertEqual(
+            self.render('{% sceneid_auth_url %}'), '/account/sceneid/auth/?next=%2Fsome%2Fpage%2F'
+        )
+        self.assertEqual(
+            self.render('{% sceneid_auth_url "/landing/" %}'),
+            '/account/sceneid/auth/?next=%2Flanding%2F'
+        )
+
+    def test_login_buttons_match_templates(self):
+        for size in ('small', 'large'):
+            with self.subTest(size=size):
+                template_name = 'sceneid/tags/login_button_%s.html' % size
+                expected = get_template(template_name).render({
+                    'auth_url': '/account/sceneid/auth/?next=%2Fsome%2Fpage%2F',
+                })
+                self.assertEqual(
+                    self.render('{%% sceneid_login_button_%s %%}' % size), expected
+                )
+
+    def test_login_button_is_cached(self):
+        self.render('{% sceneid_login_button_small %}')
+        self.render('{% sceneid_login_button_small %}')
+        self.render('{% sceneid_login_button_small %}', path='/other/page/')
+        info = sceneid_tags._render_default_button.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+    def test_overridden_template(self):
+        with tempfile.TemporaryDirectory() as template_dir:
+            os.makedirs(os.path.join(template_dir, 'sceneid', 'tags'))
+            path = os.path.join(template_dir, 'sceneid', 'tags', 'login_button_small.html')
+            with open(path, 'w') as f:
+                f.write(
+                    '<a class="custom" href="{{ auth_url }}">SceneID</a>'
+                    '{% if csrf_token %} {{ csrf_token }}{% endif %}'
+                )
+
+            templates = [{
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'DIRS': [template_dir],
+                'APP_DIRS': True,
+            }]
+            with override_settings(TEMPLATES=templates):
+                self.assertEqual(
+                    self.render('{% sceneid_login_button_small "/a&b/" %}'),
+                    '<a class="custom" href="/account/sceneid/auth/?next=%2Fa%26b%2F">SceneID</a>'
+                )
+                # rendered per call with the tag's context, not cached
+                for token in ('token1', 'token2'):
+                    self.assertEqual(
+                        self.render('{% sceneid_login_button_small "/" %}', csrf_token=token),
+                        '<a class="custom" href="/account/sceneid/auth/?next=%2F">SceneID</a> '
+                        + token
+                    )
+
+    def test_settings_change_clears_cache(self):
+        self.render('{% sceneid_login_button_small %}')
+        with override_settings(STATIC_URL='/assets/'):
+            self.assertIn('src="/assets/', self.render('{% sceneid_login_button_small %}'))
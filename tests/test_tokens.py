@@ -0,0 +1,174 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import responses
+
+from sceneid import tokens
+from sceneid.models import SceneIDToken
+from tests.test_views import TestViews
+
+
+@override_settings(SCENEID_STORE_TOKENS=True)
+@patch('sceneid.views.get_random_string', lambda length: '66666666')
+class TestTokens(TestCase):
+    set_up_responses = TestViews.set_up_responses
+
+    def setUp(self):
+        self.testuser = User.objects.create_user(username='testuser', password='12345')
+
+    def log_in(self):
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        return self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+    def end_session(self):
+        # as when the session expires or the browser is restarted; the remember cookie stays
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+
+    def add_refresh_response(self, status=200, body=None):
+        responses.add(
+            responses.POST, 'https://id.scene.org/oauth/token/',
+            status=status,
+            json=body or {
+                'access_token': 'newaccesstoken', 'expires_in': 3600, 'token_type': 'Bearer',
+                'refresh_token': 'newrefreshtoken',
+            },
+            match=[responses.matchers.urlencoded_params_matcher({
+                'grant_type': 'refresh_token', 'refresh_token': '8765876587658765',
+            })],
+        )
+
+    @responses.activate
+    def test_token_stored_on_login(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        response = self.log_in()
+        self.assertRedirects(response, '/landing/')
+        self.assertIn('sceneid_remember', response.cookies)
+        self.assertTrue(response.cookies['sceneid_remember']['httponly'])
+
+        token = SceneIDToken.objects.get(sceneid_id=1234)
+        self.assertEqual(token.access_token, '5678567856785678')
+        self.assertEqual(token.refresh_token, '8765876587658765')
+        self.assertGreater(token.expires_at, timezone.now() + datetime.timedelta(days=29))
+
+    @responses.activate
+    def test_token_stored_on_connect(self):
+        self.log_in()
+        response = self.client.post('/account/sceneid/connect/new/', {'username': 'testuser2'})
+        self.assertRedirects(response, '/landing/')
+        self.assertIn('sceneid_remember', response.cookies)
+        token = SceneIDToken.objects.get(sceneid_id=1234)
+        self.assertEqual(token.sceneid.user.username, 'testuser2')
+
+    @responses.activate
+    def test_silent_login(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        self.log_in()
+        self.end_session()
+
+        responses.reset()
+        self.add_refresh_response()
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        # logged straight in, without a redirect to the provider
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client), self.testuser)
+        token = SceneIDToken.objects.get(sceneid_id=1234)
+        self.assertEqual(token.access_token, 'newaccesstoken')
+        self.assertEqual(token.refresh_token, 'newrefreshtoken')
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_silent_login_with_revoked_token(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        self.log_in()
+        self.end_session()
+
+        responses.reset()
+        self.add_refresh_response(status=400, body={'error': 'invalid_grant'})
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertTrue(response['Location'].startswith('https://id.scene.org/oauth/authorize/'))
+        self.assertFalse(get_user(self.client).is_authenticated)
+        self.assertFalse(SceneIDToken.objects.exists())
+
+    @responses.activate
+    def test_silent_login_with_expired_token(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        self.log_in()
+        self.end_session()
+        SceneIDToken.objects.update(expires_at=timezone.now())
+
+        responses.reset()
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertTrue(response['Location'].startswith('https://id.scene.org/oauth/authorize/'))
+        self.assertEqual(len(responses.calls), 0)
+
+    @responses.activate
+    def test_logout_revokes_silent_login(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        self.log_in()
+        remember_cookie = self.client.cookies['sceneid_remember'].value
+        self.client.logout()
+        self.assertFalse(SceneIDToken.objects.exists())
+
+        # the cookie is still in the browser, but no longer logs anyone in
+        self.client.cookies['sceneid_remember'] = remember_cookie
+        responses.reset()
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertTrue(response['Location'].startswith('https://id.scene.org/oauth/authorize/'))
+        self.assertFalse(get_user(self.client).is_authenticated)
+        self.assertEqual(len(responses.calls), 0)
+
+    @responses.activate
+    def test_cookie_from_earlier_login_is_ignored(self):
+        self.testuser.sceneids.create(sceneid=1234)
+        self.log_in()
+        old_cookie = self.client.cookies['sceneid_remember'].value
+        # a login in another browser replaces the secret
+        SceneIDToken.objects.update(secret='somethingelse')
+        self.end_session()
+        self.client.cookies['sceneid_remember'] = old_cookie
+
+        responses.reset()
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertTrue(response['Location'].startswith('https://id.scene.org/oauth/authorize/'))
+        self.assertEqual(len(responses.calls), 0)
+
+    def test_cookie_without_secret_is_ignored(self):
+        link = self.testuser.sceneids.create(sceneid=1234)
+        now = timezone.now()
+        SceneIDToken.objects.create(
+            sceneid=link, access_token='a', refresh_token='r',
+            access_token_expires_at=now, expires_at=now + datetime.timedelta(days=1),
+        )
+        response = HttpResponse()
+        response.set_signed_cookie('sceneid_remember', '1234', salt=tokens.COOKIE_SALT)
+        self.client.cookies['sceneid_remember'] = response.cookies['sceneid_remember'].value
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertTrue(response['Location'].startswith('https://id.scene.org/oauth/authorize/'))
+
+    def test_forged_cookie_is_ignored(self):
+        self.client.cookies['sceneid_remember'] = '1234'
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertTrue(response['Location'].startswith('https://id.scene.org/oauth/authorize/'))
+
+    def test_prune_tokens(self):
+        link = self.testuser.sceneids.create(sceneid=1234)
+        other_link = User.objects.create_user(username='other').sceneids.create(sceneid=5678)
+        now = timezone.now()
+        for sceneid, expires_at in ((link, now), (other_link, now + datetime.timedelta(days=1))):
+            SceneIDToken.objects.create(
+                sceneid=sceneid, access_token='a', refresh_token='r',
+                access_token_expires_at=now, expires_at=expires_at,
+            )
+        stdout = StringIO()
+        call_command('sceneid_prune_tokens', stdout=stdout)
+        self.assertIn("1 expired tokens deleted", stdout.getvalue())
+        self.assertEqual(list(SceneIDToken.objects.values_list('pk', flat=True)), [5678])
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from sceneid.user_cache import aget_user_for_sceneid, get_cache_key, get_user_for_sceneid
+
+
+@override_settings(SCENEID_USER_CACHE_TIMEOUT=300)
+class TestUserCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.sceneid = self.user.sceneids.create(sceneid=1234)
+
+    def test_cached_lookup_uses_primary_key(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_for_sceneid(1234), self.user)
+        self.assertEqual(cache.get(get_cache_key(1234)), self.user.pk)
+
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(get_user_for_sceneid(1234), self.user)
+        self.assertNotIn('sceneid_sceneid', queries.captured_queries[0]['sql'])
+
+    def test_unlinked_sceneid_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_user_for_sceneid(5678))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_user_for_sceneid(5678))
+
+        # creating a link invalidates the cached miss
+        other_user = User.objects.create_user(username='otheruser')
+        other_user.sceneids.create(sceneid=5678)
+        self.assertEqual(get_user_for_sceneid(5678), other_user)
+
+    def test_deleting_link_invalidates_cache(self):
+        get_user_for_sceneid(1234)
+        self.sceneid.delete()
+        self.assertIsNone(get_user_for_sceneid(1234))
+
+    def test_changing_sceneid_number_invalidates_cache(self):
+        get_user_for_sceneid(1234)
+        self.sceneid.sceneid = 4321
+        self.sceneid.save()
+        self.assertIsNone(get_user_for_sceneid(1234))
+        self.assertEqual(get_user_for_sceneid(4321), self.user)
+
+    def test_deactivating_user_invalidates_cache(self):
+        get_user_for_sceneid(1234)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(cache.get(get_cache_key(1234)))
+        self.assertFalse(get_user_for_sceneid(1234).is_active)
+
+    @override_settings(SCENEID_USER_CACHE_TIMEOUT=None)
+    def test_cache_disabled(self):
+        get_user_for_sceneid(1234)
+        self.assertIsNone(cache.get(get_cache_key(1234)))
+
+    async def test_async_lookup(self):
+        self.assertEqual(await aget_user_for_sceneid(1234), self.user)
+        self.assertEqual(await cache.aget(get_cache_key(1234)), self.user.pk)
+        self.assertEqual(await aget_user_for_sceneid(1234), self.user)
+        self.assertIsNone(await aget_user_for_sceneid(5678))
@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+import responses
+
+from tests.test_views import TestViews
+
+
+@patch('sceneid.views.get_random_string', lambda length: '66666666')
+class TestUsernameAvailability(TestCase):
+    set_up_responses = TestViews.set_up_responses
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='gasman')
+
+    @responses.activate
+    def start_connection(self):
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+    def check(self, username):
+        return self.client.get('/account/sceneid/connect/username/', {'username': username})
+
+    def test_available(self):
+        self.start_connection()
+        response = self.check('gasman2')
+        self.assertEqual(response.json(), {'username': 'gasman2', 'available': True, 'errors': []})
+
+    def test_taken(self):
+        self.start_connection()
+        response = self.check('gasman')
+        self.assertEqual(response.json(), {
+            'username': 'gasman', 'available': False,
+            'errors': ["A user with that username already exists."],
+        })
+
+    def test_agrees_with_form_on_case(self):
+        User.objects.create_user(username='Gasman2')
+        self.start_connection()
+        # the registration form accepts a name differing only in case, so the check does too
+        self.assertTrue(self.check('gasman2').json()['available'])
+        self.assertFalse(self.check('Gasman2').json()['available'])
+
+        response = self.client.post('/account/sceneid/connect/new/', {'username': 'gasman2'})
+        self.assertRedirects(response, '/landing/')
+        self.assertTrue(User.objects.filter(username='gasman2').exists())
+
+    def test_invalid(self):
+        self.start_connection()
+        # only the session is queried
+        with self.assertNumQueries(1):
+            response = self.check('gas man')
+        self.assertFalse(response.json()['available'])
+        self.assertEqual(len(response.json()['errors']), 1)
+
+    def test_result_is_cached(self):
+        self.start_connection()
+        self.check('gasman2')
+        with self.assertNumQueries(1):
+            response = self.check('gasman2')
+        self.assertTrue(response.json()['available'])
+
+    @override_settings(SCENEID_USERNAME_CHECK_RATE_LIMIT=2)
+    def test_rate_limit(self):
+        self.start_connection()
+        self.assertEqual(self.check('a').status_code, 200)
+        self.assertEqual(self.check('b').status_code, 200)
+        response = self.check('c')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(SCENEID_USERNAME_CHECK_RATE_LIMIT=2)
+    def test_rate_limit_is_per_session(self):
+        self.start_connection()
+        self.check('a')
+        self.check('b')
+        self.assertEqual(self.check('c').status_code, 429)
+
+        # another user from the same address has their own allowance
+        self.client = Client()
+        self.start_connection()
+        self.assertEqual(self.check('c').status_code, 200)
+
+    def test_requires_pending_connection(self):
+        response = self.check('gasman2')
+        self.assertEqual(response.status_code, 403)
+
+    def test_connect_page_links_to_endpoint(self):
+        self.start_connection()
+        response = self.client.get('/account/sceneid/connect/')
+        self.assertContains(
+            response, 'data-username-check-url="/account/sceneid/connect/username/"'
+        )
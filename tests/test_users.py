@@ -0,0 +1,67 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.db.models import OuterRef
+from django.template import Context, Template
+from django.test import TestCase
+
+from sceneid.models import SceneID
+from sceneid.users import PerUserQueryWarning, annotate_has_sceneid, prefetch_sceneids
+
+
+class TestUserHelpers(TestCase):
+    def setUp(self):
+        self.linked = User.objects.create_user(username='linked')
+        self.linked.sceneids.create(sceneid=5678)
+        self.linked.sceneids.create(sceneid=1234)
+        self.unlinked = User.objects.create_user(username='unlinked')
+        self.template = Template(
+            '{% load sceneid_tags %}{% for user in users %}'
+            '{{ user.username }}:{{ user|has_sceneid|yesno }}:'
+            '{{ user|sceneid_numbers|join:"," }};{% endfor %}'
+        )
+
+    def test_sceneid_queryset(self):
+        self.assertEqual(SceneID.objects.for_users([self.unlinked]).count(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                SceneID.objects.for_users(User.objects.all()).numbers_by_user(),
+                {self.linked.pk: [1234, 5678]}
+            )
+        users = User.objects.annotate(
+            linked=SceneID.objects.filter(sceneid=1234).exists_for(OuterRef('pk'))
+        ).order_by('username')
+        self.assertEqual([user.linked for user in users], [True, False])
+
+    def test_annotate_has_sceneid(self):
+        with self.assertNumQueries(1):
+            users = list(annotate_has_sceneid(User.objects.order_by('username')))
+            output = Template(
+                '{% load sceneid_tags %}{% for user in users %}'
+                '{{ user.username }}:{{ user|has_sceneid|yesno }};{% endfor %}'
+            ).render(Context({'users': users}))
+        self.assertEqual(output, 'linked:yes;unlinked:no;')
+
+    def test_prefetch_sceneids_queryset(self):
+        with self.assertNumQueries(2):
+            users = list(prefetch_sceneids(User.objects.order_by('username')))
+            output = self.template.render(Context({'users': users}))
+        self.assertEqual(output, 'linked:yes:1234,5678;unlinked:no:;')
+
+    def test_prefetch_sceneids_list(self):
+        users = list(User.objects.order_by('username'))
+        with self.assertNumQueries(1):
+            self.assertIs(prefetch_sceneids(users), users)
+        with self.assertNumQueries(0):
+            output = self.template.render(Context({'users': users}))
+        self.assertEqual(output, 'linked:yes:1234,5678;unlinked:no:;')
+
+    def test_without_prefetch(self):
+        users = list(User.objects.order_by('username'))
+        # falls back on querying for each user, with a warning
+        with self.assertNumQueries(4), self.assertWarns(PerUserQueryWarning):
+            output = self.template.render(Context({'users': users}))
+        self.assertEqual(output, 'linked:yes:1234,5678;unlinked:no:;')
+
+    def test_anonymous_user(self):
+        with self.assertNumQueries(0):
+            output = self.template.render(Context({'users': [AnonymousUser()]}))
+        self.assertEqual(output, ':no:;')
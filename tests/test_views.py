@@ -1,13 +1,18 @@
 import base64
 import json
 from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth import get_user
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
-from django.test import TestCase
+from django.test import Client, TestCase, override_settings
 import responses
 
+from tests.forms import RegisterForm
+
 
 class TestViews(TestCase):
     def set_up_responses(self):
@@ -92,6 +97,21 @@ class TestViews(TestCase):
         logged_in_user = get_user(self.client)
         self.assertTrue(logged_in_user.is_authenticated)
         self.assertEqual(logged_in_user.username, 'testuser')
+        self.assertNotIn('sceneid_access_token', self.client.session)
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string')
+    @override_settings(SCENEID_STORE_ACCESS_TOKEN=True)
+    def test_store_access_token(self, get_random_string):
+        get_random_string.return_value = '66666666'
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        testuser.sceneids.create(sceneid=1234)
+
+        self.set_up_responses()
+
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+        self.assertEqual(self.client.session['sceneid_access_token'], '5678567856785678')
 
     @responses.activate
     @patch('sceneid.views.get_random_string')
@@ -222,3 +242,184 @@ class TestViews(TestCase):
         self.assertTrue(logged_in_user.is_authenticated)
         self.assertEqual(logged_in_user.username, 'testuser2')
         self.assertTrue(logged_in_user.sceneids.filter(sceneid=1234).exists())
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string')
+    def test_connect_view_reads_app_config(self, get_random_string):
+        get_random_string.return_value = '66666666'
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        # changes to the app config take effect without reloading the views
+        app_config = apps.get_app_config('sceneid')
+        with patch.object(app_config, 'connect_template_name', 'sceneid/unavailable.html'), \
+                patch.object(app_config, 'connect_register_form_class', 'tests.forms.RegisterForm'):
+            response = self.client.get('/account/sceneid/connect/')
+        self.assertTemplateUsed(response, 'sceneid/unavailable.html')
+        self.assertIsInstance(response.context['register_form'], RegisterForm)
+
+        response = self.client.get('/account/sceneid/connect/')
+        self.assertTemplateUsed(response, 'sceneid/connect.html')
+        self.assertNotIsInstance(response.context['register_form'], RegisterForm)
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string')
+    def test_connect_new_user_after_concurrent_link(self, get_random_string):
+        get_random_string.return_value = '66666666'
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        # the SceneID gets linked by another request (e.g. the same form in another tab)
+        # while this one is in progress
+        other_user = User.objects.create_user(username='othertab')
+        other_user.sceneids.create(sceneid=1234)
+
+        response = self.client.post('/account/sceneid/connect/new/', {'username': 'testuser2'})
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client), other_user)
+        # the user created by this request is rolled back
+        self.assertFalse(User.objects.filter(username='testuser2').exists())
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string')
+    def test_connect_old_user_after_concurrent_link(self, get_random_string):
+        get_random_string.return_value = '66666666'
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        testuser.sceneids.create(sceneid=1234)
+
+        response = self.client.post('/account/sceneid/connect/old/', {
+            'username': 'testuser', 'password': '12345',
+        })
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client), testuser)
+        self.assertEqual(testuser.sceneids.count(), 1)
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string')
+    def test_connect_old_user_after_concurrent_link_to_other_account(self, get_random_string):
+        get_random_string.return_value = '66666666'
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        other_user = User.objects.create_user(username='othertab')
+        other_user.sceneids.create(sceneid=1234)
+
+        response = self.client.post('/account/sceneid/connect/old/', {
+            'username': 'testuser', 'password': '12345',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "This SceneID is already linked to another account.")
+        self.assertFalse(get_user(self.client).is_authenticated)
+        self.assertFalse(testuser.sceneids.exists())
+
+    @responses.activate
+    @patch('sceneid.views.get_random_string')
+    def test_connect_new_user_after_concurrent_link_to_deactivated_user(
+        self, get_random_string
+    ):
+        get_random_string.return_value = '66666666'
+        self.set_up_responses()
+        self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.client.get('/account/sceneid/login/?state=66666666&code=4321432143214321')
+
+        other_user = User.objects.create_user(username='othertab', is_active=False)
+        other_user.sceneids.create(sceneid=1234)
+
+        response = self.client.post('/account/sceneid/connect/new/', {'username': 'testuser2'})
+        self.assertRedirects(response, '/landing/', fetch_redirect_response=False)
+        self.assertFalse(get_user(self.client).is_authenticated)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["This account has been deactivated."]
+        )
+        self.assertFalse(User.objects.filter(username='testuser2').exists())
+
+
+@override_settings(SCENEID_SIGNED_STATE=True)
+class TestSignedState(TestCase):
+    set_up_responses = TestViews.set_up_responses
+
+    def get_state(self, response):
+        query = parse_qs(urlparse(response['Location']).query)
+        return query['state'][0]
+
+    @responses.activate
+    def test_log_in_existing_user(self):
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        testuser.sceneids.create(sceneid=1234)
+
+        self.set_up_responses()
+
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        state = self.get_state(response)
+
+        # attempt to return with a tampered state
+        response = self.client.get(
+            '/account/sceneid/login/?state=%s&code=4321432143214321' % (state[:-1] + 'x')
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            '/account/sceneid/login/?state=%s&code=4321432143214321' % state
+        )
+        self.assertRedirects(response, '/landing/')
+        logged_in_user = get_user(self.client)
+        self.assertEqual(logged_in_user.username, 'testuser')
+        # the nonce cookie is removed, so the state cannot be used again
+        self.assertEqual(response.cookies['sceneid_state'].value, '')
+
+    @responses.activate
+    def test_state_replayed_from_another_browser(self):
+        testuser = User.objects.create_user(username='testuser', password='12345')
+        testuser.sceneids.create(sceneid=1234)
+        self.set_up_responses()
+
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        state = self.get_state(response)
+
+        other_client = Client()
+        response = other_client.get(
+            '/account/sceneid/login/?state=%s&code=4321432143214321' % state
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(get_user(other_client).is_authenticated)
+        self.assertEqual(len(responses.calls), 0)
+
+    @responses.activate
+    def test_associate_sceneid_with_new_user(self):
+        self.set_up_responses()
+
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        state = self.get_state(response)
+
+        response = self.client.get(
+            '/account/sceneid/login/?state=%s&code=4321432143214321' % state
+        )
+        self.assertRedirects(response, '/account/sceneid/connect/')
+
+        # next URL is carried over into the session for the connect views
+        response = self.client.post('/account/sceneid/connect/new/', {
+            'username': 'testuser2'
+        })
+        self.assertRedirects(response, '/landing/')
+        self.assertEqual(get_user(self.client).username, 'testuser2')
+
+    def test_expired_state(self):
+        response = self.client.get('/account/sceneid/auth/?next=/landing/')
+        state = self.get_state(response)
+
+        with override_settings(SCENEID_STATE_MAX_AGE=-1):
+            response = self.client.get(
+                '/account/sceneid/login/?state=%s&code=4321432143214321' % state
+            )
+        self.assertEqual(response.status_code, 400)
@@ -1,3 +1,4 @@
+from django.contrib import admin
 from django.http import HttpResponse
 from django.urls import include, path
 
@@ -14,4 +15,5 @@ urlpatterns = [
     path('', home_view),
     path('landing/', landing_view),
     path('account/sceneid/', include('sceneid.urls')),
+    path('admin/', admin.site.urls),
 ]